@@ -1,6 +1,7 @@
 USAGE_TEXT = """Pydgin %s Instruction Set Simulator
 Usage: %s [OPTIONS] [ELFFILE]
-Simulate the execution of ELFFILE.
+Simulate the execution of ELFFILE. ELFFILE may be omitted with --restore
+or --batch.
 
 The following OPTIONS are supported:
     --help, -h               Show this message and exit
@@ -9,10 +10,37 @@ The following OPTIONS are supported:
     --first-core, -f COREID  Coreid, in hex, of North West core (default: 0x808)
     --ext-base, -b COREID    Base address of external RAM (default: 0x8e000000)
     --ext-size, -s SIZE      Size of external RAM in MB (default: 32)
+    --ext-file FILE          Hold external RAM in FILE, which other processes
+                                 can map while the simulation runs
     --env, -e ENVIRONMENT    Either USER or OPERATING (ignored)
     --max-insts NUM          Halt after executing NUM instructions
-    --switch N               Switch cores every N instructions (ignored)
+    --switch N               Switch cores every N instructions (default: 1)
+    --blocks                 Execute translated basic blocks; interrupts and
+                                 core switches are handled between blocks
+    --timing                 Estimate the clock cycles taken by each core, and
+                                 count cycles in CTIMER0 and CTIMER1
+    --mesh                   Model contention on the mesh, and delay remote
+                                 writes (implies --timing; ignores --workers)
+    --workers N              Simulate the cores in N processes (default: 1)
+    --quantum N              Instructions each --workers process simulates
+                                 between exchanges of memory (default: 10000)
+    --checkpoint-at N        Write a checkpoint to r_checkpoint.dat after N
+                                 instructions, then carry on
+    --restore FILE           Resume the simulation from a checkpoint FILE
+    --batch MANIFEST         Simulate each ELF file listed in MANIFEST in turn,
+                                 and write the results to r_batch.json
+                                 (not with --stats, --sample or --timeline)
     --time, -t               Print approximate timing information
+    --hot-spots N            Print the N functions, basic blocks and
+                                 instructions each core executed most
+    --stats FILE             Write the instruction mix of each core to FILE
+                                 as JSON
+    --sample N               Sample the call stack of the running core every
+                                 N instructions (e.g. 10000), and write the
+                                 folded stacks to r_profile.folded
+    --timeline FILE          Write the idle periods, interrupts, system calls
+                                 and remote stores of each core to FILE, in
+                                 the Chrome trace event format
     --jit FLAGS              Set flags to tune the JIT (see
                                  rpython.rlib.jit.PARAMETER_DOCS)
     --debug,-d FLAGS        Enable debug flags in a comma-separated form. The
@@ -22,6 +50,15 @@ The following OPTIONS are supported:
                                  mem       memory accesses
                                  flags     update to CPU flags
                                  syscalls  system call information
+    --trace-format FORMAT    Write the --debug trace as text to r_trace.out
+                                 (default), or as binary to r_trace.bin, or
+                                 as gzip to r_trace.bin.gz. Binary traces are
+                                 decoded by scripts/decode_trace.py
+    --trace-flush N          Write the --debug trace every N bytes (default:
+                                 1048576); 0 writes it only at exit
+    --trace-ring N           Keep only the --debug trace of the last N
+                                 instructions, written at exit (needs the
+                                 trace flag)
 
 EXAMPLES:
     $ %s -r 1 -c 2 -f 0x808 program.elf
@@ -50,7 +87,20 @@ def cli_parser(argv, simulator, debug_enabled):
                          '--max-insts',
                          '-r', '--rows',
                          '-s', '--ext-size',
+                         '--ext-file',
                          '--switch',
+                         '--workers',
+                         '--quantum',
+                         '--checkpoint-at',
+                         '--restore',
+                         '--batch',
+                         '--trace-format',
+                         '--trace-flush',
+                         '--trace-ring',
+                         '--hot-spots',
+                         '--stats',
+                         '--sample',
+                         '--timeline',
                        ]
     for index, token in enumerate(argv[1:]):
         if prev_token == '':
@@ -62,6 +112,13 @@ def cli_parser(argv, simulator, debug_enabled):
                 simulator.profile = True
             elif token == '--time' or token == '-t':
                 simulator.collect_times = True
+            elif token == '--blocks':
+                simulator.use_blocks = True
+            elif token == '--timing':
+                simulator.model_timing = True
+            elif token == '--mesh':
+                simulator.model_mesh = True
+                simulator.model_timing = True
             elif token == '--debug' or token == '-d':
                 prev_token = token
                 if not debug_enabled:
@@ -101,10 +158,49 @@ def cli_parser(argv, simulator, debug_enabled):
                 simulator.rows = int(token)
             elif prev_token == '--ext-size' or prev_token == '-s':
                 simulator.ext_size = int(token)
+            elif prev_token == '--ext-file':
+                simulator.ext_file = token
             elif prev_token == '--switch':
                 simulator.switch_interval = int(token)
+            elif prev_token == '--workers':
+                simulator.num_workers = int(token)
+            elif prev_token == '--quantum':
+                simulator.worker_quantum = int(token)
+            elif prev_token == '--checkpoint-at':
+                simulator.checkpoint_at = int(token)
+            elif prev_token == '--restore':
+                simulator.restore_file = token
+            elif prev_token == '--batch':
+                simulator.batch_file = token
+            elif prev_token == '--trace-format':
+                if token not in ('text', 'binary', 'gzip'):
+                    print '--trace-format can be text, binary or gzip.'
+                    raise ValueError
+                simulator.trace_format = token
+            elif prev_token == '--trace-flush':
+                simulator.trace_flush = int(token)
+            elif prev_token == '--trace-ring':
+                simulator.trace_ring = int(token)
+            elif prev_token == '--hot-spots':
+                simulator.hot_spots = int(token)
+            elif prev_token == '--stats':
+                simulator.stats_file = token
+            elif prev_token == '--sample':
+                simulator.sample_interval = int(token)
+            elif prev_token == '--timeline':
+                simulator.timeline_file = token
             prev_token = ''
+    if simulator.trace_ring and debug_flags and 'trace' not in debug_flags:
+        print '--trace-ring needs the trace debug flag.'
+        raise ValueError
+    if simulator.batch_file and (simulator.stats_file or
+                                 simulator.sample_interval or
+                                 simulator.timeline_file):
+        print '--stats, --sample and --timeline cannot be used with --batch.'
+        raise ValueError
     if filename_index == 0:
+        if simulator.restore_file or simulator.batch_file:
+            return '', jit, debug_flags
         print 'You must supply a file name'
         raise SyntaxError
     return argv[filename_index], jit, debug_flags
@@ -0,0 +1,250 @@
+"""Run many ELF files back to back in one simulator process (--batch).
+
+Each line of a manifest file describes one run:
+
+    ELFFILE ROWS COLS FIRSTCORE MAXINSTS [EXPECTED]
+
+FIRSTCORE is a coreid in hex, MAXINSTS is 0 for no limit, and EXPECTED is
+an optional file holding the exact STDOUT the program should write (- for
+none). Relative paths are relative to the directory of the manifest. Blank
+lines, and lines which start with #, are ignored. Any other options given on
+the command line, e.g. --timing, apply to every run.
+
+A run passes if the simulator exits cleanly and, where EXPECTED is given, the
+program writes exactly that to STDOUT. While a program runs its STDOUT is
+redirected to an unlinked file, so that it can be compared. The runs share
+one process, so the JIT traces compiled for earlier runs are reused by later
+ones. The result of every run is written to a JSON file. The summary of each
+run, e.g. for --timing or --hot-spots, is printed before its result.
+"""
+from revelation.utils import format_thousands, json_string, open_unlinked_file
+
+import os
+import sys
+import time
+
+try:
+    from rpython.rlib.objectmodel import we_are_translated
+except ImportError:
+    def we_are_translated():
+        return False
+
+_PASS = 'pass'
+_FAIL = 'fail'    # Wrong output, or the simulator did not exit cleanly.
+_ERROR = 'error'  # The ELF file or expected output could not be read.
+
+
+class BatchError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class _Run(object):
+    """One line of a manifest, and its result.
+    """
+
+    def __init__(self, elf_filename, rows, cols, first_core, max_insts,
+                 expected_filename):
+        self.elf_filename = elf_filename
+        self.rows = rows
+        self.cols = cols
+        self.first_core = first_core
+        self.max_insts = max_insts
+        self.expected_filename = expected_filename  # '' if not checked.
+        self.result = _ERROR
+        self.exit_code = -1
+        self.ticks = 0
+        self.instructions = 0
+        self.seconds = .0
+        self.output = ''
+
+
+def _read_file(filename):
+    try:
+        in_file = open(filename, 'rb')
+    except IOError:
+        raise BatchError('Could not open file %s' % filename)
+    data = in_file.read()
+    in_file.close()
+    return data
+
+
+def _relative_to(directory, filename):
+    if filename.startswith('/'):
+        return filename
+    return directory + filename
+
+
+def parse_manifest(manifest, filename):
+    """Return a _Run for each line of 'manifest', which was read from
+    'filename'.
+    """
+    directory = filename[:filename.rfind('/') + 1]
+    runs = []
+    line_number = 0
+    for line in manifest.split('\n'):
+        line_number += 1
+        fields = [field for field in line.replace('\t', ' ').split(' ')
+                  if field != '']
+        if len(fields) == 0 or fields[0].startswith('#'):
+            continue
+        if len(fields) < 5 or len(fields) > 6:
+            raise BatchError('Line %d of %s should be: ELFFILE ROWS COLS '
+                             'FIRSTCORE MAXINSTS [EXPECTED]' %
+                             (line_number, filename))
+        expected_filename = ''
+        if len(fields) == 6 and fields[5] != '-':
+            expected_filename = _relative_to(directory, fields[5])
+        try:
+            runs.append(_Run(_relative_to(directory, fields[0]),
+                             int(fields[1]), int(fields[2]),
+                             int(fields[3], 16), int(fields[4]),
+                             expected_filename))
+        except ValueError:
+            raise BatchError('Line %d of %s has a field which is not a '
+                             'number' % (line_number, filename))
+    return runs
+
+
+def _read_output(fd):
+    chunks = []
+    while True:
+        chunk = os.read(fd, 65536)
+        if chunk == '':
+            break
+        chunks.append(chunk)
+    return ''.join(chunks)
+
+
+def _flush_stdout():
+    """Flush Python's STDOUT buffer before fd 1 is redirected. A translated
+    simulator prints straight to fd 1, so has nothing to flush.
+    """
+    if not we_are_translated():
+        sys.stdout.flush()
+
+
+def _simulate(sim, run, elf_file, out_fd):
+    """Load and run one ELF file on 'sim', with STDOUT redirected to out_fd.
+    """
+    sim.rows = run.rows
+    sim.cols = run.cols
+    sim.first_core = run.first_core
+    sim.max_insts = run.max_insts
+    sim.states = {}
+    sim.scheduler = None
+    sim.restored_ticks = 0
+    sim.logger = None
+    sim.init_state(elf_file, run.elf_filename, False)
+    timeline = sim.start_run()
+    _flush_stdout()
+    stdout_fd = os.dup(1)
+    os.dup2(out_fd, 1)
+    try:
+        exit_code, ticks = sim.run()
+    finally:
+        _flush_stdout()
+        os.dup2(stdout_fd, 1)
+        os.close(stdout_fd)
+    sim.finish_run(ticks, timeline)
+    run.exit_code = exit_code
+    run.ticks = ticks
+    for coreid in sim.states:
+        run.instructions += sim.states[coreid].num_insts
+
+
+def _run_one(sim, run, out_fd, read_fd):
+    from revelation.sim import EXIT_SUCCESS
+    try:
+        elf_file = open(run.elf_filename, 'rb')
+    except IOError:
+        print 'Could not open file %s' % run.elf_filename
+        return
+    expected = ''
+    try:
+        if run.expected_filename:
+            expected = _read_file(run.expected_filename)
+    except BatchError as error:
+        print error.msg
+        elf_file.close()
+        return
+    start = time.time()
+    _simulate(sim, run, elf_file, out_fd)
+    run.seconds = time.time() - start
+    elf_file.close()
+    run.output = _read_output(read_fd)
+    if run.exit_code != EXIT_SUCCESS:
+        run.result = _FAIL
+    elif run.expected_filename and run.output != expected:
+        run.result = _FAIL
+    else:
+        run.result = _PASS
+
+
+def _format_run(run):
+    fields = ['"elf": %s' % json_string(run.elf_filename),
+              '"rows": %d' % run.rows,
+              '"cols": %d' % run.cols,
+              '"first_core": %s' % json_string(hex(run.first_core)),
+              '"max_insts": %d' % run.max_insts,
+              '"result": %s' % json_string(run.result),
+              '"exit_code": %d' % run.exit_code,
+              '"ticks": %d' % run.ticks,
+              '"instructions": %d' % run.instructions,
+              '"seconds": %f' % run.seconds]
+    if run.expected_filename:
+        fields.append('"expected": %s' % json_string(run.expected_filename))
+    if run.result == _FAIL:
+        fields.append('"output": %s' % json_string(run.output))
+    return '    {' + ', '.join(fields) + '}'
+
+
+def write_results(runs, manifest_filename, filename):
+    """Write the result of every run to 'filename' as JSON, and return the
+    number of runs which passed.
+    """
+    counts = {_PASS: 0, _FAIL: 0, _ERROR: 0}
+    for run in runs:
+        counts[run.result] += 1
+    out_file = open(filename, 'wb')
+    out_file.write('{"manifest": %s,\n' % json_string(manifest_filename))
+    out_file.write(' "passed": %d, "failed": %d, "errors": %d,\n' %
+                   (counts[_PASS], counts[_FAIL], counts[_ERROR]))
+    out_file.write(' "runs": [\n')
+    out_file.write(',\n'.join([_format_run(run) for run in runs]))
+    out_file.write('\n ]}\n')
+    out_file.close()
+    return counts[_PASS]
+
+
+def run_batch(sim, manifest_filename, results_filename):
+    """Run every ELF file listed in a manifest on 'sim', and write the results
+    to results_filename. Return the exit code of the simulator.
+    """
+    from revelation.sim import (EXIT_FILE_ERROR, EXIT_GENERAL_ERROR,
+                                EXIT_SUCCESS, EXIT_SYNTAX_ERROR)
+    try:
+        manifest = _read_file(manifest_filename)
+    except BatchError as error:
+        print error.msg
+        return EXIT_FILE_ERROR
+    try:
+        runs = parse_manifest(manifest, manifest_filename)
+    except BatchError as error:
+        print error.msg
+        return EXIT_SYNTAX_ERROR
+    out_fd, read_fd = open_unlinked_file('.revelation_batch_%d.out' %
+                                         os.getpid())
+    for run in runs:
+        _run_one(sim, run, out_fd, read_fd)
+        print ('%s %s (%s instructions, %fs)' %
+               (run.result.upper(), run.elf_filename,
+                format_thousands(run.instructions), run.seconds))
+    os.close(out_fd)
+    os.close(read_fd)
+    passed = write_results(runs, manifest_filename, results_filename)
+    print ('%d of %d runs passed. Results written to: %s.' %
+           (passed, len(runs), results_filename))
+    if passed < len(runs):
+        return EXIT_GENERAL_ERROR
+    return EXIT_SUCCESS
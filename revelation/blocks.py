@@ -0,0 +1,214 @@
+"""Basic block translation for the --blocks execution mode.
+
+A basic block is a run of straight-line instructions which ends at the first
+instruction that can change control flow, interrupt state or the simulated
+core's mode. Each block is translated once into a list of steps, and common
+instruction idioms are fused into a single step:
+
+    movimm32 + movtimm32 (same RD)   32 bit constant load.
+    sub16/32 + conditional bcond     compare and branch.
+    ldstr*   + add16/32              load or store, then pointer increment.
+
+Interrupts and core switches are only handled between blocks. A block stops
+early if one of its steps modifies code or sets State.interrupt_pending, so
+that neither is missed.
+"""
+from revelation.condition_codes import condition_passed
+from revelation.execute_branch import branch_offset
+from revelation.utils import trim_32
+
+MAX_BLOCK_INSTS = 64  # Longest block that will be translated.
+
+# Instructions which end a basic block.
+_block_terminators = { 'bcond16' : True, 'bcond32'  : True,
+                       'jr16'    : True, 'jr32'     : True,
+                       'jalr16'  : True, 'jalr32'   : True,
+                       'rti16'   : True, 'trap16'   : True,
+                       'idle16'  : True, 'swi16'    : True,
+                       'gie16'   : True, 'gid16'    : True,
+                       'movts16' : True, 'movts32'  : True,
+                       'bkpt16'  : True, 'mbkpt16'  : True,
+                       'sync16'  : True, 'wand16'   : True,
+                       'unimpl'  : True,
+}
+
+
+def _is_memory_write(name):
+    return name.startswith('ldstr') or name == 'testset32'
+
+
+def instruction_size(instruction):
+    return 2 if instruction.name.endswith('16') else 4
+
+
+def ends_block(instruction):
+    """Return True if 'instruction' can change control flow, interrupt state
+    or the mode of the core, so must be the last of a basic block.
+    """
+    return instruction.name in _block_terminators
+
+
+class _Step(object):
+    """One or more instructions executed as a unit.
+    """
+
+    def __init__(self, num_insts, may_write_code):
+        self.num_insts = num_insts
+        self.may_write_code = may_write_code
+
+    def execute(self, s):
+        raise NotImplementedError
+
+
+class _SingleStep(_Step):
+
+    def __init__(self, instruction):
+        _Step.__init__(self, 1, _is_memory_write(instruction.name))
+        self.instruction = instruction
+
+    def execute(self, s):
+        self.instruction.execute(s, self.instruction)
+
+
+class _LoadConstantStep(_Step):
+    """MOV RD, #lo followed by MOVT RD, #hi.
+    """
+
+    def __init__(self, low, high):
+        _Step.__init__(self, 2, False)
+        self.rd = low.rd
+        self.value = low.imm16 | (high.imm16 << 16)
+
+    def execute(self, s):
+        s.rf[self.rd] = self.value
+        s.pc += 8
+
+
+class _CompareBranchStep(_Step):
+    """SUB followed by a conditional branch. Both branch targets are computed
+    when the block is translated.
+    """
+
+    def __init__(self, compare, branch, branch_pc):
+        _Step.__init__(self, 2, False)
+        self.compare = compare
+        self.cond = branch.cond
+        is16bit = branch.name == 'bcond16'
+        self.taken_pc = trim_32(branch_pc + branch_offset(branch.bcond_imm,
+                                                          is16bit))
+        self.next_pc = branch_pc + instruction_size(branch)
+
+    def execute(self, s):
+        self.compare.execute(s, self.compare)
+        if condition_passed(s, self.cond):
+            s.pc = self.taken_pc
+        else:
+            s.pc = self.next_pc
+        s.debug_flags()
+
+
+class _PairStep(_Step):
+    """Two instructions executed back to back, e.g. LDR then ADD.
+    """
+
+    def __init__(self, first, second):
+        _Step.__init__(self, 2, _is_memory_write(first.name))
+        self.first = first
+        self.second = second
+
+    def execute(self, s):
+        self.first.execute(s, self.first)
+        self.second.execute(s, self.second)
+
+
+class BasicBlock(object):
+
+    def __init__(self, start_pc, end_pc, steps, num_insts):
+        self.start_pc = start_pc
+        self.end_pc = end_pc  # Address after the last instruction.
+        self.steps = steps
+        self.num_insts = num_insts
+
+    def execute(self, s):
+        """Run every step in the block and return the number of instructions
+        executed. If a step modifies code the rest of the block is stale, and
+        if a step may have latched an interrupt it must be serviced before the
+        next instruction, so in either case execution stops after that step.
+        """
+        version = s.mem.code_version
+        num_insts = 0
+        for step in self.steps:
+            step.execute(s)
+            num_insts += step.num_insts
+            if s.interrupt_pending:
+                break
+            if step.may_write_code and s.mem.code_version != version:
+                break
+        return num_insts
+
+
+def _fuse(first, second, second_pc):
+    """Return a fused step for the two instructions, or None.
+    """
+    if (first.name == 'movimm32' and second.name == 'movtimm32' and
+          first.rd == second.rd):
+        return _LoadConstantStep(first, second)
+    if ((first.name == 'sub16' or first.name == 'sub32') and
+          (second.name == 'bcond16' or second.name == 'bcond32') and
+          second.cond < 0b1110):
+        return _CompareBranchStep(first, second, second_pc)
+    if (first.name.startswith('ldstr') and
+          (second.name == 'add16' or second.name == 'add32')):
+        return _PairStep(first, second)
+    return None
+
+
+def translate_block(s, pc):
+    """Translate the basic block starting at pc, or return None if there is no
+    code at pc. Only instructions inside a code block are translated, so that
+    the self-modifying code check in Memory.write() sees every write to them.
+    """
+    instructions = []
+    addresses = []
+    address = pc
+    while len(instructions) < MAX_BLOCK_INSTS:
+        if not s.mem.is_code_address(address, 2, from_core=s.coreid):
+            break
+        instruction = s.fetch_instruction(address)
+        size = instruction_size(instruction)
+        if not s.mem.is_code_address(address, size, from_core=s.coreid):
+            break
+        instructions.append(instruction)
+        addresses.append(address)
+        address += size
+        if ends_block(instruction):
+            break
+    if not instructions:
+        return None
+    steps = []
+    index = 0
+    while index < len(instructions):
+        step = None
+        if index + 1 < len(instructions):
+            step = _fuse(instructions[index], instructions[index + 1],
+                         addresses[index + 1])
+        if step is None:
+            step = _SingleStep(instructions[index])
+        steps.append(step)
+        index += step.num_insts
+    return BasicBlock(pc, address, steps, len(instructions))
+
+
+def get_block(s, pc):
+    """Return the translated block at pc, translating it if necessary. Cached
+    blocks are discarded whenever any code has been modified.
+    """
+    if s.block_cache_version != s.mem.code_version:
+        s.block_cache = {}
+        s.block_cache_version = s.mem.code_version
+    block = s.block_cache.get(pc, None)
+    if block is None:
+        block = translate_block(s, pc)
+        if block is not None:
+            s.block_cache[pc] = block
+    return block
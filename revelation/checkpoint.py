@@ -0,0 +1,225 @@
+"""Checkpoints of the full state of a simulation (--checkpoint-at, --restore),
+and snapshots, which are held in memory.
+
+A checkpoint holds the registers, flags and instruction count of every core,
+the scheduler, the code blocks of the loaded program and every page of memory
+which is not all zeros. Restoring a checkpoint and running on gives the same
+result as the simulation which wrote it, so long as it has no files open other
+than STDIN, STDOUT and STDERR. With --mesh, writes which are in flight are
+made before the checkpoint is written, and every link is free again after a
+restore, so cycle counts after a restore are approximate. The file is written
+in a simple format, which is mostly text:
+
+    REVELATION CHECKPOINT <version>
+    <ticks> <first core> <cores> <code blocks> <pages>
+    <start> <end>                                   For each code block.
+    <coreid> <num_insts> <running> <in hardware loop>  For each core, one
+        <interrupt pending> <cycles> <last unit>       line of fields,
+        <last rd> <last paired>                        including its --timing
+        <DMA0 outer stride> <DMA0 inner count>         pipeline and the DMA
+        <DMA0 paused> <DMA1 outer stride>              state which is not
+        <DMA1 inner count> <DMA1 paused>               held in registers,
+    <register 0> <register 1> ...                   then its registers.
+    <index> <since_switch>                          Scheduler.
+    <coreid> <coreid> ...                           Run queue.
+    <coreid> <coreid> ...                           Waiting cores.
+    <page number>                                   For each page, followed
+    <PAGE_SIZE bytes of memory>                     by its raw contents.
+
+A snapshot holds the same state, but shares memory blocks with the simulation
+it was taken from, and with every simulation restored from it. A block is
+only copied when one of those simulations first writes to it.
+"""
+from revelation.machine import new_core_state
+from revelation.registers import reg_map
+from revelation.scheduler import Scheduler
+from revelation.storage import PAGE_BITS, PAGE_SIZE
+from revelation.utils import read_int_line
+
+_MAGIC = 'REVELATION CHECKPOINT 3\n'
+_ZERO_PAGE = '\0' * PAGE_SIZE
+
+
+class CheckpointError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def _int_line(values):
+    return ' '.join([str(value) for value in values]) + '\n'
+
+
+def _core_fields(state):
+    timing = state.timing
+    fields = [state.coreid, state.num_insts, int(state.running),
+              int(state.is_in_hardware_loop), int(state.interrupt_pending),
+              timing.cycles, timing.last_unit, timing.last_rd,
+              int(timing.last_paired)]
+    for channel in state.dma:
+        fields.append(channel.outer_stride)
+        fields.append(channel.inner_count)
+        fields.append(int(channel.paused))
+    return fields
+
+
+def _core_registers(state):
+    return [state.rf.read_register(index) for index in range(state.rf.num_regs)]
+
+
+def _restore_core(sim, fields, regs):
+    (coreid, num_insts, running, is_in_hardware_loop, interrupt_pending,
+     cycles, last_unit, last_rd, last_paired) = fields[:9]
+    state = new_core_state(sim.memory, sim.debug, coreid=coreid,
+                           logger=sim.logger)
+    for index in range(len(regs)):
+        state.rf.regs[index] = regs[index]
+    state.set_status(regs[reg_map['STATUS']])
+    state.set_config(regs[reg_map['CONFIG']])
+    state.num_insts = num_insts
+    state.running = running != 0
+    state.is_in_hardware_loop = is_in_hardware_loop != 0
+    state.interrupt_pending = interrupt_pending != 0
+    state.timing.cycles = cycles
+    state.timing.last_unit = last_unit
+    state.timing.last_rd = last_rd
+    state.timing.last_paired = last_paired != 0
+    for index, channel in enumerate(state.dma):
+        channel.outer_stride = fields[9 + 3 * index]
+        channel.inner_count = fields[10 + 3 * index]
+        channel.paused = fields[11 + 3 * index] != 0
+        if channel.paused:
+            state.dma_pending = True
+    sim.states[coreid] = state
+
+
+def _sorted_waiting(scheduler):
+    waiting = scheduler.waiting.keys()
+    waiting.sort()
+    return waiting
+
+
+def _restore_scheduler(sim, index, since_switch, run_queue, waiting):
+    scheduler = Scheduler(run_queue)
+    scheduler.index = index
+    scheduler.since_switch = since_switch
+    for coreid in waiting:
+        scheduler.waiting[coreid] = True
+    for coreid in sim.states:
+        sim.states[coreid].rf.scheduler = scheduler
+    return scheduler
+
+
+def _nonzero_pages(memory):
+    pages = []
+    block_addrs = memory.block_dict.keys()
+    block_addrs.sort()
+    for block_addr in block_addrs:
+        first_page = block_addr >> PAGE_BITS
+        for page in range(first_page, first_page + (memory.block_size >> PAGE_BITS)):
+            contents = memory.read_page(page)
+            if contents != _ZERO_PAGE:
+                pages.append((page, contents))
+    return pages
+
+
+def save_checkpoint(sim, scheduler, ticks, filename):
+    """Write the state of every core, the scheduler and memory to a file.
+    """
+    memory = sim.memory
+    coreids = sim.states.keys()
+    coreids.sort()
+    pages = _nonzero_pages(memory)
+    parts = [_MAGIC, _int_line([ticks, memory.first_core, len(coreids),
+                                len(memory.code_blocks), len(pages)])]
+    for start, end in memory.code_blocks:
+        parts.append(_int_line([start, end]))
+    for coreid in coreids:
+        parts.append(_int_line(_core_fields(sim.states[coreid])))
+        parts.append(_int_line(_core_registers(sim.states[coreid])))
+    parts.append(_int_line([scheduler.index, scheduler.since_switch]))
+    parts.append(_int_line(scheduler.run_queue))
+    parts.append(_int_line(_sorted_waiting(scheduler)))
+    for page, contents in pages:
+        parts.append('%d\n' % page)
+        parts.append(contents)
+    checkpoint = open(filename, 'wb')
+    checkpoint.write(''.join(parts))
+    checkpoint.close()
+
+
+def load_checkpoint(sim, filename):
+    """Restore the cores and memory of 'sim' from a file written by
+    save_checkpoint(). sim.memory must be new. Return the scheduler and the
+    number of ticks which had been simulated when the checkpoint was written.
+    """
+    try:
+        checkpoint = open(filename, 'rb')
+    except IOError:
+        raise CheckpointError('Could not open file %s' % filename)
+    data = checkpoint.read()
+    checkpoint.close()
+    if not data.startswith(_MAGIC):
+        raise CheckpointError('%s is not a Revelation checkpoint' % filename)
+    memory = sim.memory
+    (ticks, first_core, num_cores, num_code_blocks, num_pages), pos = \
+        read_int_line(data, len(_MAGIC))
+    for _ in range(num_code_blocks):
+        (start, end), pos = read_int_line(data, pos)
+        memory.add_code_block(start, end)
+    for _ in range(num_cores):
+        fields, pos = read_int_line(data, pos)
+        regs, pos = read_int_line(data, pos)
+        _restore_core(sim, fields, regs)
+    sim.states[first_core].set_first_core(True)
+    (index, since_switch), pos = read_int_line(data, pos)
+    run_queue, pos = read_int_line(data, pos)
+    waiting, pos = read_int_line(data, pos)
+    scheduler = _restore_scheduler(sim, index, since_switch, run_queue,
+                                   waiting)
+    for _ in range(num_pages):
+        (page,), pos = read_int_line(data, pos)
+        memory.write_page(page, data[pos:pos + PAGE_SIZE])
+        pos += PAGE_SIZE
+    return scheduler, ticks
+
+
+class Snapshot(object):
+    """Frozen copy of a simulation, from which any number of simulations can
+    continue (see Revelation.take_snapshot and Revelation.restore_snapshot).
+    Memory which is mapped from a file by --ext-file is not copied, and is
+    shared by every simulation.
+    """
+
+    def __init__(self, sim, scheduler, ticks):
+        self.ticks = ticks
+        self.blocks = sim.memory.freeze()
+        self.code_blocks = [block for block in sim.memory.code_blocks]
+        self.first_core = sim.memory.first_core
+        self.shared_start = sim.memory.shared_start
+        self.shared_end = sim.memory.shared_end
+        coreids = sim.states.keys()
+        coreids.sort()
+        self.cores = [_core_fields(sim.states[coreid]) for coreid in coreids]
+        self.registers = [_core_registers(sim.states[coreid])
+                          for coreid in coreids]
+        self.index = scheduler.index
+        self.since_switch = scheduler.since_switch
+        self.run_queue = [coreid for coreid in scheduler.run_queue]
+        self.waiting = _sorted_waiting(scheduler)
+
+    def restore(self, sim):
+        """Restore the cores and memory of 'sim' from this snapshot. sim.memory
+        must be new. Return the scheduler.
+        """
+        memory = sim.memory
+        for block_addr in self.blocks:
+            memory.block_dict[block_addr] = self.blocks[block_addr]
+        for start, end in self.code_blocks:
+            memory.add_code_block(start, end)
+        memory.shared_start = self.shared_start
+        memory.shared_end = self.shared_end
+        for index in range(len(self.cores)):
+            _restore_core(sim, self.cores[index], self.registers[index])
+        sim.states[self.first_core].set_first_core(True)
+        return _restore_scheduler(sim, self.index, self.since_switch,
+                                  self.run_queue, self.waiting)
@@ -0,0 +1,258 @@
+"""Model of the two DMA channels of each Epiphany core.
+
+A channel is started by writing to its DMAxCONFIG register, with the DMAEN
+bit set. If the STARTUP bit is also set, the transfer is described by a
+descriptor in local memory, at the address in bits [31:16] of DMAxCONFIG:
+
+    .word config        ; Loaded into DMAxCONFIG.
+    .word inner stride  ; DMAxSTRIDE: destination [31:16], source [15:0].
+    .word count         ; DMAxCOUNT: outer count [31:16], inner count [15:0].
+    .word outer stride  ; Destination [31:16], source [15:0].
+    .word source        ; DMAxSRCADDR.
+    .word destination   ; DMAxDSTADDR.
+
+Otherwise the transfer is described by the values already written to
+DMAxSTRIDE, DMAxCOUNT, DMAxSRCADDR and DMAxDSTADDR, and the outer strides are
+the same as the inner strides. Strides are signed, and in bytes. Each row
+moves 'inner count' items of DATASIZE bytes. The addresses are advanced by
+the inner strides after each item, except the last item of a row, after which
+they are advanced by the outer strides.
+
+In master mode the whole transfer is made as soon as the channel is started,
+with rows copied directly between blocks of memory where possible (see
+Memory.copy). In slave mode, the channel writes one item to the destination
+each time DMAxAUTO0 is written, e.g. by another core. DMAxAUTO1 holds the upper
+word of doubleword items. When a descriptor is complete, the channel raises
+its interrupt (IVT entry 6 or 7) if IRQEN is set, and loads the next
+descriptor if CHAINMODE is set. Bits [3:0] of DMAxSTATUS are zero when a
+channel is idle.
+
+A channel completes at most MAX_CHAIN_DESCRIPTORS descriptors of a chain at
+a time. It then pauses with the next descriptor loaded, and carries on after
+its core has executed another instruction (see State.resume_dma). So a chain
+which loops back on itself runs alongside the program, as it would on the
+hardware, rather than hanging the simulator. An idle core is kept running
+while its DMA chain is paused.
+"""
+from revelation.registers import reg_map
+from revelation.storage import set_write_handler
+
+MAX_CHAIN_DESCRIPTORS = 64  # Completed before a chain is paused.
+
+# Bits of DMAxCONFIG.
+DMAEN = 0x1
+MASTER = 0x2
+CHAINMODE = 0x4
+STARTUP = 0x8
+IRQEN = 0x10
+
+# Offsets of the registers of a channel from its DMAxCONFIG register.
+_CONFIG = 0
+_STRIDE = 1
+_COUNT = 2
+_SRCADDR = 3
+_DSTADDR = 4
+_AUTO0 = 5
+_AUTO1 = 6
+_STATUS = 7
+_NUM_CHANNEL_REGS = 8
+_FIRST_DMA_REG = reg_map['DMA0CONFIG']
+
+_ACTIVE = 1  # DMAxSTATUS[3:0], which is 0 when the channel is idle.
+_ILAT = reg_map['ILAT']
+_DMA0_INTERRUPT = 6  # DMA1 raises the next interrupt.
+
+
+def _signed16(value):
+    value &= 0xffff
+    if value & 0x8000:
+        return value - 0x10000
+    return value
+
+
+class DMAChannel(object):
+    """One DMA channel of a core. The state of a transfer is held in the
+    registers of the channel, so that it can be read by the program.
+    """
+
+    def __init__(self, state, channel):
+        self.state = state
+        self.channel = channel
+        self.first_reg = _FIRST_DMA_REG + channel * _NUM_CHANNEL_REGS
+        self.outer_stride = 0  # Not held in a register.
+        self.inner_count = 0   # Items in each row of a slave transfer.
+        self.paused = False    # A chain was paused, see State.resume_dma.
+
+    def get(self, offset):
+        return self.state.rf.regs[self.first_reg + offset]
+
+    def set(self, offset, value):
+        self.state.rf.regs[self.first_reg + offset] = value & 0xffffffff
+
+    def start(self):
+        """Start the channel, after DMAxCONFIG has been written.
+        """
+        config = self.get(_CONFIG)
+        if config & DMAEN and config & STARTUP:
+            self.load_descriptor(config >> 16)
+        else:
+            self.outer_stride = self.get(_STRIDE)
+        self.run()
+
+    def load_descriptor(self, address):
+        """Load the descriptor at 'address', in the local memory of the core.
+        """
+        memory = self.state.mem
+        coreid = self.state.coreid
+        self.set(_CONFIG, memory.read(address, 4, from_core=coreid))
+        self.set(_STRIDE, memory.read(address + 4, 4, from_core=coreid))
+        self.set(_COUNT, memory.read(address + 8, 4, from_core=coreid))
+        self.outer_stride = memory.read(address + 12, 4, from_core=coreid)
+        self.set(_SRCADDR, memory.read(address + 16, 4, from_core=coreid))
+        self.set(_DSTADDR, memory.read(address + 20, 4, from_core=coreid))
+        self.set(_STATUS, (address << 16) | _ACTIVE)
+
+    def run(self):
+        """Make master transfers, following a chain of descriptors, until the
+        channel is idle, waits for slave writes, or has completed
+        MAX_CHAIN_DESCRIPTORS descriptors and pauses.
+        """
+        completed = 0
+        while True:
+            config = self.get(_CONFIG)
+            if not config & DMAEN:
+                self.set(_STATUS, self.get(_STATUS) & 0xffff0000)  # Idle.
+                return
+            self.set(_STATUS, (self.get(_STATUS) & 0xffff0000) | _ACTIVE)
+            if not config & MASTER:
+                self.inner_count = self.get(_COUNT) & 0xffff
+                if self.inner_count > 0 and self.get(_COUNT) >> 16 > 0:
+                    return
+            else:
+                self.transfer()
+            if not self.finish():
+                return
+            completed += 1
+            if completed >= MAX_CHAIN_DESCRIPTORS:
+                self.paused = True
+                self.state.dma_pending = True
+                self.state.interrupt_pending = True
+                return
+
+    def resume(self):
+        """Carry on with a chain of descriptors, if it was paused.
+        """
+        if self.paused:
+            self.paused = False
+            self.run()
+
+    def item_size(self):
+        return 1 << ((self.get(_CONFIG) >> 5) & 0x3)
+
+    def transfer(self):
+        """Make the whole of a master transfer.
+        """
+        size = self.item_size()
+        count = self.get(_COUNT)
+        inner_count = count & 0xffff
+        outer_count = (count >> 16) & 0xffff
+        src_inner = _signed16(self.get(_STRIDE))
+        dst_inner = _signed16(self.get(_STRIDE) >> 16)
+        src_outer = _signed16(self.outer_stride)
+        dst_outer = _signed16(self.outer_stride >> 16)
+        src = self.get(_SRCADDR)
+        dst = self.get(_DSTADDR)
+        memory = self.state.mem
+        coreid = self.state.coreid
+        if inner_count > 0:
+            for _ in range(outer_count):
+                if src_inner == size and dst_inner == size:  # Contiguous row.
+                    memory.copy(dst & 0xffffffff, src & 0xffffffff,
+                                inner_count * size, from_core=coreid)
+                else:
+                    for item in range(inner_count):
+                        memory.copy((dst + item * dst_inner) & 0xffffffff,
+                                    (src + item * src_inner) & 0xffffffff,
+                                    size, from_core=coreid)
+                src += (inner_count - 1) * src_inner + src_outer
+                dst += (inner_count - 1) * dst_inner + dst_outer
+        self.set(_SRCADDR, src)
+        self.set(_DSTADDR, dst)
+        self.set(_COUNT, 0)
+
+    def receive(self):
+        """Write one item of a slave transfer, after DMAxAUTO0 has been
+        written.
+        """
+        config = self.get(_CONFIG)
+        if ((self.get(_STATUS) & 0xf) == 0 or not config & DMAEN or
+              config & MASTER):
+            return
+        size = self.item_size()
+        value = self.get(_AUTO0)
+        if size == 8:
+            value |= self.get(_AUTO1) << 32
+        dst = self.get(_DSTADDR)
+        self.state.mem.write(dst, size, value, from_core=self.state.coreid)
+        inner_left = (self.get(_COUNT) & 0xffff) - 1
+        outer_left = (self.get(_COUNT) >> 16) & 0xffff
+        if inner_left == 0:
+            outer_left -= 1
+            inner_left = self.inner_count
+            dst += _signed16(self.outer_stride >> 16)
+        else:
+            dst += _signed16(self.get(_STRIDE) >> 16)
+        self.set(_DSTADDR, dst)
+        if outer_left == 0:
+            self.set(_COUNT, 0)
+            if self.finish():
+                self.run()
+        else:
+            self.set(_COUNT, (outer_left << 16) | inner_left)
+
+    def finish(self):
+        """Complete the current descriptor. Return True if another descriptor
+        has been loaded.
+        """
+        config = self.get(_CONFIG)
+        if config & IRQEN:
+            rf = self.state.rf
+            rf.write_register(_ILAT, rf.regs[_ILAT] |
+                              (1 << (_DMA0_INTERRUPT + self.channel)))
+        if config & CHAINMODE:
+            self.load_descriptor(config >> 16)
+            return True
+        self.set(_STATUS, self.get(_STATUS) & 0xffff0000)  # Idle.
+        return False
+
+
+def _get_channel(rf, index):
+    """Return the channel which owns register 'index', or None if transfers
+    for this register file are not simulated here. In --workers processes,
+    only the process which owns a core runs its transfers.
+    """
+    if rf.state is None:
+        return None
+    owned_cores = rf.memory.owned_cores
+    if owned_cores is not None and rf.coreid not in owned_cores:
+        return None
+    return rf.state.dma[(index - _FIRST_DMA_REG) / _NUM_CHANNEL_REGS]
+
+
+def _write_config(rf, index, value):
+    rf.regs[index] = value
+    channel = _get_channel(rf, index)
+    if channel is not None:
+        channel.start()
+
+
+def _write_auto0(rf, index, value):
+    rf.regs[index] = value
+    channel = _get_channel(rf, index)
+    if channel is not None:
+        channel.receive()
+
+
+for _channel in ['DMA0', 'DMA1']:
+    set_write_handler(_channel + 'CONFIG', _write_config)
+    set_write_handler(_channel + 'AUTO0', _write_auto0)
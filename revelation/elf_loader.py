@@ -3,6 +3,12 @@ from revelation.storage import is_local_address
 from pydgin.utils import intmask
 
 
+def is_code_section(name):
+    """Return True if the ELF section 'name' holds program code.
+    """
+    return name == '.text' or name == 'NEW_LIB_RO'
+
+
 def load_program(elf, mem, coreids, alignment=0, ext_base=0x8e000000,
                  ext_size=32):
     """Copy the contents of an ELF file into individual cores.
@@ -20,7 +26,7 @@ def load_program(elf, mem, coreids, alignment=0, ext_base=0x8e000000,
                 start_addr = section.addr
             for index, data in enumerate(section.data):
                 mem.write(start_addr + index, 1, ord(data), quiet=True)
-            if section.name == '.text' or section.name == 'NEW_LIB_RO':
+            if is_code_section(section.name):
                 entry_point = intmask(start_addr)
                 end_point = entry_point + len(section.data)
                 code_blocks.append((entry_point, end_point))
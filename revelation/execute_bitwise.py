@@ -21,8 +21,6 @@ def make_addsub_executor(is16bit, name):
         else { AV=0 }
         AVS = AVS | AV
         """
-        if is16bit:
-            inst.bits &= 0xffff
         rn = s.rf[inst.rn]
         op2 = reg_or_simm(s, inst, is16bit)
         result = rn + op2 if name == 'add' else rn - op2
@@ -52,8 +50,6 @@ def make_bit_executor(name, is16bit, imm):
         AC = 0
         If ( RD[31:0] == 0 ) { AZ=1 } else { AZ=0 }
         """
-        if is16bit:
-            inst.bits &= 0xffff
         rm = inst.imm5 if imm else s.rf[inst.rm]
         rn = s.rf[inst.rn]
         if name == "and":
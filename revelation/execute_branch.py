@@ -3,6 +3,12 @@ from revelation.registers import reg_map
 from revelation.utils import signed, sext_8, sext_24, trim_32
 
 
+def branch_offset(imm, is16bit):
+    """Return the signed byte offset encoded in the immediate of a branch.
+    """
+    return (signed(sext_8(imm)) << 1) if is16bit else (signed(sext_24(imm)) << 1)
+
+
 def make_bcond_executor(is16bit):
     def execute_bcond(s, inst):
         """
@@ -13,15 +19,14 @@ def make_bcond_executor(is16bit):
             LR = next PC;
             PC = PC + (SignExtend(SIMM) << 1)
         """
-        if is16bit:
-            inst.bits &= 0xffff
         cond = inst.cond
         imm = inst.bcond_imm
         if cond == 0b1111:  # Branch and link (BL).
             s.rf[reg_map['LR']] = s.pc + (2 if is16bit else 4)
+            if s.call_stack is not None:  # --sample.
+                s.call_stack.push(s.pc)
         if condition_passed(s, cond):
-            offset = (signed(sext_8(imm)) << 1) if is16bit else (signed(sext_24(imm)) << 1)
-            s.pc = trim_32(s.pc + offset)
+            s.pc = trim_32(s.pc + branch_offset(imm, is16bit))
         else:
             s.pc += 2 if is16bit else 4
         s.debug_flags()
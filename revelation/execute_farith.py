@@ -18,8 +18,6 @@ def make_float_executor(is16bit):
         Corner cases: Overflow returns positive / negative infinity
         (round-to-nearest), underflow returns positive / negative zero.
         """
-        if is16bit:
-            inst.bits &= 0xffff
         rn = signed(s.rf[inst.rn])
         result = float(rn)
         result_bits = float2bits(result)
@@ -62,8 +60,6 @@ def make_fix_executor(is16bit):
         Overflow result always returns a signed saturated result: 0x7fffffff for
         positive, and 0x80000000 for negative.
         """
-        if is16bit:
-            inst.bits &= 0xffff
         rn = bits2float(s.rf[inst.rn])
         if is_nan(s.rf[inst.rn]):
             result = 0xffffffff
@@ -107,8 +103,6 @@ def make_fabs_executor(is16bit):
         if (RM or RN == NAN) { BIS=1 } else { BIS=BIS }
         BVS = BVS | BV;
         """
-        if is16bit:
-            inst.bits &= 0xffff
         rn = bits2float(s.rf[inst.rn])
         result = abs(rn)
         # 'result' is always a Python float, result_bits is an int.
@@ -145,8 +139,6 @@ def make_farith_executor(name, is16bit):
         if (RM or RN == NAN) { BIS=1 } else { BIS=BIS }
         BVS = BVS | BV;
         """
-        if is16bit:
-            inst.bits &= 0xffff
         if (s.ARITHMODE == s.FPU_MODES['FLOATING POINT'] or
               name == 'fix' or name == 'float' or name == 'abs'):
             rd = bits2float(s.rf[inst.rd])
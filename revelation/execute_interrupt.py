@@ -18,6 +18,8 @@ def execute_idle16(s, inst):
         }
     """
     s.ACTIVE = False
+    if s.timeline is not None:
+        s.timeline.go_idle(s)
 
 
 def execute_bkpt16(s, inst):
@@ -44,6 +46,7 @@ def execute_gie16(s, inst):
         if not (s.rf[reg_map['IMASK']] & (1 << index)):
             s.rf[reg_map['ILAT']] &= ~(1 << index)
     s.GID = 0
+    s.interrupt_pending = True
     s.pc += 2
 
 
@@ -72,6 +75,8 @@ def execute_rti16(s, inst):
     proceeds as if there were an interrupt to service:
     https://parallella.org/forums/viewtopic.php?f=23&t=818&hilit=interrupt#p5185
     """
+    if s.timeline is not None:
+        s.timeline.return_from_interrupt(s)
     # Let N be the interrupt level.
     interrupt_level = s.get_pending_interrupt()
     #     Bit N of IPEND is cleared.
@@ -79,6 +84,7 @@ def execute_rti16(s, inst):
         s.rf[reg_map['IPEND']] &= ~(1 << interrupt_level)
     #     The GID bit in STATUS is cleared.
     s.GID = 0
+    s.interrupt_pending = True
     #     PC is set to IRET.
     s.pc = s.rf[reg_map['IRET']]
 
@@ -99,6 +105,20 @@ def execute_trap16(s, inst):
     by the hardware but can be used by software such as a debugger or
     operating system to find out the reason for the TRAP instruction.
     """
+    if s.timeline is not None:
+        s.timeline.trap(s, inst.t5, s.rf[3])
+    # The system calls of pydgin access memory without saying which core
+    # they serve, so tell the memory.
+    current_core = s.mem.current_core
+    s.mem.current_core = s.coreid
+    try:
+        _trap(s, inst)
+    finally:
+        s.mem.current_core = current_core
+    s.pc += 2
+
+
+def _trap(s, inst):
     import pydgin.syscalls
     undocumented_syscall_funcs = {
         0:  pydgin.syscalls.syscall_write,
@@ -128,22 +148,22 @@ def execute_trap16(s, inst):
     elif inst.t5 == 3:  # Exit.
         syscall_handler = pydgin.syscalls.syscall_exit
         exit_code = s.rf[0]
-        if s.debug.enabled('syscalls') and s.is_first_core:  # pragma: no cover
+        if s.trace_syscalls and s.is_first_core:  # pragma: no cover
             s.logger.log(' syscall_exit(status=%x)' % exit_code)
         retval, errno = syscall_handler(s, exit_code, s.rf[1], s.rf[2])
     elif inst.t5 == 4:
         s.rf[0] = 1
-        if s.debug.enabled('syscalls') and s.is_first_core:
+        if s.trace_syscalls and s.is_first_core:
             s.logger.log(' TRAP: Assertion SUCCEEDED.')
     elif inst.t5 == 5:
         s.rf[0] = 0
-        if s.debug.enabled('syscalls') and s.is_first_core:
+        if s.trace_syscalls and s.is_first_core:
             s.logger.log(' TRAP: Assertion FAILED.')
     elif inst.t5 == 7: # Initiate system call.
         syscall = s.rf[3]
         syscall_handler = syscall_funcs[syscall]
         arg0, arg1, arg2 = s.rf[0], s.rf[1], s.rf[2]
-        if s.debug.enabled('syscalls') and s.is_first_core:  # pragma: no cover
+        if s.trace_syscalls and s.is_first_core:  # pragma: no cover
             _debug_syscalls(syscall, arg0, arg1, arg2, s.logger)
         # Map any buffers to core-local addresses, where necessary.
         if syscall in (4, 5, 10, 15):
@@ -155,7 +175,6 @@ def execute_trap16(s, inst):
         s.rf[3] = errno
     else:
         raise FatalError('Unknown argument to trap instruction: %d' % inst.t5)
-    s.pc += 2
 
 
 def _debug_syscalls(syscall, arg0, arg1, arg2, logger):
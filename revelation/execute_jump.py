@@ -1,15 +1,21 @@
 from revelation.registers import reg_map
 from revelation.utils import trim_32
 
+_LR = reg_map['LR']
+
+
 def make_jr_executor(is16bit, save_lr):
     def execute_jr(s, inst):
         """
         LR = PC + 2 (16 bit) 4 (32 bit)    JALR only.
         PC = RN;
         """
-        if is16bit:
-            inst.bits &= 0xffff
         if save_lr:
             s.rf[reg_map['LR']] = trim_32(s.pc + (2 if is16bit else 4))
+        if s.call_stack is not None:  # --sample.
+            if save_lr:
+                s.call_stack.push(s.pc)
+            elif inst.rn == _LR:
+                s.call_stack.pop()
         s.pc = s.rf[inst.rn]
     return execute_jr
@@ -3,6 +3,16 @@ from revelation.utils import trim_32
 from pydgin.misc import FatalError
 
 
+def _observe_access(s, inst, address):
+    """Count a load or store for --stats, and record a store to another core
+    for --timeline.
+    """
+    if s.stats is not None:
+        s.stats.count_access(inst.s, address, inst.size)
+    if s.timeline is not None and inst.s:
+        s.timeline.store(s, address)
+
+
 def execute_ldstrpmd32(s, inst):
     """
     address = RN;
@@ -15,6 +25,7 @@ def execute_ldstrpmd32(s, inst):
     new_rn = (s.rf[inst.rn] - (inst.imm11 << inst.size) if inst.sub
               else s.rf[inst.rn] + (inst.imm11 << inst.size))
     size = {0:1, 1:2, 2:4, 3:8}[inst.size]  # Size in bytes.
+    _observe_access(s, inst, s.rf[inst.rn])
     if inst.s:     # STORE
         if size == 8:  # 64 bit store.
             s.mem.write(s.rf[inst.rn],     4, s.rf[inst.rd], from_core=s.coreid)
@@ -42,11 +53,10 @@ def make_ldstrdisp_executor(is16bit):
             address = RN +/- (IMM << (log2(size_in_bits/8))); (STR)
             memory[address] = RD;
         """
-        if is16bit:
-            inst.bits &= 0xffff
         size = {0:1, 1:2, 2:4, 3:8}[inst.size]  # Size in bytes.
         offset = (inst.imm3 << inst.size) if is16bit else (inst.imm11 << inst.size)
         address = (s.rf[inst.rn] - offset if inst.sub else s.rf[inst.rn] + offset)
+        _observe_access(s, inst, address)
         if inst.s:  # STORE
             if size == 8:  # 64 bit store.
                 s.mem.write(address,     4, s.rf[inst.rd], from_core=s.coreid)
@@ -75,11 +85,10 @@ def make_ldstrind_executor(is16bit):
             address = RN +/- RM ;    (STR)
             memory[address] = RD;
         """
-        if is16bit:
-            inst.bits &= 0xffff
         address = (s.rf[inst.rn] - s.rf[inst.rm] if inst.sub20
                    else s.rf[inst.rn] + s.rf[inst.rm])
         size = {0:1, 1:2, 2:4, 3:8}[inst.size]  # Size in bytes.
+        _observe_access(s, inst, address)
         if inst.s:  # STORE
             if size == 8:  # 64 bit store.
                 s.mem.write(address,     4, s.rf[inst.rd], from_core=s.coreid)
@@ -110,11 +119,10 @@ def make_ldstrpm_executor(is16bit):
             memory[address] = RD;
             RN = RN +/- RM;
         """
-        if is16bit:
-            inst.bits &= 0xffff
         address = s.rf[inst.rn]
         index = s.rf[inst.rm]
         size = {0:1, 1:2, 2:4, 3:8}[inst.size]  # Size in bytes.
+        _observe_access(s, inst, address)
         if inst.s:  # STORE
             if size == 8:  # 64 bit store.
                 s.mem.write(address,     4, s.rf[inst.rd], from_core=s.coreid)
@@ -170,6 +178,7 @@ within the on-chip local memory and must be greater than 0x00100000 (2^20).
     if value:
         s.rf[inst.rd] = value
     else:
-        s.mem.write(address, size, s.rf[inst.rd], from_core=s.coreid)
+        s.mem.write(address, size, s.rf[inst.rd], from_core=s.coreid,
+                    atomic=True)
         s.rf[inst.rd] = 0
     s.pc += 4
@@ -8,8 +8,6 @@ def make_movcond_executor(is16bit):
         IF (Passed) <COND> then
             RD = RN
         """
-        if is16bit:
-            inst.bits &= 0xffff
         rd = inst.rd
         rn = inst.rn
         if condition_passed(s, inst.cond):
@@ -24,8 +22,6 @@ def make_movimm_executor(is16bit, is_t):
         """
         RD=<imm>
         """
-        if is16bit:
-            inst.bits &= 0xffff
         if is_t:
             s.rf[inst.rd] = ((s.rf[inst.rd] & 0xffff) | (inst.imm16 << 16))
         else:
@@ -61,8 +57,6 @@ def make_mov_executor(is16bit, rd_is_special=False, rn_is_special=False):
         """
         RD=RN
         """
-        if is16bit:
-            inst.bits &= 0xffff
         if rd_is_special:
             rd_address, _ = get_mmr_address(inst.rn, inst.mmr)
             rn = s.rf[inst.rd]
@@ -1,76 +1,37 @@
-class Instruction(object):
-    def __init__(self, bits, name):
-        self.bits = bits
-        self.name  = name
-
-    @property
-    def rd(self):
-        return ((self.bits >> 13) & 0x7) | ((self.bits >> 26) & 0x38)
-
-    @property
-    def rm(self):
-        return ((self.bits >> 7) & 0x7) | ((self.bits >> 20) & 0x38)
-
-    @property
-    def rn(self):
-        return ((self.bits >> 10) & 0x7) | ((self.bits >> 23) & 0x38)
-
-    @property
-    def imm3(self):
-        return (self.bits >> 7) & 0x7
-
-    @property
-    def imm5(self):
-        return (self.bits >> 5) & 31
-
-    @property
-    def imm11(self):
-        return ((self.bits >> 7) & 0x7) | ((self.bits >> 13) & (0xff << 3))
-
-    @property
-    def imm16(self):
-        return ((self.bits >> 5) & 255) | ((self.bits >> 12) & 0xff00)
-
-    @property
-    def mmr(self):
-        return (self.bits >> 20) & 0x3
+from revelation.isa import mnemonic_indices
 
-    @property
-    def t5(self):
-        return (self.bits >> 10) & 31
 
-    @property
-    def cond(self):
-        return (self.bits >> 4) & 15
-
-    @property
-    def bcond_imm(self):
-        return self.bits >> 8
-
-    @property
-    def size(self):
-        return (self.bits >> 5) & 3
-
-    @property
-    def sub(self):
-        return (self.bits >> 24) & 1
-
-    @property
-    def sub20(self):
-        return (self.bits >> 20) & 1
-
-    @property
-    def s(self):
-        return (self.bits >> 4) & 1
-
-    @property
-    def bit2(self):
-        """Get bit 2 of an instruction.
-        """
-        return (self.bits >> 2) & 1
-
-    @property
-    def bit0(self):
-        """Get bit 0 of an instruction.
-        """
-        return self.bits & 1
+class Instruction(object):
+    """A decoded instruction.
+    All operand fields are extracted when the instruction is created, so that
+    instructions held in a decode cache can be executed again without any
+    further bit-twiddling. The upper half-word of a 16 bit instruction is
+    masked off here, rather than in the execute functions.
+    """
+
+    def __init__(self, bits, name, execute=None):
+        self.opcode = bits  # Raw bits, as fetched from memory.
+        if name is not None and name.endswith('16'):
+            bits &= 0xffff
+        self.bits = bits
+        self.name = name
+        # Position of the name in revelation.isa.mnemonics, or -1 if unknown.
+        self.index = -1 if name is None else mnemonic_indices.get(name, -1)
+        self.execute = execute  # Execute function returned by the decoder.
+        self.rd = ((bits >> 13) & 0x7) | ((bits >> 26) & 0x38)
+        self.rm = ((bits >> 7) & 0x7) | ((bits >> 20) & 0x38)
+        self.rn = ((bits >> 10) & 0x7) | ((bits >> 23) & 0x38)
+        self.imm3 = (bits >> 7) & 0x7
+        self.imm5 = (bits >> 5) & 31
+        self.imm11 = ((bits >> 7) & 0x7) | ((bits >> 13) & (0xff << 3))
+        self.imm16 = ((bits >> 5) & 255) | ((bits >> 12) & 0xff00)
+        self.mmr = (bits >> 20) & 0x3
+        self.t5 = (bits >> 10) & 31
+        self.cond = (bits >> 4) & 15
+        self.bcond_imm = bits >> 8
+        self.size = (bits >> 5) & 3
+        self.sub = (bits >> 24) & 1
+        self.sub20 = (bits >> 20) & 1
+        self.s = (bits >> 4) & 1
+        self.bit2 = (bits >> 2) & 1  # Bit 2 of the instruction.
+        self.bit0 = bits & 1         # Bit 0 of the instruction.
@@ -99,6 +99,15 @@ encodings = [
     ['unimpl',      'xxxxxxxx_xxxx1111_xxxxxx00_00001111'],
 ]
 
+# Each instruction name once, in the order of encodings. Counters kept for
+# each instruction are indexed by position in this list (see Instruction.index).
+mnemonics = []
+mnemonic_indices = {}  # name -> position in mnemonics.
+for _name, _ in encodings:
+    if _name not in mnemonic_indices:
+        mnemonic_indices[_name] = len(mnemonics)
+        mnemonics.append(_name)
+
 
 # Branch instructions
 execute_bcond32 = execute_branch.make_bcond_executor(False)
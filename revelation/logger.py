@@ -1,16 +1,112 @@
+from pydgin.debug import pad, pad_hex
+
+import os
+
+FLUSH_BYTES = 1 << 20  # Default size of the trace held before it is written.
+
+# Flags in the order they are written to the trace by --debug flags.
+FLAG_NAMES = ['AN', 'AZ', 'AC', 'AV', 'AVS', 'BN', 'BZ', 'BIS', 'BUS', 'BV',
+              'BVS']
+
+
+def format_instruction(pc, opcode, name, num_insts):
+    return '%s %s %s %s' % (pad('%x' % pc, 8, ' ', False), pad_hex(opcode),
+                            pad(name, 12), pad('%d' % num_insts, 8))
+
+
+def format_register(is_write, index, value):
+    return ' :: %s.RF[%s] = %s' % ('WR' if is_write else 'RD',
+                                   pad('%d' % index, 2), pad_hex(value))
+
+
+def format_memory(is_write, address, value):
+    return ' :: %s.MEM[%s] = %s' % ('WR' if is_write else 'RD',
+                                    pad_hex(address), pad_hex(value))
+
+
+def format_flags(flags):
+    """'flags' has a bit set for each of FLAG_NAMES which is set, with the
+    first name in bit 0.
+    """
+    parts = []
+    for index, name in enumerate(FLAG_NAMES):
+        parts.append('%s=%s' % (name, 'True' if (flags >> index) & 1
+                                else 'False'))
+    return ' ' + ' '.join(parts)
+
+
 class Logger(object):
     """Simple logger which writes to a file.
     Always overwrites, never appends.
+    Each log_* method writes one event of the --debug trace. See
+    revelation.trace.BinaryLogger for a logger which writes the same events
+    in a compact binary form.
+    Events are held in memory and written once flush_bytes have been logged
+    (or only by flush() and close(), if flush_bytes is 0). If ring_size is
+    not 0, only the last ring_size instructions are kept, and they are
+    written by flush() or close(), e.g. when the simulation aborts.
     """
-    def __init__(self, filename):
-        self.stream = open(filename, 'w')
+    def __init__(self, filename, flush_bytes=FLUSH_BYTES, ring_size=0):
+        self.fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                          0644)
+        self.flush_bytes = flush_bytes
+        self.chunks = []  # Unwritten events, or the current instruction's.
+        self.buffered = 0
+        self.ring = [''] * ring_size  # Events of the last instructions.
+        self.ring_next = 0
+
+    def _write_out(self, data):
+        written = 0
+        while written < len(data):
+            written += os.write(self.fd, data[written:])
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.buffered += len(data)
+        if (len(self.ring) == 0 and self.flush_bytes > 0 and
+              self.buffered >= self.flush_bytes):
+            self.flush()
+
+    def end_instruction(self):
+        """Keep the events since the last call in the ring buffer, if any.
+        """
+        if len(self.ring) == 0:
+            return
+        self.ring[self.ring_next] = ''.join(self.chunks)
+        self.ring_next = (self.ring_next + 1) % len(self.ring)
+        self.chunks = []
+        self.buffered = 0
+
+    def flush(self):
+        """Write every event which is held in memory.
+        """
+        size = len(self.ring)
+        for index in range(size):
+            self._write_out(self.ring[(self.ring_next + index) % size])
+            self.ring[(self.ring_next + index) % size] = ''
+        self._write_out(''.join(self.chunks))
+        self.chunks = []
+        self.buffered = 0
 
     def log(self, message):
-        try:
-            self.stream.write(message)
-            self.stream.flush()
-        except Exception:  # pragma: no cover
-            self.close()
+        self.write(message)
+
+    def log_instruction(self, pc, opcode, name, num_insts):
+        self.write(format_instruction(pc, opcode, name, num_insts))
+
+    def log_end_instruction(self):
+        self.write('\n')
+        self.end_instruction()
+
+    def log_register(self, is_write, index, value):
+        self.write(format_register(is_write, index, value))
+
+    def log_memory(self, is_write, address, value):
+        self.write(format_memory(is_write, address, value))
+
+    def log_flags(self, flags):
+        self.write(format_flags(flags))
 
     def close(self):
-        self.stream.close()
+        self.flush()
+        os.close(self.fd)
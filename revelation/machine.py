@@ -1,24 +1,86 @@
-from revelation.registers import LOCAL_PC_ADDRESS, reg_map
-from revelation.storage import MemoryMappedRegisterFile
+from revelation.dma import DMAChannel
+from revelation.instruction import Instruction
+from revelation.isa import decode
+from revelation.registers import reg_map
+from revelation.storage import RegisterFile, TracedRegisterFile
+from revelation.timing import CoreTiming
 
 
 RESET_ADDR = 0
+_PC = reg_map['pc']
+_STATUS = reg_map['STATUS']
+_CONFIG = reg_map['CONFIG']
+# Bits of STATUS and CONFIG which are cached as fields of State.
+_STATUS_FLAG_BITS = 0x000ff7ff
+_CONFIG_FIELD_BITS = 0x064effff
 
 
 class State(object):
 
     def __init__(self, memory, debug, coreid=0x808, logger=None):
-        self.rf = MemoryMappedRegisterFile(memory, coreid, logger)
+        # STATUS flags. These are cached here, rather than in the register
+        # file, as almost every instruction reads or writes some of them.
+        self.ACTIVE    = False
+        self.GID       = False
+        self.SUPERUSER = False
+        self.WAND      = False
+        self.AZ        = False
+        self.AN        = False
+        self.AC        = False
+        self.AV        = False
+        self.BZ        = False
+        self.BN        = False
+        self.BV        = False
+        self.AVS       = False
+        self.BIS       = False
+        self.BVS       = False
+        self.BUS       = False
+        self.EXCAUSE   = 0
+        # CONFIG fields.
+        self.RMODE            = False
+        self.IEN              = False
+        self.OEN              = False
+        self.UEN              = False
+        self.CTIMER0CONFIG    = 0
+        self.CTIMER1CONFIG    = 0
+        self.CTRLMODE         = 0
+        self.ARITHMODE        = 0
+        self.LPMODE           = False
+        self.ENABLE_USER_MODE = False
+        self.TIMERWRAP        = False  # IGNORED: Only available in Epiphany-IV.
+        if logger is None:
+            self.rf = RegisterFile(memory, coreid, logger)
+        else:
+            self.rf = TracedRegisterFile(memory, coreid, logger)
+        self.rf.state = self
         self.coreid = coreid
         self.mem = memory
+        self.dma = [DMAChannel(self, 0), DMAChannel(self, 1)]
+        self.decode_cache = {}  # pc -> revelation.instruction.Instruction.
+        self.mem.decode_caches[coreid] = self.decode_cache
+        self.block_cache = {}  # pc -> revelation.blocks.BasicBlock.
+        self.block_cache_version = memory.code_version
         self.debug = debug
         self.rf.debug = debug
         self.mem.debug = debug
         self.num_insts = 0
+        self.timing = CoreTiming()  # Cycles, counted with --timing.
         self.running = True
         self.is_first_core = False  # Is this the top-left (NW) core?
         self.is_in_hardware_loop = False
+        # Set when ILAT, GID or another register which affects interrupts may
+        # have changed, cleared when the interrupt check has been made.
+        self.interrupt_pending = True
+        # Set when a DMA chain has been paused (see revelation.dma), together
+        # with interrupt_pending, so that it is resumed after the next
+        # instruction.
+        self.dma_pending = False
         self.logger = logger
+        self.trace_syscalls = False  # Set by TracedState.
+        self.profile = None  # revelation.profile.Profile, with --hot-spots.
+        self.stats = None    # revelation.stats.Stats, with --stats.
+        self.call_stack = None  # revelation.profile.CallStack, with --sample.
+        self.timeline = None  # revelation.timeline.Timeline, with --timeline.
         # Epiphany III exceptions.
         self.exceptions = { 'UNIMPLEMENTED'  : 0b0100,
                             'SWI'            : 0b0001,
@@ -61,15 +123,29 @@ class State(object):
 
     @property
     def pc(self):
-        return self.mem.iread(LOCAL_PC_ADDRESS, 4, from_core=self.coreid)
+        return self.rf.regs[_PC]
 
     @pc.setter
     def pc(self, value):
-        return self.mem.write(LOCAL_PC_ADDRESS, 4, value, from_core=self.coreid)
+        self.rf.regs[_PC] = value & 0xffffffff
 
     def fetch_pc(self):
         # Override method from base class. Needed by Pydgin.
-        return self.mem.iread(LOCAL_PC_ADDRESS, 4, from_core=self.coreid)
+        return self.rf.regs[_PC]
+
+    def fetch_instruction(self, pc):
+        """Fetch and decode the instruction at pc. Instructions which lie
+        inside a code block are decoded once and cached. Memory.write()
+        invalidates the cache when a code block is modified.
+        """
+        instruction = self.decode_cache.get(pc, None)
+        if instruction is None:
+            opcode = self.mem.iread(pc, 4, from_core=self.coreid)
+            mnemonic, function = decode(opcode)
+            instruction = Instruction(opcode, mnemonic, function)
+            if self.mem.is_code_address(pc, 4, from_core=self.coreid):
+                self.decode_cache[pc] = instruction
+        return instruction
 
     def get_pending_interrupt(self):
         ipend_highest_bit = -1
@@ -88,254 +164,145 @@ class State(object):
                 break
         return ilat_highest_bit
 
-    def _get_nth_bit_of_register(self, register, n):
-        return bool(self.rf[reg_map[register]] & (1 << n))
+    def resume_dma(self):
+        """Carry on with any DMA chain which was paused.
+        """
+        self.dma_pending = False
+        for channel in self.dma:
+            channel.resume()
 
-    def _set_nth_bit_of_register(self, register, n, value):
-        if value:
-            self.rf[reg_map[register]] |= (1 << n)
-        else:
-            self.rf[reg_map[register]] &= ~(1 << n)
+    # Hooks for the --debug trace, which do nothing here. See TracedState.
 
     def debug_flags(self):
-        if self.debug.enabled('flags') and self.is_first_core and self.logger:
-            self.logger.log(' AN=%s AZ=%s AC=%s AV=%s AVS=%s BN=%s BZ=%s '
-                            'BIS=%s BUS=%s BV=%s BVS=%s' %
-                   (self.AN, self.AZ, self.AC, self.AV, self.AVS,
-                    self.BN, self.BZ, self.BIS, self.BUS, self.BV, self.BVS))
-
-    # STATUS bits.
-
-    @property
-    def ACTIVE(self):
-        return self._get_nth_bit_of_register('STATUS', 0)
-
-    @ACTIVE.setter
-    def ACTIVE(self, value):
-        self._set_nth_bit_of_register('STATUS', 0, value)
-
-    @property
-    def GID(self):
-        return self._get_nth_bit_of_register('STATUS', 1)
-
-    @GID.setter
-    def GID(self, value):
-        self._set_nth_bit_of_register('STATUS', 1, value)
-
-    @property
-    def SUPERUSER(self):
-        return self._get_nth_bit_of_register('STATUS', 2)
-
-    @SUPERUSER.setter
-    def SUPERUSER(self, value):
-        self._set_nth_bit_of_register('STATUS', 2, value)
-
-    @property
-    def WAND(self):
-        return self._get_nth_bit_of_register('STATUS', 3)
-
-    @WAND.setter
-    def WAND(self, value):
-        self._set_nth_bit_of_register('STATUS', 3, value)
-
-    @property
-    def AZ(self):
-        return self._get_nth_bit_of_register('STATUS', 4)
-
-    @AZ.setter
-    def AZ(self, value):
-        self._set_nth_bit_of_register('STATUS', 4, value)
-
-    @property
-    def AN(self):
-        return self._get_nth_bit_of_register('STATUS', 5)
-
-    @AN.setter
-    def AN(self, value):
-        self._set_nth_bit_of_register('STATUS', 5, value)
-
-    @property
-    def AC(self):
-        return self._get_nth_bit_of_register('STATUS', 6)
-
-    @AC.setter
-    def AC(self, value):
-        self._set_nth_bit_of_register('STATUS', 6, value)
-
-    @property
-    def AV(self):
-        return self._get_nth_bit_of_register('STATUS', 7)
-
-    @AV.setter
-    def AV(self, value):
-        self._set_nth_bit_of_register('STATUS', 7, value)
-
-    @property
-    def BZ(self):
-        return self._get_nth_bit_of_register('STATUS', 8)
-
-    @BZ.setter
-    def BZ(self, value):
-        self._set_nth_bit_of_register('STATUS', 8, value)
-
-    @property
-    def BN(self):
-        return self._get_nth_bit_of_register('STATUS', 9)
-
-    @BN.setter
-    def BN(self, value):
-        self._set_nth_bit_of_register('STATUS', 9, value)
-
-    @property
-    def BV(self):
-        return self._get_nth_bit_of_register('STATUS', 10)
-
-    @BV.setter
-    def BV(self, value):
-        self._set_nth_bit_of_register('STATUS', 10, value)
-
-    @property
-    def AVS(self):
-        return self._get_nth_bit_of_register('STATUS', 12)
-
-    @AVS.setter
-    def AVS(self, value):
-        self._set_nth_bit_of_register('STATUS', 12, value)
+        pass
 
-    @property
-    def BIS(self):
-        return self._get_nth_bit_of_register('STATUS', 13)
-
-    @BIS.setter
-    def BIS(self, value):
-        self._set_nth_bit_of_register('STATUS', 13, value)
-
-    @property
-    def BVS(self):
-        return self._get_nth_bit_of_register('STATUS', 14)
-
-    @BVS.setter
-    def BVS(self, value):
-        self._set_nth_bit_of_register('STATUS', 14, value)
+    def trace_instruction(self, pc, instruction):
+        pass
 
-    @property
-    def BUS(self):
-        return self._get_nth_bit_of_register('STATUS', 15)
-
-    @BUS.setter
-    def BUS(self, value):
-        self._set_nth_bit_of_register('STATUS', 15, value)
+    def trace_end_instruction(self):
+        pass
 
-    @property
-    def EXCAUSE(self):
-        return (self.rf[reg_map['STATUS']] >> 16) & 0xf
+    # STATUS bits.
 
-    @EXCAUSE.setter
-    def EXCAUSE(self, value):
-        self._set_nth_bit_of_register('STATUS', 16, value & 0x1)
-        self._set_nth_bit_of_register('STATUS', 17, (value >> 1) & 0x1)
-        self._set_nth_bit_of_register('STATUS', 18, (value >> 2) & 0x1)
-        self._set_nth_bit_of_register('STATUS', 19, (value >> 3) & 0x1)
+    def get_status(self):
+        """Build the STATUS register from the cached flags. Bits which are
+        not cached as flags are held in the register file.
+        """
+        status = self.rf.regs[_STATUS] & ~_STATUS_FLAG_BITS
+        if self.ACTIVE:    status |= 1 << 0
+        if self.GID:       status |= 1 << 1
+        if self.SUPERUSER: status |= 1 << 2
+        if self.WAND:      status |= 1 << 3
+        if self.AZ:        status |= 1 << 4
+        if self.AN:        status |= 1 << 5
+        if self.AC:        status |= 1 << 6
+        if self.AV:        status |= 1 << 7
+        if self.BZ:        status |= 1 << 8
+        if self.BN:        status |= 1 << 9
+        if self.BV:        status |= 1 << 10
+        if self.AVS:       status |= 1 << 12
+        if self.BIS:       status |= 1 << 13
+        if self.BVS:       status |= 1 << 14
+        if self.BUS:       status |= 1 << 15
+        status |= (self.EXCAUSE & 0xf) << 16
+        return status
+
+    def set_status(self, value):
+        """Write the STATUS register back into the cached flags.
+        """
+        self.rf.regs[_STATUS] = value & ~_STATUS_FLAG_BITS
+        self.interrupt_pending = True  # GID may have been cleared.
+        self.ACTIVE    = bool(value & (1 << 0))
+        self.GID       = bool(value & (1 << 1))
+        self.SUPERUSER = bool(value & (1 << 2))
+        self.WAND      = bool(value & (1 << 3))
+        self.AZ        = bool(value & (1 << 4))
+        self.AN        = bool(value & (1 << 5))
+        self.AC        = bool(value & (1 << 6))
+        self.AV        = bool(value & (1 << 7))
+        self.BZ        = bool(value & (1 << 8))
+        self.BN        = bool(value & (1 << 9))
+        self.BV        = bool(value & (1 << 10))
+        self.AVS       = bool(value & (1 << 12))
+        self.BIS       = bool(value & (1 << 13))
+        self.BVS       = bool(value & (1 << 14))
+        self.BUS       = bool(value & (1 << 15))
+        self.EXCAUSE   = (value >> 16) & 0xf
 
     # CONFIG bits.
 
-    @property
-    def RMODE(self):
-        return self._get_nth_bit_of_register('CONFIG', 0)
-
-    @RMODE.setter
-    def RMODE(self, value):
-        self._set_nth_bit_of_register('CONFIG', 0, value)
-
-    @property
-    def IEN(self):
-        return self._get_nth_bit_of_register('CONFIG', 1)
-
-    @IEN.setter
-    def IEN(self, value):
-        self._set_nth_bit_of_register('CONFIG', 1, value)
-
-    @property
-    def OEN(self):
-        return self._get_nth_bit_of_register('CONFIG', 2)
-
-    @OEN.setter
-    def OEN(self, value):
-        self._set_nth_bit_of_register('CONFIG', 2, value)
-
-    @property
-    def UEN(self):
-        return self._get_nth_bit_of_register('CONFIG', 3)
-
-    @UEN.setter
-    def UEN(self, value):
-        self._set_nth_bit_of_register('CONFIG', 3, value)
+    def get_config(self):
+        """Build the CONFIG register from the cached fields. Bits which are
+        not cached as fields are held in the register file.
+        """
+        config = self.rf.regs[_CONFIG] & ~_CONFIG_FIELD_BITS
+        if self.RMODE:            config |= 1 << 0
+        if self.IEN:              config |= 1 << 1
+        if self.OEN:              config |= 1 << 2
+        if self.UEN:              config |= 1 << 3
+        config |= (self.CTIMER0CONFIG & 0xf) << 4
+        config |= (self.CTIMER1CONFIG & 0xf) << 8
+        config |= (self.CTRLMODE & 0xf) << 12
+        config |= (self.ARITHMODE & 0x7) << 17
+        if self.LPMODE:           config |= 1 << 22
+        if self.ENABLE_USER_MODE: config |= 1 << 25
+        if self.TIMERWRAP:        config |= 1 << 26
+        return config
+
+    def set_config(self, value):
+        """Write the CONFIG register back into the cached fields.
+        """
+        self.rf.regs[_CONFIG] = value & ~_CONFIG_FIELD_BITS
+        self.RMODE            = bool(value & (1 << 0))
+        self.IEN              = bool(value & (1 << 1))
+        self.OEN              = bool(value & (1 << 2))
+        self.UEN              = bool(value & (1 << 3))
+        self.CTIMER0CONFIG    = (value >> 4) & 0xf
+        self.CTIMER1CONFIG    = (value >> 8) & 0xf
+        self.CTRLMODE         = (value >> 12) & 0xf
+        self.ARITHMODE        = (value >> 17) & 0x7
+        self.LPMODE           = bool(value & (1 << 22))
+        self.ENABLE_USER_MODE = bool(value & (1 << 25))
+        self.TIMERWRAP        = bool(value & (1 << 26))
+
+
+class TracedState(State):
+    """Core which writes its instructions and flags to the --debug trace, if
+    it is the first core. Which events are traced is decided once, here,
+    rather than on every instruction.
+    """
 
-    @property
-    def CTIMER0CONFIG(self):
-        return (self.rf[reg_map['CONFIG']] >> 4) & 0xf
-
-    @CTIMER0CONFIG.setter
-    def CTIMER0CONFIG(self, value):
-        self._set_nth_bit_of_register('CONFIG', 4, value & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 5, (value >> 1) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 6, (value >> 2) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 7, (value >> 3) & 0x1)
-
-    @property
-    def CTIMER1CONFIG(self):
-        return (self.rf[reg_map['CONFIG']] >> 8) & 0xf
-
-    @CTIMER1CONFIG.setter
-    def CTIMER1CONFIG(self, value):
-        self._set_nth_bit_of_register('CONFIG', 8, value & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 9, (value >> 1) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 10, (value >> 2) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 11, (value >> 3) & 0x1)
-
-    @property
-    def CTRLMODE(self):
-        return (self.rf[reg_map['CONFIG']] >> 12) & 0xf
-
-    @CTRLMODE.setter
-    def CTRLMODE(self, value):
-        self._set_nth_bit_of_register('CONFIG', 12, value & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 13, (value >> 1) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 14, (value >> 2) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 15, (value >> 3) & 0x1)
-
-    @property
-    def ARITHMODE(self):
-        return (self.rf[reg_map['CONFIG']] >> 17) & 0x7
-
-    @ARITHMODE.setter
-    def ARITHMODE(self, value):
-        self._set_nth_bit_of_register('CONFIG', 17, value & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 18, (value >> 1) & 0x1)
-        self._set_nth_bit_of_register('CONFIG', 19, (value >> 2) & 0x1)
-
-    @property
-    def LPMODE(self):
-        return self._get_nth_bit_of_register('CONFIG', 22)
-
-    @LPMODE.setter
-    def LPMODE(self, value):
-        self._set_nth_bit_of_register('CONFIG', 22, value)
-
-    @property
-    def ENABLE_USER_MODE(self):
-        return self._get_nth_bit_of_register('CONFIG', 25)
-
-    @ENABLE_USER_MODE.setter
-    def ENABLE_USER_MODE(self, value):
-        self._set_nth_bit_of_register('CONFIG', 25, value)
+    def __init__(self, memory, debug, coreid=0x808, logger=None):
+        State.__init__(self, memory, debug, coreid=coreid, logger=logger)
+        self.trace_insts = debug.enabled('trace')
+        self.trace_flags = debug.enabled('flags')
+        self.trace_syscalls = debug.enabled('syscalls')
 
-    @property
-    def TIMERWRAP(self):
-        """IGNORED: Only available in Epiphany-IV."""
-        return self._get_nth_bit_of_register('CONFIG', 26)
-
-    @TIMERWRAP.setter
-    def TIMERWRAP(self, value):
-        """IGNORED: Only available in Epiphany-IV."""
-        self._set_nth_bit_of_register('CONFIG', 26, value)
+    def debug_flags(self):
+        if not (self.trace_flags and self.is_first_core):
+            return
+        flags = 0  # One bit each, in the order of logger.FLAG_NAMES.
+        for index, flag in enumerate([self.AN, self.AZ, self.AC, self.AV,
+                                      self.AVS, self.BN, self.BZ, self.BIS,
+                                      self.BUS, self.BV, self.BVS]):
+            if flag:
+                flags |= 1 << index
+        self.logger.log_flags(flags)
+
+    def trace_instruction(self, pc, instruction):
+        if self.trace_insts and self.is_first_core:
+            self.logger.log_instruction(pc, instruction.opcode,
+                                        instruction.name, self.num_insts)
+
+    def trace_end_instruction(self):
+        if self.trace_insts and self.is_first_core:
+            self.logger.log_end_instruction()
+
+
+def new_core_state(memory, debug, coreid=0x808, logger=None):
+    """Return the state of a core which writes to the --debug trace if there
+    is a logger, or has no tracing code at all if not.
+    """
+    if logger is None:
+        return State(memory, debug, coreid=coreid)
+    return TracedState(memory, debug, coreid=coreid, logger=logger)
@@ -0,0 +1,275 @@
+"""Contention model of the mesh network between cores, enabled by --mesh.
+
+Every access from one core to memory outside it travels over the mesh with
+XY routing: first along the row to the destination column, then along the
+column. There are three meshes, each with a link in every direction between
+neighbouring nodes:
+
+    cMesh  Writes to other cores, and the data returned by reads.
+    rMesh  Read requests, which take more of a link than a write.
+    xMesh  Reads and writes of memory off the chip, e.g. external RAM.
+
+A transaction holds each link on its path for _LINK_CYCLES[mesh] cycles, and
+waits while the link is held by an earlier transaction. Time is measured by
+the --timing cycle count of the core which makes each access. Those clocks
+drift apart, so a link which is held for more than _SKEW_CYCLES from now is
+taken to have been reserved by a core whose clock is ahead, and the new
+transaction does not wait for it. Contention between cores whose clocks have
+drifted further apart than that is not seen.
+
+Writes to the memory or registers of another simulated core are held back
+until the clock of the next core to execute an instruction has passed their
+arrival time, and any which are left when the simulation stops are then made
+at once. A core which reads memory it has written to, while the write is in
+flight, first has that write (and any earlier writes to the same bytes) made,
+so it always reads back its own stores. Writes to external RAM, and TESTSET,
+which is atomic at its target, hold the links on their paths but are made at
+once. A read stalls the reading core for the whole round trip. Links off the
+edge of the simulated cores are not modelled, but each hop over them still
+takes MESH_HOP_CYCLES.
+"""
+from pydgin.debug import pad
+
+from revelation.storage import MESH_HOP_CYCLES
+from revelation.utils import get_coords_from_coreid, zfill
+
+CMESH = 0
+RMESH = 1
+XMESH = 2
+_MESH_NAMES = ['cMesh', 'rMesh', 'xMesh']
+_LINK_CYCLES = [1, 8, 2]  # Cycles a transaction holds a link, for each mesh.
+# Links which are held for longer than this have been reserved by a core whose
+# clock is ahead, and are treated as free.
+_SKEW_CYCLES = 256
+
+_EAST = 0
+_WEST = 1
+_NORTH = 2
+_SOUTH = 3
+_DIRECTIONS = 4
+
+_BUSIEST_LINKS = 5  # Number of links listed at exit.
+
+
+def _percent(busy, cycles):
+    if cycles == 0:
+        return 0
+    return busy * 100 / cycles
+
+
+def _make(memory, address, num_bytes, value):
+    """Make a write which has arrived. It is made as if by the core which
+    owns the memory, so that it is not sent again.
+    """
+    memory.write(address, num_bytes, value, from_core=address >> 20)
+
+
+class Mesh(object):
+    """Links between the simulated cores, and writes which are in flight.
+    """
+
+    def __init__(self, states):
+        coreids = states.keys()
+        coreids.sort()
+        self.first_row = coreids[0] >> 6
+        self.first_col = coreids[0] & 0x3f
+        last_row = self.first_row
+        last_col = self.first_col
+        for coreid in coreids:
+            last_row = max(last_row, coreid >> 6)
+            last_col = max(last_col, coreid & 0x3f)
+        self.rows = last_row - self.first_row + 1
+        self.cols = last_col - self.first_col + 1
+        self.clocks = {}  # coreid -> revelation.timing.CoreTiming.
+        for coreid in coreids:
+            self.clocks[coreid] = states[coreid].timing
+        num_links = 3 * self.rows * self.cols * _DIRECTIONS
+        self.busy_until = [0] * num_links   # Cycle at which a link is free.
+        self.busy_cycles = [0] * num_links  # Cycles for which it was held.
+        self.wait_cycles = [0] * num_links  # Cycles transactions waited.
+        # (arrival, sequence, from_coreid, address, num_bytes, value).
+        self.in_flight = []
+        self.sequence = 0    # Keeps writes which arrive together in order.
+
+    def _now(self, coreid):
+        clock = self.clocks.get(coreid, None)
+        if clock is None:
+            return 0
+        return clock.cycles
+
+    def _on_grid(self, row, col):
+        return (self.first_row <= row < self.first_row + self.rows and
+                self.first_col <= col < self.first_col + self.cols)
+
+    def _link(self, mesh, row, col, direction):
+        node = (row - self.first_row) * self.cols + (col - self.first_col)
+        return (mesh * self.rows * self.cols + node) * _DIRECTIONS + direction
+
+    def route(self, mesh, from_coreid, to_coreid, time):
+        """Send a transaction from one node to another, starting at cycle
+        'time'. Return the cycle at which it arrives.
+        """
+        row, col = get_coords_from_coreid(from_coreid)
+        to_row, to_col = get_coords_from_coreid(to_coreid)
+        while row != to_row or col != to_col:
+            if col < to_col:
+                direction, next_row, next_col = _EAST, row, col + 1
+            elif col > to_col:
+                direction, next_row, next_col = _WEST, row, col - 1
+            elif row > to_row:
+                direction, next_row, next_col = _NORTH, row - 1, col
+            else:
+                direction, next_row, next_col = _SOUTH, row + 1, col
+            if self._on_grid(row, col):
+                link = self._link(mesh, row, col, direction)
+                start = time
+                if time < self.busy_until[link] <= time + _SKEW_CYCLES:
+                    start = self.busy_until[link]
+                    self.wait_cycles[link] += start - time
+                self.busy_until[link] = max(self.busy_until[link],
+                                            start + _LINK_CYCLES[mesh])
+                self.busy_cycles[link] += _LINK_CYCLES[mesh]
+                time = start
+            time += MESH_HOP_CYCLES
+            row, col = next_row, next_col
+        return time
+
+    def _is_off_chip(self, coreid):
+        row, col = get_coords_from_coreid(coreid)
+        return not self._on_grid(row, col)
+
+    def read(self, from_coreid, to_coreid):
+        """Return the cycles taken by the round trip of a read from to_coreid,
+        made by from_coreid.
+        """
+        now = self._now(from_coreid)
+        if self._is_off_chip(to_coreid):
+            arrival = self.route(XMESH, from_coreid, to_coreid, now)
+            return self.route(XMESH, to_coreid, from_coreid, arrival) - now
+        arrival = self.route(RMESH, from_coreid, to_coreid, now)
+        return self.route(CMESH, to_coreid, from_coreid, arrival) - now
+
+    def holds_back(self, from_coreid, address):
+        """Return True if a write by from_coreid to the global address
+        'address' goes to another simulated core, and so is sent with
+        send_write() rather than made at once.
+        """
+        to_coreid = address >> 20
+        return to_coreid != from_coreid and not self._is_off_chip(to_coreid)
+
+    def _route_write(self, from_coreid, address):
+        to_coreid = address >> 20
+        mesh = XMESH if self._is_off_chip(to_coreid) else CMESH
+        return self.route(mesh, from_coreid, to_coreid, self._now(from_coreid))
+
+    def route_write(self, from_coreid, address):
+        """Hold the links on the path of a write which is made at once.
+        """
+        self._route_write(from_coreid, address)
+
+    def send_write(self, from_coreid, address, num_bytes, value):
+        """Send a write to another core. It is made when deliver() is called
+        after it has arrived.
+        """
+        arrival = self._route_write(from_coreid, address)
+        self.sequence += 1
+        write = (arrival, self.sequence, from_coreid, address, num_bytes,
+                 value)
+        index = len(self.in_flight)
+        while index > 0 and self.in_flight[index - 1][0] > arrival:
+            index -= 1
+        self.in_flight.insert(index, write)
+
+    def forward(self, memory, from_coreid, address, num_bytes):
+        """Before from_coreid reads num_bytes at the global address 'address',
+        make the writes in flight which it sent to any of those bytes, and
+        every write to them which arrives earlier, in order.
+        """
+        last = -1
+        for index in range(len(self.in_flight)):
+            _, _, source, start, size, _ = self.in_flight[index]
+            if (source == from_coreid and start < address + num_bytes and
+                  address < start + size):
+                last = index
+        if last < 0:
+            return
+        kept = []
+        for index in range(last + 1):
+            write = self.in_flight[index]
+            _, _, _, start, size, value = write
+            if start < address + num_bytes and address < start + size:
+                _make(memory, start, size, value)
+            else:
+                kept.append(write)
+        self.in_flight = kept + self.in_flight[last + 1:]
+
+    def deliver(self, memory, now):
+        """Make every write which has arrived by cycle 'now'.
+        """
+        while len(self.in_flight) > 0 and self.in_flight[0][0] <= now:
+            _, _, _, address, num_bytes, value = self.in_flight.pop(0)
+            _make(memory, address, num_bytes, value)
+
+    def flush(self, memory):
+        """Make every write which is still in flight.
+        """
+        while len(self.in_flight) > 0:
+            _, _, _, address, num_bytes, value = self.in_flight.pop(0)
+            _make(memory, address, num_bytes, value)
+
+    def print_utilization(self, cycles):
+        """Print a heatmap of each mesh which carried any traffic, showing the
+        percentage of 'cycles' for which the busiest link out of each node was
+        held. Then list the busiest links.
+        """
+        num_links = len(self.busy_cycles)
+        links = []  # busy_cycles * num_links + link, so that they sort.
+        for link in range(num_links):
+            if self.busy_cycles[link] > 0:
+                links.append(self.busy_cycles[link] * num_links + link)
+        for mesh in range(3):
+            if not self._carried_traffic(mesh):
+                continue
+            print ('%s utilization, %% of cycles for which the busiest link '
+                   'out of each node was busy:' % _MESH_NAMES[mesh])
+            header = '      '
+            for col in range(self.first_col, self.first_col + self.cols):
+                header += pad('col %s' % zfill(str(col), 2), 7, ' ', False)
+            print header
+            for row in range(self.first_row, self.first_row + self.rows):
+                line = 'row %s' % zfill(str(row), 2)
+                for col in range(self.first_col, self.first_col + self.cols):
+                    busiest = 0
+                    for direction in range(_DIRECTIONS):
+                        link = self._link(mesh, row, col, direction)
+                        busiest = max(busiest, self.busy_cycles[link])
+                    line += pad(str(_percent(busiest, cycles)), 7, ' ', False)
+                print line
+        if len(links) == 0:
+            return
+        links.sort()
+        links.reverse()
+        print 'Busiest mesh links:'
+        for key in links[:_BUSIEST_LINKS]:
+            link = key % num_links
+            print ('    %s busy %d%%, waits %d cycles' %
+                   (self._describe(link),
+                    _percent(self.busy_cycles[link], cycles),
+                    self.wait_cycles[link]))
+
+    def _carried_traffic(self, mesh):
+        first = self._link(mesh, self.first_row, self.first_col, 0)
+        for link in range(first, first + self.rows * self.cols * _DIRECTIONS):
+            if self.busy_cycles[link] > 0:
+                return True
+        return False
+
+    def _describe(self, link):
+        direction = link % _DIRECTIONS
+        node = (link / _DIRECTIONS) % (self.rows * self.cols)
+        mesh = link / (_DIRECTIONS * self.rows * self.cols)
+        row = self.first_row + node / self.cols
+        col = self.first_col + node % self.cols
+        coreid = (row << 6) | col
+        return '%s %s %s' % (_MESH_NAMES[mesh], hex(coreid),
+                             ['east', 'west', 'north', 'south'][direction])
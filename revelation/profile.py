@@ -0,0 +1,321 @@
+"""Execution profiles of each core: per-PC counts for --hot-spots, and
+sampled call stacks for --sample.
+
+With --hot-spots, each core counts the instructions it executes at every PC
+in the code sections of the ELF file (see elf_loader.is_code_section). Each
+section has an array of counters, indexed by the offset of the PC into the
+section in half-words, so counting an instruction is one comparison per
+section and one increment. Instructions outside the code sections, e.g. in
+the interrupt vector table, share a single counter. Without --hot-spots no
+core has a Profile, and nothing is counted.
+
+At exit, the counters are attributed to functions with the ELF symbol table,
+and the functions, basic blocks and instructions in which each core spent the
+most time are printed. Instructions are decoded from memory at exit, so the
+report describes code which modified itself as it was at the end of the run.
+
+With --sample N, each core keeps a shadow call stack instead: BL and JALR
+push the address of the call, and JR LR pops it. Every N ticks the call stack
+and PC of the core which is running are recorded, and at exit the samples are
+written as folded stacks, one line per distinct stack:
+
+    0x808;_start;main;printf;_vfprintf_r 12
+
+The first frame is the core. Tools such as flamegraph.pl draw flame graphs
+from this format. Only calls, returns and the samples themselves cost
+anything, so the overhead is small for intervals of thousands of ticks.
+Returns which do not use JR LR, e.g. longjmp(), leave the shadow stack too
+deep until it unwinds past them.
+"""
+from pydgin.debug import pad, pad_hex
+
+from revelation.blocks import ends_block, instruction_size
+from revelation.elf_loader import is_code_section
+from revelation.utils import format_thousands, get_coords_from_coreid, zfill
+
+MAX_CALL_DEPTH = 256  # Deepest call stack recorded by --sample.
+
+
+class CodeRange(object):
+    """One code section of an ELF file, at the addresses a core executes it.
+    """
+
+    def __init__(self, name, start, size):
+        self.name = name
+        self.start = start
+        self.size = size
+
+
+def get_code_ranges(elf):
+    """Return a CodeRange for each code section of 'elf', the result of a call
+    to pydgin.elf.elf_reader().
+    """
+    ranges = []
+    for section in elf.get_sections():
+        if is_code_section(section.name):
+            ranges.append(CodeRange(section.name, section.addr,
+                                    len(section.data)))
+    return ranges
+
+
+class SymbolTable(object):
+    """The functions in the code ranges of an ELF file, sorted by address.
+    Code before the first symbol of a section is named after the section.
+    Where several symbols share an address, the one with the fewest leading
+    underscores is used, e.g. exit rather than _SHARED_DRAM_, then the first
+    in sorted order.
+    """
+
+    def __init__(self, symbols, ranges):
+        self.ranges = ranges
+        names = {}  # address -> name.
+        for name, address in symbols.items():
+            if _find_range(ranges, address) < 0:
+                continue
+            if address not in names or _is_better_name(name, names[address]):
+                names[address] = name
+        for code_range in ranges:
+            if code_range.start not in names:
+                names[code_range.start] = code_range.name
+        self.addresses = names.keys()
+        self.addresses.sort()
+        self.names = [names[address] for address in self.addresses]
+
+    def find(self, pc):
+        """Return the index of the function which contains pc, or -1 if pc is
+        before the first function.
+        """
+        low = 0
+        high = len(self.addresses)
+        while low < high:
+            middle = (low + high) >> 1
+            if self.addresses[middle] <= pc:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def describe(self, pc):
+        """Return pc as an offset into the function which contains it.
+        """
+        index = self.find(pc)
+        if index < 0:
+            return '0x%s' % pad_hex(pc)
+        offset = pc - self.addresses[index]
+        if offset == 0:
+            return self.names[index]
+        return '%s+0x%x' % (self.names[index], offset)
+
+    def function_name(self, pc):
+        """Return the name of the function which contains pc, or pc in hex if
+        it is outside the code ranges.
+        """
+        if _find_range(self.ranges, pc) < 0:
+            return '0x%s' % pad_hex(pc)
+        return self.names[self.find(pc)]
+
+
+def _leading_underscores(name):
+    count = 0
+    while count < len(name) and name[count] == '_':
+        count += 1
+    return count
+
+
+def _is_better_name(name, other):
+    underscores = _leading_underscores(name)
+    other_underscores = _leading_underscores(other)
+    if underscores != other_underscores:
+        return underscores < other_underscores
+    return name < other
+
+
+def _find_range(ranges, address):
+    for index, code_range in enumerate(ranges):
+        if code_range.start <= address < code_range.start + code_range.size:
+            return index
+    return -1
+
+
+def _hottest(totals, top):
+    """Return the indices of the 'top' largest values in 'totals' which are
+    not 0, largest first. Equal values are in order of index.
+    """
+    size = len(totals)
+    keys = []  # total * size + reversed index, so that they sort.
+    for index in range(size):
+        if totals[index] > 0:
+            keys.append(totals[index] * size + (size - 1 - index))
+    keys.sort()
+    keys.reverse()
+    return [size - 1 - key % size for key in keys[:top]]
+
+
+def _percent(part, whole):
+    if whole == 0:
+        return 0
+    return part * 100 / whole
+
+
+def _format_line(total, num_insts, description):
+    return '        %s %s%%  %s' % (
+        pad(format_thousands(total), 14, ' ', False),
+        pad(str(_percent(total, num_insts)), 3, ' ', False), description)
+
+
+class Profile(object):
+    """The number of instructions executed by one core at each PC.
+    """
+
+    def __init__(self, ranges, symbols):
+        self.ranges = ranges    # List of CodeRange.
+        self.symbols = symbols  # SymbolTable.
+        self.counts = [[0] * ((code_range.size + 1) >> 1)
+                       for code_range in ranges]
+        self.other = 0  # Instructions executed outside every range.
+
+    def count(self, pc):
+        for index in range(len(self.ranges)):
+            offset = pc - self.ranges[index].start
+            if 0 <= offset < self.ranges[index].size:
+                self.counts[index][offset >> 1] += 1
+                return
+        self.other += 1
+
+    def num_insts(self):
+        total = self.other
+        for counts in self.counts:
+            for count in counts:
+                total += count
+        return total
+
+    def function_totals(self):
+        """Return the instructions executed in each function of the symbol
+        table, in the same order.
+        """
+        totals = [0] * len(self.symbols.addresses)
+        for index, code_range in enumerate(self.ranges):
+            counts = self.counts[index]
+            for offset in range(len(counts)):
+                if counts[offset] > 0:
+                    function = self.symbols.find(code_range.start + offset * 2)
+                    assert function >= 0
+                    totals[function] += counts[offset]
+        return totals
+
+    def print_report(self, state, top):
+        """Print the 'top' functions, basic blocks and instructions which
+        'state', the core which was profiled, spent the most time in.
+        """
+        num_insts = self.num_insts()
+        row, col = get_coords_from_coreid(state.coreid)
+        print ('Hot spots on core %s (%s, %s), %s instructions executed:' %
+               (hex(state.coreid), zfill(str(row), 2), zfill(str(col), 2),
+                format_thousands(num_insts)))
+        totals = self.function_totals()
+        print '    Functions:'
+        for index in _hottest(totals, top):
+            print _format_line(totals[index], num_insts,
+                               self.symbols.names[index])
+        # A basic block is a run of instructions which were each executed the
+        # same number of times, ending at the first which can branch.
+        block_starts = []
+        block_sizes = []  # Instructions in each block.
+        block_counts = []
+        block_totals = []
+        names = []
+        name_totals = []
+        name_indices = {}
+        for index, code_range in enumerate(self.ranges):
+            counts = self.counts[index]
+            offset = 0
+            while offset < len(counts):
+                count = counts[offset]
+                if count == 0:
+                    offset += 1
+                    continue
+                block_starts.append(code_range.start + offset * 2)
+                block_counts.append(count)
+                size = 0
+                while offset < len(counts) and counts[offset] == count:
+                    instruction = state.fetch_instruction(code_range.start +
+                                                          offset * 2)
+                    if instruction.name not in name_indices:
+                        name_indices[instruction.name] = len(names)
+                        names.append(instruction.name)
+                        name_totals.append(0)
+                    name_totals[name_indices[instruction.name]] += count
+                    size += 1
+                    offset += instruction_size(instruction) >> 1
+                    if ends_block(instruction):
+                        break
+                block_sizes.append(size)
+                block_totals.append(count * size)
+        print '    Basic blocks:'
+        for index in _hottest(block_totals, top):
+            print _format_line(block_totals[index], num_insts,
+                               '0x%s %s (%d instructions, %s times)' %
+                               (pad_hex(block_starts[index]),
+                                self.symbols.describe(block_starts[index]),
+                                block_sizes[index],
+                                format_thousands(block_counts[index])))
+        print '    Instructions:'
+        for index in _hottest(name_totals, top):
+            print _format_line(name_totals[index], num_insts, names[index])
+        if self.other > 0:
+            print ('    Outside the code sections: %s instructions.' %
+                   format_thousands(self.other))
+
+
+class CallStack(object):
+    """Shadow call stack of one core, for --sample. Calls deeper than
+    MAX_CALL_DEPTH are counted, but not recorded.
+    """
+
+    def __init__(self):
+        self.calls = [0] * MAX_CALL_DEPTH  # Address of each call instruction.
+        self.depth = 0
+        self.overflow = 0  # Calls made deeper than MAX_CALL_DEPTH.
+
+    def push(self, pc):
+        if self.depth < MAX_CALL_DEPTH:
+            self.calls[self.depth] = pc
+            self.depth += 1
+        else:
+            self.overflow += 1
+
+    def pop(self):
+        if self.overflow > 0:
+            self.overflow -= 1
+        elif self.depth > 0:
+            self.depth -= 1
+
+
+class Sampler(object):
+    """Samples of the call stack of the running core, taken every 'interval'
+    ticks, and counted by folded stack.
+    """
+
+    def __init__(self, symbols, interval):
+        self.symbols = symbols  # SymbolTable.
+        self.interval = interval
+        self.counts = {}  # Folded stack -> number of samples.
+
+    def sample(self, state):
+        stack = state.call_stack
+        frames = [hex(state.coreid)]
+        for index in range(stack.depth):
+            frames.append(self.symbols.function_name(stack.calls[index]))
+        frames.append(self.symbols.function_name(state.pc))
+        folded = ';'.join(frames)
+        self.counts[folded] = self.counts.get(folded, 0) + 1
+
+    def write(self, filename):
+        """Write every sampled stack, and its count, to filename.
+        """
+        stacks = self.counts.keys()
+        stacks.sort()
+        out_file = open(filename, 'wb')
+        for folded in stacks:
+            out_file.write('%s %d\n' % (folded, self.counts[folded]))
+        out_file.close()
@@ -152,3 +152,10 @@ for index, address in enumerate(xrange(0xf0000, 0xf0100, 0x4)):
 # Add special purpose registers to _register_map.
 for index in xrange(len(_special_purpose_registers)):
     reg_memory_map[index + 64] = _special_purpose_registers[index]
+
+
+# Word offset into the register window (address - 0xf0000) >> 2 -> register
+# number, or -1 where no register is mapped at that address.
+reg_address_map = [-1] * (((0xf0718 - 0xf0000) >> 2) + 1)
+for reg_index in reg_memory_map:
+    reg_address_map[(reg_memory_map[reg_index][0] - 0xf0000) >> 2] = reg_index
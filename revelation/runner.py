@@ -0,0 +1,107 @@
+"""Run many independent simulations from Python, in a pool of processes.
+
+This module is a library for test suites and scripts, and is not part of the
+translated simulator. Each run is described by the command line arguments
+which would be given to pydgin-revelation-jit, without the program name:
+
+    >>> from revelation.runner import run_many
+    >>> for result in run_many([['hello.elf'], ['-c', '2', 'fib_print.elf']]):
+    ...     print result.index, result.exit_code, result.stdout
+
+Results are yielded as each run finishes, which need not be the order in
+which they were given. Every run gets a fresh Revelation object, and its
+STDOUT and STDERR are captured separately, so runs in the same worker process
+cannot see each other's output.
+"""
+from revelation.sim import EXIT_GENERAL_ERROR, Revelation
+from revelation.utils import open_unlinked_file
+
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+
+class RunResult(object):
+    """The outcome of one run: its exit code, everything it wrote to STDOUT
+    and STDERR, and the final state of each core.
+    """
+
+    def __init__(self, index, argv):
+        self.index = index      # Position of the run in the list given.
+        self.argv = argv
+        self.exit_code = EXIT_GENERAL_ERROR
+        self.stdout = ''
+        self.stderr = ''
+        self.seconds = .0
+        self.num_insts = {}     # coreid -> instructions executed.
+        self.registers = {}     # coreid -> list of register values.
+
+
+def _read_all(fd):
+    chunks = []
+    while True:
+        chunk = os.read(fd, 65536)
+        if chunk == '':
+            break
+        chunks.append(chunk)
+    return ''.join(chunks)
+
+
+def run_one(argv, index=0):
+    """Simulate one run in this process, and return its RunResult. Nothing is
+    written to the STDOUT or STDERR of this process.
+    """
+    result = RunResult(index, argv)
+    prefix = '.revelation_run_%d_%d' % (os.getpid(), index)
+    out_write, out_read = open_unlinked_file(prefix + '.out')
+    err_write, err_read = open_unlinked_file(prefix + '.err')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+    os.dup2(out_write, 1)
+    os.dup2(err_write, 2)
+    start = time.time()
+    try:
+        revelation = Revelation()
+        try:
+            result.exit_code = revelation.get_entry_point()(['sim.py'] +
+                                                            list(argv))
+        except Exception:
+            traceback.print_exc()
+        for coreid, state in revelation.states.items():
+            result.num_insts[coreid] = state.num_insts
+            result.registers[coreid] = list(state.rf.regs)
+    finally:
+        result.seconds = time.time() - start
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_stdout, 1)
+        os.dup2(saved_stderr, 2)
+        for fd in [saved_stdout, saved_stderr, out_write, err_write]:
+            os.close(fd)
+    result.stdout = _read_all(out_read)
+    result.stderr = _read_all(err_read)
+    os.close(out_read)
+    os.close(err_read)
+    return result
+
+
+def _run_job(job):
+    index, argv = job
+    return run_one(argv, index)
+
+
+def run_many(runs, processes=None):
+    """Simulate each run in 'runs', a list of argument lists, in a pool of
+    'processes' worker processes (by default, one per CPU). Yield a RunResult
+    for each run as it finishes.
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(_run_job, enumerate(runs)):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,75 @@
+class Scheduler(object):
+    """Round-robin scheduler for simulated cores.
+    Cores which are able to run are held in a run queue. A core which has
+    executed IDLE is moved to a wait set, and is only moved back to the run
+    queue when its ILAT register (or another register which affects
+    interrupts) is written, either by a remote core or by its own timers.
+    By default the last runnable core is never moved to the wait set, so that
+    the simulation keeps ticking (and --max-insts can stop it) even if every
+    core is idle. A --workers process allows every core to wait, because its
+    cores can also be woken by other processes.
+    """
+
+    def __init__(self, coreids, keep_one_running=True):
+        self.run_queue = [coreid for coreid in coreids]
+        self.waiting = {}  # coreid -> True, for idle cores.
+        self.index = 0     # Index of the current core in run_queue.
+        self.since_switch = 0  # Instructions run since the last switch.
+        self.keep_one_running = keep_one_running
+
+    def current(self):
+        """Return the coreid of the core which should be simulated next.
+        """
+        return self.run_queue[self.index]
+
+    def num_running(self):
+        return len(self.run_queue)
+
+    def is_empty(self):
+        return len(self.run_queue) == 0
+
+    def num_waiting(self):
+        return len(self.waiting)
+
+    def next_core(self):
+        """Move on to the next core in the run queue and return its coreid.
+        """
+        self.index = (self.index + 1) % len(self.run_queue)
+        return self.run_queue[self.index]
+
+    def _remove_current(self):
+        self.run_queue.pop(self.index)
+        if self.index >= len(self.run_queue):
+            self.index = 0
+
+    def halt(self, coreid):
+        """Remove a halted core. If only idle cores remain, one of them is moved
+        back to the run queue.
+        """
+        assert self.run_queue[self.index] == coreid
+        self._remove_current()
+        if (self.keep_one_running and len(self.run_queue) == 0 and
+              len(self.waiting) > 0):
+            waiting = self.waiting.keys()
+            waiting.sort()
+            del self.waiting[waiting[0]]
+            self.run_queue.append(waiting[0])
+            self.index = 0
+
+    def wait(self, coreid):
+        """Move the current core to the wait set, if another core can run.
+        Return True if the core was moved.
+        """
+        if self.keep_one_running and len(self.run_queue) < 2:
+            return False
+        assert self.run_queue[self.index] == coreid
+        self._remove_current()
+        self.waiting[coreid] = True
+        return True
+
+    def wake(self, coreid):
+        """Move an idle core back to the end of the run queue.
+        """
+        if coreid in self.waiting:
+            del self.waiting[coreid]
+            self.run_queue.append(coreid)
@@ -1,21 +1,33 @@
-from pydgin.debug import Debug, pad, pad_hex
+from pydgin.debug import Debug, pad_hex
 from pydgin.elf import elf_reader
 from pydgin.jit import JitDriver, set_param, set_user_param
 from pydgin.sim import Sim, init_sim
 
 from revelation.argument_parser import cli_parser, DoNotInterpretError
+from revelation.batch import run_batch
+from revelation.blocks import get_block, MAX_BLOCK_INSTS
+from revelation.checkpoint import (CheckpointError, Snapshot, load_checkpoint,
+                                   save_checkpoint)
 from revelation.elf_loader import load_program
-from revelation.instruction import Instruction
 from revelation.isa import decode
-from revelation.logger import Logger
-from revelation.machine import State
+from revelation.logger import FLUSH_BYTES, Logger
+from revelation.machine import new_core_state
+from revelation.mesh import Mesh
+from revelation.profile import (CallStack, Profile, Sampler, SymbolTable,
+                                get_code_ranges)
 from revelation.registers import reg_map
-from revelation.storage import Memory
+from revelation.scheduler import Scheduler
+from revelation.stats import Stats, write_stats
+from revelation.timeline import Timeline
+from revelation.trace import BinaryLogger
+from revelation.storage import Memory, TracedMemory
+from revelation.workers import run_workers
 from revelation.utils import format_thousands, get_coords_from_coreid
 from revelation.utils import  get_coreid_from_coords, zfill
 
 from pydgin.misc import FatalError, NotImplementedInstError
 
+import sys
 import time
 
 EXIT_SUCCESS = 0
@@ -24,6 +36,11 @@ EXIT_SYNTAX_ERROR = 2
 EXIT_FILE_ERROR = 126
 EXIT_CTRL_C = 130
 LOG_FILENAME = 'r_trace.out'
+BINARY_LOG_FILENAME = 'r_trace.bin'
+COMPRESSED_LOG_FILENAME = 'r_trace.bin.gz'
+CHECKPOINT_FILENAME = 'r_checkpoint.dat'
+BATCH_RESULTS_FILENAME = 'r_batch.json'
+SAMPLES_FILENAME = 'r_profile.folded'
 IVT = {  # Interrupt vector table.
     0 : 0x0,   # Sync hardware signal.
     1 : 0x4,   # Floating-point,invalid instruction or alignment.
@@ -39,7 +56,9 @@ IVT = {  # Interrupt vector table.
 
 
 def new_memory(logger):
-    return Memory(block_size=2**20, logger=logger)
+    if logger is None:
+        return Memory(block_size=2**20)
+    return TracedMemory(block_size=2**20, logger=logger)
 
 
 def get_printable_location(pc):
@@ -57,18 +76,41 @@ class Revelation(Sim):
         if self.jit_enabled:
             self.jitdriver = JitDriver(
                 greens = ['pc', ],
-                reds = ['core', 'tick_counter', 'coreids', 'sim', 'state',],
+                reds = ['core', 'tick_counter', 'since_switch', 'max_ticks',
+                        'next_sample', 'scheduler', 'sim', 'state',],
                 get_printable_location=get_printable_location)
         self.default_trace_limit = 400000
         self.max_insts = 0             # --max-insts.
         self.logger = None             # --debug output: self.logger.log().
+        self.trace_format = 'text'     # --trace-format, text, binary or gzip.
+        self.trace_flush = FLUSH_BYTES  # --trace-flush.
+        self.trace_ring = 0            # --trace-ring.
         self.rows = 1                  # --rows, -r.
         self.cols = 1                  # --cols, -c.
         self.states = {}               # coreid -> revelation.machine.State.
         self.first_core = 0x808        # --first-core, -f.
         self.ext_base = 0x8e000000     # Base address of 'external' memory.
         self.ext_size = 32             # Size of 'external' memory in MB.
-        self.switch_interval = 1       # --switch. TODO: currently ignored.
+        self.ext_file = ''             # --ext-file, file which holds ext RAM.
+        self.switch_interval = 1       # --switch.
+        self.use_blocks = False        # --blocks.
+        self.model_timing = False      # --timing.
+        self.clock = 0                 # Latest cycle of any core, --timing.
+        self.timer_expiry = 0          # Cycle by which an idle core wakes.
+        self.model_mesh = False        # --mesh, which implies --timing.
+        self.hot_spots = 0             # --hot-spots, lines in each report.
+        self.stats_file = ''           # --stats, JSON file of statistics.
+        self.sample_interval = 0       # --sample, ticks between samples.
+        self.sampler = None            # Created by init_state(), for --sample.
+        self.timeline_file = ''        # --timeline, Chrome trace event file.
+        self.num_workers = 1           # --workers.
+        self.worker_quantum = 10000    # --quantum.
+        self.checkpoint_at = 0         # --checkpoint-at.
+        self.checkpoint_file = CHECKPOINT_FILENAME
+        self.restore_file = ''         # --restore.
+        self.batch_file = ''           # --batch, manifest of ELF files.
+        self.scheduler = None          # Created by run(), or restored.
+        self.restored_ticks = 0        # Ticks simulated before a restore.
         self.user_environment = False  # Superuser mode. TODO: currently ignored.
         self.collect_times = False     # --time, -t option.
         self.start_time = .0           # --time, -t option.
@@ -90,137 +132,181 @@ class Revelation(Sim):
             if jit:  # pragma: no cover
                 set_user_param(self.jitdriver, jit)
             self.debug = Debug(flags, 0)
-            try:
-                elf_file = open(fname, 'rb')
-            except IOError:
-                print 'Could not open file %s' % fname
-                return EXIT_FILE_ERROR
-            if self.profile:
-                timer = time.time()
-                print 'CLI parser took: %fs' % (timer - self.timer)
-                self.timer = timer
-            self.init_state(elf_file, fname, False)
-            for coreid in self.states:
-                self.debug.set_state(self.states[coreid])
-            elf_file.close()
+            if self.batch_file:
+                return run_batch(self, self.batch_file, BATCH_RESULTS_FILENAME)
+            if self.restore_file:
+                try:
+                    self.restore_state(self.restore_file)
+                except CheckpointError as error:
+                    print error.msg
+                    return EXIT_FILE_ERROR
+            else:
+                try:
+                    elf_file = open(fname, 'rb')
+                except IOError:
+                    print 'Could not open file %s' % fname
+                    return EXIT_FILE_ERROR
+                if self.profile:
+                    timer = time.time()
+                    print 'CLI parser took: %fs' % (timer - self.timer)
+                    self.timer = timer
+                self.init_state(elf_file, fname, False)
+                elf_file.close()
+            timeline = self.start_run()
             try:
                 exit_code, tick_counter = self.run()
             except KeyboardInterrupt:
                 exit_code = EXIT_CTRL_C
                 tick_counter = -1
-            if self.collect_times:
-                self.end_time = time.time()
-            if self.logger:
-                self.logger.close()
-            self._print_summary_statistics(tick_counter)
+            self.finish_run(tick_counter, timeline)
             return exit_code
         return entry_point
 
+    def start_run(self):
+        """Attach the debug flags, and the --stats and --timeline observers, to
+        every core before run(), and reset the --timing clock. Return the
+        Timeline, or None.
+        """
+        self.clock = 0
+        self.timer_expiry = 0
+        timeline = None
+        if self.timeline_file:
+            timeline = Timeline(self.states, self.memory)
+        for coreid in self.states:
+            self.debug.set_state(self.states[coreid])
+            if self.stats_file:
+                self.states[coreid].stats = Stats(coreid, self.memory)
+            self.states[coreid].timeline = timeline
+        return timeline
+
+    def finish_run(self, tick_counter, timeline):
+        """Close the logger, write any files asked for on the command line and
+        print the summary, after run(). tick_counter is -1 after Ctrl+c.
+        """
+        if self.collect_times:
+            self.end_time = time.time()
+        if self.logger:
+            self.logger.close()
+        if self.stats_file:
+            write_stats(self.states, tick_counter, self.stats_file)
+            print 'Statistics written to: %s.' % self.stats_file
+        if self.sampler is not None:
+            self.sampler.write(SAMPLES_FILENAME)
+            print 'Samples written to: %s.' % SAMPLES_FILENAME
+        if timeline is not None:
+            timeline.write(self.timeline_file)
+            print 'Timeline written to: %s.' % self.timeline_file
+        self._print_summary_statistics(tick_counter)
+
     def run(self):
-        """Fetch, decode, execute, service interrupts loop.
+        """Simulate every core until they have all halted. If --checkpoint-at
+        is set, stop once to write a checkpoint, then carry on.
         Override Sim.run to provide multicore and close the logger on exit.
         """
-        coreids = self.states.keys()
-        core = coreids[0]      # Key to self.states dictionary.
-        state = self.states[core]  # revelation.machine.State object.
+        self.start_time = time.time()
+        if self.model_mesh:
+            self.model_timing = True
+            self.memory.mesh = Mesh(self.states)
+        self.memory.timing = self.model_timing
+        tick_counter = self.restored_ticks
+        if (self.num_workers > 1 and len(self.states) > 1 and
+              not self.logger and not self.model_mesh and not self.hot_spots and
+              not self.stats_file and self.sampler is None and
+              not self.timeline_file):
+            exit_code, ticks = run_workers(self)
+            return exit_code, tick_counter + ticks
+        scheduler = self.get_scheduler()
+        if self.checkpoint_at > tick_counter:
+            exit_code, ticks = self.run_cores(scheduler,
+                                              self.checkpoint_at - tick_counter)
+            tick_counter += ticks
+            self._flush_mesh()
+            if (exit_code != EXIT_SUCCESS or scheduler.is_empty() or
+                  self._reached_max_insts(scheduler.run_queue)):
+                return exit_code, tick_counter
+            save_checkpoint(self, scheduler, tick_counter, self.checkpoint_file)
+            print ('Checkpoint at tick %s written to: %s.' %
+                   (format_thousands(tick_counter), self.checkpoint_file))
+        exit_code, ticks = self.run_cores(scheduler, 0)
+        self._flush_mesh()
+        return exit_code, tick_counter + ticks
+
+    def _flush_mesh(self):
+        """Make any --mesh writes which are still in flight.
+        """
+        if self.memory.mesh is not None:
+            self.memory.mesh.flush(self.memory)
+
+    def run_cores(self, scheduler, max_ticks):
+        """Simulate the cores held by 'scheduler' until they have all halted,
+        or until at least max_ticks instructions have been executed, if
+        max_ticks is not 0. --blocks is ignored with --debug, --timing,
+        --hot-spots or --stats, which need to see every instruction.
+        """
+        state = self.states[scheduler.current()]
+        if state.timeline is not None:
+            state.timeline.switch_to(state)
+        if (self.use_blocks and not self.logger and not self.model_timing and
+              not self.hot_spots and not self.stats_file):
+            return self.run_blocks(scheduler, max_ticks)
+        return self.run_instructions(scheduler, max_ticks)
+
+    def run_instructions(self, scheduler, max_ticks):
+        """Fetch, decode, execute, service interrupts loop.
+        """
+        core = scheduler.current()  # Key to self.states dictionary.
+        state = self.states[core]   # revelation.machine.State object.
         pc = state.fetch_pc()  # Program counter.
         tick_counter = 0       # Number of instructions executed by all cores.
+        since_switch = scheduler.since_switch
+        next_sample = self._first_sample()  # Tick of the next --sample.
         old_pc = 0
-        self.start_time = time.time()
 
         while True:
             self.jitdriver.jit_merge_point(pc=pc,
                                            core=core,
                                            tick_counter=tick_counter,
-                                           coreids=coreids,
+                                           since_switch=since_switch,
+                                           max_ticks=max_ticks,
+                                           next_sample=next_sample,
+                                           scheduler=scheduler,
                                            sim=self,
                                            state=state,)
-            # Fetch next instruction.
-            opcode = state.mem.iread(pc, 4, from_core=state.coreid)
             try:
-                # Decode instruction.
-                mnemonic, function = decode(opcode)
-                instruction = Instruction(opcode, mnemonic)
-                # --debug
-                if (state.is_first_core and self.logger and
-                      state.debug.enabled('trace')):
-                    state.logger.log('%s %s %s %s' %
-                        (pad('%x' % pc, 8, ' ', False),
-                         pad_hex(opcode), pad(instruction.name, 12),
-                         pad('%d' % state.num_insts, 8)))
-                # Check whether or not we are in a hardware loop, and set
-                # registers after the next instruction, as appropriate. See
-                # Section 7.9 of the Architecture Reference Rev. 14.03.11.
-                if (state.GID and state.pc == state.rf[reg_map['LE']]):
-                    state.rf[reg_map['LC']] -= 1
-                    state.is_in_hardware_loop = True
-                # Execute next instruction.
-                function(state, instruction)
-                # --debug
-                if (state.is_first_core and state.logger and
-                      state.debug.enabled('trace')):
-                    state.logger.log('\n')
-                # Check hardware loop registers.
-                if state.is_in_hardware_loop and state.rf[reg_map['LC']] > 0:
-                    state.pc = state.rf[reg_map['LS']]
-                    state.is_in_hardware_loop = False
-                # Service interrupts.
-                if (state.rf[reg_map['ILAT']] > 0 and not (state.GID or
-                       state.rf[reg_map['DEBUGSTATUS']] == 1)):
-                    interrupt_level = state.get_latched_interrupt()
-                    if interrupt_level > -1:  # Interrupt to process.
-                        # If a pending interrupt is of a higher priority than
-                        # the latched interrupt, carry on with the pending
-                        # interrupt.
-                        pending_interrupt = state.get_pending_interrupt()
-                        if (pending_interrupt == -1 or
-                              (pending_interrupt > -1 and
-                              interrupt_level <= pending_interrupt)):
-                            state.rf[reg_map['IRET']] = state.pc
-                            state.rf[reg_map['ILAT']] &= ~(1 << interrupt_level)
-                            state.rf[reg_map['IPEND']] |= 1 << interrupt_level
-                            state.GID = True  # Set global interrupt disabled bit.
-                            state.pc = IVT[interrupt_level]
-                            state.ACTIVE = 1  # Wake up IDLE cores.
+                self._execute_instruction(state, pc)
+                if state.interrupt_pending:
+                    self._service_interrupts(state)
             except (FatalError, NotImplementedInstError) as error:
+                opcode = state.mem.iread(pc, 4, from_core=state.coreid)
                 mnemonic, _ = decode(opcode)
                 print ('Exception in execution of %s (pc: 0x%s), aborting!' %
                        (mnemonic, pad_hex(pc)))
                 print 'Exception message: %s' % error.msg
+                if self.logger:
+                    self.logger.flush()
                 return EXIT_GENERAL_ERROR, tick_counter  # pragma: no cover
             # Update instruction counters.
             tick_counter += 1
+            since_switch += 1
             state.num_insts += 1
+            if tick_counter >= next_sample:
+                self.sampler.sample(state)
+                next_sample += self.sampler.interval
             # Halt if we have reached the maximum instruction count.
             if self.max_insts != 0 and state.num_insts >= self.max_insts:
                 print 'Reached the max_insts (%d), exiting.' % self.max_insts
                 break
-            # Check whether state has halted.
-            if not state.running:
-                if len(coreids) == 1:  # Last running core has halted.
+            # Switch cores if this one has halted or gone idle, or at the end
+            # of its quantum.
+            if self._should_switch(scheduler, core, state, since_switch,
+                                   self.switch_interval):
+                if scheduler.is_empty():  # Last running core has halted.
                     break
-                old_core = core
-                core = coreids[(coreids.index(core) + 1) % len(coreids)]
-                state = self.states[core]
-                coreids.remove(old_core)
-            # Switch cores after every instruction. TODO: Honour switch interval.
-            elif len(coreids) > 1 and tick_counter % self.switch_interval == 0:
-                while True:
-                    core = coreids[(coreids.index(core) + 1) % len(coreids)]
-                    if self.states[core].ACTIVE == 1:
-                        break
-                    # Idle cores can be made active by interrupts.
-                    elif (self.states[core].ACTIVE == 0 and
-                            self.states[core].rf[reg_map['ILAT']] > 0):
-                        interrupt_level = self.states[core].get_latched_interrupt()
-                        self.states[core].rf[reg_map['IRET']] = self.states[core].pc
-                        self.states[core].rf[reg_map['ILAT']] &= ~(1 << interrupt_level)
-                        self.states[core].rf[reg_map['IPEND']] |= 1 << interrupt_level
-                        self.states[core].GID = True  # Set global interrupt disabled bit.
-                        self.states[core].pc = IVT[interrupt_level]
-                        self.states[core].ACTIVE = 1  # Wake up IDLE cores.
-                        break
+                core = self._switch_core(scheduler)
                 state = self.states[core]
+                since_switch = 0
+            if max_ticks != 0 and tick_counter >= max_ticks:
+                break
             # Move program counter to next instruction.
             old_pc = pc
             pc = state.fetch_pc()
@@ -228,23 +314,269 @@ class Revelation(Sim):
                 self.jitdriver.can_enter_jit(pc=pc,
                                              core=core,
                                              tick_counter=tick_counter,
-                                             coreids=coreids,
+                                             since_switch=since_switch,
+                                             max_ticks=max_ticks,
+                                             next_sample=next_sample,
+                                             scheduler=scheduler,
                                              sim=self,
                                              state=state,)
+        scheduler.since_switch = since_switch
         return EXIT_SUCCESS, tick_counter
 
+    def run_blocks(self, scheduler, max_ticks):
+        """Execute translated basic blocks (see revelation.blocks), servicing
+        interrupts and switching cores only between blocks. Blocks which
+        contain the end of an active hardware loop are single-stepped.
+        Each core runs for at least MAX_BLOCK_INSTS instructions before
+        switching, so that cores in short loops are not starved.
+        """
+        quantum = max(self.switch_interval, MAX_BLOCK_INSTS)
+        core = scheduler.current()  # Key to self.states dictionary.
+        state = self.states[core]   # revelation.machine.State object.
+        tick_counter = 0       # Number of instructions executed by all cores.
+        since_switch = scheduler.since_switch
+        next_sample = self._first_sample()  # Tick of the next --sample.
+
+        while True:
+            pc = state.fetch_pc()
+            try:
+                block = get_block(state, pc)
+                if (block is None or
+                      (self.max_insts != 0 and
+                       state.num_insts + block.num_insts > self.max_insts) or
+                      (state.GID and
+                       block.start_pc <= state.rf[reg_map['LE']] < block.end_pc)):
+                    self._execute_instruction(state, pc)
+                    num_insts = 1
+                else:
+                    num_insts = block.execute(state)
+                if state.interrupt_pending:
+                    self._service_interrupts(state)
+            except (FatalError, NotImplementedInstError) as error:
+                opcode = state.mem.iread(state.pc, 4, from_core=state.coreid)
+                mnemonic, _ = decode(opcode)
+                print ('Exception in execution of %s (pc: 0x%s), aborting!' %
+                       (mnemonic, pad_hex(state.pc)))
+                print 'Exception message: %s' % error.msg
+                if self.logger:
+                    self.logger.flush()
+                return EXIT_GENERAL_ERROR, tick_counter  # pragma: no cover
+            # Update instruction counters.
+            tick_counter += num_insts
+            since_switch += num_insts
+            state.num_insts += num_insts
+            if tick_counter >= next_sample:
+                self.sampler.sample(state)
+                next_sample += self.sampler.interval
+            # Halt if we have reached the maximum instruction count.
+            if self.max_insts != 0 and state.num_insts >= self.max_insts:
+                print 'Reached the max_insts (%d), exiting.' % self.max_insts
+                break
+            if self._should_switch(scheduler, core, state, since_switch, quantum):
+                if scheduler.is_empty():  # Last running core has halted.
+                    break
+                core = self._switch_core(scheduler)
+                state = self.states[core]
+                since_switch = 0
+            if max_ticks != 0 and tick_counter >= max_ticks:
+                break
+        scheduler.since_switch = since_switch
+        return EXIT_SUCCESS, tick_counter
+
+    def _first_sample(self):
+        """Return the tick at which run_instructions() or run_blocks() first
+        samples the call stack, which is never if --sample is not set.
+        """
+        if self.sampler is None:
+            return sys.maxint
+        return self.sampler.interval
+
+    def _execute_instruction(self, state, pc):
+        """Fetch, decode and execute the instruction at pc on one core,
+        including any jump back to the start of a hardware loop.
+        """
+        instruction = state.fetch_instruction(pc)
+        state.trace_instruction(pc, instruction)
+        if state.profile is not None:
+            state.profile.count(pc)
+        # Check whether or not we are in a hardware loop, and set
+        # registers after the next instruction, as appropriate. See
+        # Section 7.9 of the Architecture Reference Rev. 14.03.11.
+        if (state.GID and state.pc == state.rf[reg_map['LE']]):
+            state.rf[reg_map['LC']] -= 1
+            state.is_in_hardware_loop = True
+        # Execute next instruction.
+        instruction.execute(state, instruction)
+        if state.stats is not None:
+            state.stats.count_instruction(instruction, pc, state.pc)
+        if self.model_timing:
+            state.timing.step(state, instruction, pc)
+        state.trace_end_instruction()
+        # Check hardware loop registers.
+        if state.is_in_hardware_loop and state.rf[reg_map['LC']] > 0:
+            state.pc = state.rf[reg_map['LS']]
+            state.is_in_hardware_loop = False
+
+    def _service_interrupts(self, state):
+        """Jump to the handler of the highest priority latched interrupt, if
+        interrupts are enabled and no higher priority interrupt is pending.
+        Only called when state.interrupt_pending is set, i.e. after a write
+        to ILAT or another register which affects whether an interrupt can be
+        serviced, or when a DMA chain has been paused.
+        """
+        if (state.rf[reg_map['ILAT']] > 0 and not (state.GID or
+               state.rf[reg_map['DEBUGSTATUS']] == 1)):
+            interrupt_level = state.get_latched_interrupt()
+            if interrupt_level > -1:  # Interrupt to process.
+                # If a pending interrupt is of a higher priority than
+                # the latched interrupt, carry on with the pending
+                # interrupt.
+                pending_interrupt = state.get_pending_interrupt()
+                if (pending_interrupt == -1 or
+                      (pending_interrupt > -1 and
+                      interrupt_level <= pending_interrupt)):
+                    if state.timeline is not None:
+                        state.timeline.interrupt(state, interrupt_level)
+                    state.rf[reg_map['IRET']] = state.pc
+                    state.rf[reg_map['ILAT']] &= ~(1 << interrupt_level)
+                    state.rf[reg_map['IPEND']] |= 1 << interrupt_level
+                    state.GID = True  # Set global interrupt disabled bit.
+                    state.pc = IVT[interrupt_level]
+                    state.ACTIVE = 1  # Wake up IDLE cores.
+        # Either an interrupt has been serviced, which sets GID, or none can
+        # be. Nothing changes until one of those registers is written again.
+        state.interrupt_pending = False
+        if state.dma_pending:
+            state.resume_dma()
+
+    def get_scheduler(self):
+        """Return the scheduler used by run(), creating it if necessary. The
+        cores can be run for a while with run_cores(), before run() is called
+        or a snapshot is taken.
+        """
+        if self.scheduler is None:
+            coreids = self.states.keys()
+            coreids.sort()
+            self.scheduler = self._new_scheduler(coreids)
+        return self.scheduler
+
+    def take_snapshot(self, ticks=0):
+        """Freeze memory and the state of every core. Any number of new
+        simulations can continue from the snapshot with restore_snapshot().
+        Memory blocks are shared by all of them, this simulation included,
+        and are only copied when a simulation first writes to them.
+        'ticks' is the number of instructions executed so far.
+        """
+        return Snapshot(self, self.get_scheduler(), ticks)
+
+    def restore_snapshot(self, snapshot, is_test=False):
+        """Continue from a snapshot, rather than loading an ELF file.
+        """
+        self._init_memory(is_test)
+        self.scheduler = snapshot.restore(self)
+        self.restored_ticks = snapshot.ticks
+
+    def _reached_max_insts(self, coreids):
+        if self.max_insts != 0:
+            for coreid in coreids:
+                if self.states[coreid].num_insts >= self.max_insts:
+                    return True
+        return False
+
+    def _new_scheduler(self, coreids, keep_one_running=True):
+        """Return a scheduler for the cores in 'coreids', which is sorted.
+        Only these cores are woken by the scheduler.
+        """
+        scheduler = Scheduler(coreids, keep_one_running)
+        for coreid in coreids:
+            self.states[coreid].rf.scheduler = scheduler
+        return scheduler
+
+    def _should_switch(self, scheduler, core, state, since_switch, quantum):
+        """Return True if the scheduler has moved on from 'core', which happens
+        when it halts, when it goes idle and another core can run, or when it
+        has executed 'quantum' instructions since it was switched in.
+        """
+        if self.model_timing:
+            if state.timing.cycles > self.clock:
+                self.clock = state.timing.cycles
+            if self.clock >= self.timer_expiry:
+                self._catch_up_waiting_cores(scheduler)
+        if not state.running:
+            scheduler.halt(core)
+            if state.timeline is not None:
+                state.timeline.halt(state)
+            return True
+        elif (not state.ACTIVE and not state.dma_pending and
+                scheduler.wait(core)):
+            if self.model_timing:
+                self.timer_expiry = min(self.timer_expiry,
+                                        state.timing.next_expiry(state))
+            return True
+        elif (scheduler.num_running() > 1 and
+                since_switch >= quantum):
+            scheduler.next_core()
+            return True
+        return False
+
+    def _switch_core(self, scheduler):
+        """Return the core chosen by the scheduler, first servicing any
+        interrupt which was latched while it was not running. This is what
+        wakes idle cores.
+        """
+        core = scheduler.current()
+        state = self.states[core]
+        if state.timeline is not None:
+            state.timeline.switch_to(state)
+        if self.model_timing and not state.ACTIVE:
+            state.timing.catch_up(state, self.clock)
+        if state.interrupt_pending:
+            self._service_interrupts(state)
+        return core
+
+    def _catch_up_waiting_cores(self, scheduler):
+        """Catch up the clock and timers of every core in the wait set with
+        self.clock (see revelation.timing). A core whose timer runs out is
+        woken by it.
+        """
+        waiting = scheduler.waiting.keys()
+        waiting.sort()
+        expiry = sys.maxint
+        for coreid in waiting:
+            state = self.states[coreid]
+            state.timing.catch_up(state, self.clock)
+            if coreid in scheduler.waiting:
+                expiry = min(expiry, state.timing.next_expiry(state))
+        self.timer_expiry = expiry
+
     def _print_summary_statistics(self, ticks):
         """Print timing information. If simulation was interrupted by the user
         pressing Ctrl+c, 'ticks' will be -1.
         """
         if ticks > -1:
             print 'Total ticks simulated = %s.' % format_thousands(ticks)
+        cycles = 0
         for coreid in self.states:
             row, col = get_coords_from_coreid(coreid)
             print ('Core %s (%s, %s) STATUS: 0x%s, Instructions executed: %s' %
                    (hex(coreid), zfill(str(row), 2), zfill(str(col), 2),
                     pad_hex(self.states[coreid].rf[reg_map['STATUS']]),
                     format_thousands(self.states[coreid].num_insts)))
+            if self.model_timing:
+                core_cycles = self.states[coreid].timing.cycles
+                print '    Estimated cycles: %s' % format_thousands(core_cycles)
+                cycles = max(cycles, core_cycles)
+        if self.model_timing:
+            print 'Estimated cycles (slowest core): %s.' % format_thousands(cycles)
+        if self.memory.mesh is not None:
+            self.memory.mesh.print_utilization(cycles)
+        if self.hot_spots:
+            coreids = self.states.keys()
+            coreids.sort()
+            for coreid in coreids:
+                state = self.states[coreid]
+                if state.profile is not None:
+                    state.profile.print_report(state, self.hot_spots)
         if self.collect_times:
             execution_time = self.end_time - self.start_time
             print 'Total execution time: %fs.' % (execution_time)
@@ -252,7 +584,7 @@ class Revelation(Sim):
                 speed = format_thousands(int(ticks / execution_time))
                 print 'Simulator speed:      %s instructions / second.' % speed
 
-    def init_state(self, elf_file, filename, testbin, is_test=False):
+    def _init_memory(self, is_test):
         """Revelation has custom logging infrastructure that differs from the
         default provided by Pydgin. This matches e-sim, in that log messages are
         written to a file rather than to STDOUT. This prevents some specious
@@ -265,17 +597,44 @@ class Revelation(Sim):
             self.debug = Debug()
             Debug.global_enabled = True
         if self.debug.enabled_flags and Debug.global_enabled:
-            print 'Trace will be written to: %s.' % LOG_FILENAME
-            self.logger = Logger(LOG_FILENAME)
+            if self.trace_format == 'binary':
+                print 'Trace will be written to: %s.' % BINARY_LOG_FILENAME
+                self.logger = BinaryLogger(BINARY_LOG_FILENAME, False,
+                                           self.trace_flush, self.trace_ring)
+            elif self.trace_format == 'gzip':
+                print 'Trace will be written to: %s.' % COMPRESSED_LOG_FILENAME
+                self.logger = BinaryLogger(COMPRESSED_LOG_FILENAME, True,
+                                           self.trace_flush, self.trace_ring)
+            else:
+                print 'Trace will be written to: %s.' % LOG_FILENAME
+                self.logger = Logger(LOG_FILENAME, self.trace_flush,
+                                     self.trace_ring)
         if self.profile:
             timer = time.time()
             print 'Debugging set up took: %fs' % (timer - self.timer)
             self.timer = timer
         self.memory = new_memory(self.logger)
+        if self.ext_file:
+            self.memory.map_external(self.ext_base, self.ext_size,
+                                     self.ext_file)
         if self.profile:
             timer = time.time()
             print 'Memory creation took: %fs' % (timer - self.timer)
             self.timer = timer
+
+    def restore_state(self, filename, is_test=False):
+        """Restore every core, and memory, from a checkpoint written by
+        --checkpoint-at, rather than loading an ELF file.
+        """
+        self._init_memory(is_test)
+        self.scheduler, self.restored_ticks = load_checkpoint(self, filename)
+        print ('Restored checkpoint %s at tick %s.' %
+               (filename, format_thousands(self.restored_ticks)))
+
+    def init_state(self, elf_file, filename, testbin, is_test=False):
+        """Load an ELF file on to every core.
+        """
+        self._init_memory(is_test)
         f_row = (self.first_core >> 6) & 0x3f
         f_col = self.first_core & 0x3f
         elf = elf_reader(elf_file, is_64bit=False)
@@ -287,12 +646,24 @@ class Revelation(Sim):
                 print ('Loading program %s on to core %s (%s, %s)' %
                        (filename, hex(coreid), zfill(str(f_row + row), 2),
                         zfill(str(f_col + col), 2)))
-                self.states[coreid] = State(self.memory, self.debug,
-                                            logger=self.logger, coreid=coreid)
+                self.states[coreid] = new_core_state(self.memory, self.debug,
+                                                     coreid=coreid,
+                                                     logger=self.logger)
         code_blocks = load_program(elf, self.memory, coreids, ext_base=self.ext_base,
                                    ext_size=self.ext_size)
-        for section in code_blocks:
-            self.memory.code_blocks.append(section)
+        for start, end in code_blocks:
+            self.memory.add_code_block(start, end)
+        self.sampler = None
+        if self.hot_spots or self.sample_interval:
+            ranges = get_code_ranges(elf)
+            symbols = SymbolTable(elf.symbols, ranges)
+            for coreid in coreids:
+                if self.hot_spots:
+                    self.states[coreid].profile = Profile(ranges, symbols)
+                if self.sample_interval:
+                    self.states[coreid].call_stack = CallStack()
+            if self.sample_interval:
+                self.sampler = Sampler(symbols, self.sample_interval)
         self.states[coreids[0]].set_first_core(True)
         if self.profile:
             timer = time.time()
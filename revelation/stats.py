@@ -0,0 +1,145 @@
+"""Instruction mix statistics of each core, for --stats.
+
+Each core counts the instructions it executes by name, in an array indexed by
+Instruction.index, and counts its loads and stores by size and by where the
+address is: in its own local memory, in another simulated core, or elsewhere
+(external RAM). Conditional branches are counted as taken or not taken.
+Every counter is a single array or field increment, so --stats can be left on
+for long runs. Without --stats no core has a Stats object, and nothing is
+counted.
+
+At exit the counters are written to a JSON file, one object per core:
+
+    {"ticks": 2949,
+     "cores": [
+      {"coreid": "0x808", "instructions": 2949,
+       "mnemonics": {"bcond32": 82, "bcond16": 269, ...},
+       "encodings": {"16": 1244, "32": 1705},
+       "loads": {"local": {"1": 18, "2": 0, "4": 199, "8": 91},
+                 "remote": {"1": 0, "2": 0, "4": 0, "8": 0},
+                 "external": {"1": 0, "2": 33, "4": 87, "8": 0}},
+       "stores": {...},
+       "branches": {"taken": 151, "not_taken": 161, "unconditional": 39}}]}
+
+Only instructions which were executed are listed in "mnemonics". Loads and
+stores are keyed by their size in bytes. TESTSET is counted as an instruction,
+but not as a load or store.
+"""
+from revelation.isa import mnemonic_indices, mnemonics
+from revelation.utils import json_string
+
+LOCAL = 0
+REMOTE = 1
+EXTERNAL = 2
+_ADDRESS_CLASSES = ['local', 'remote', 'external']
+_ACCESS_SIZES = ['1', '2', '4', '8']  # Bytes, indexed by Instruction.size.
+
+_BCOND16 = mnemonic_indices['bcond16']
+_BCOND32 = mnemonic_indices['bcond32']
+_ALWAYS = 0b1110  # Condition of B, and of BL (0b1111).
+
+
+class Stats(object):
+    """Instruction mix counters of one core.
+    """
+
+    def __init__(self, coreid, memory):
+        self.coreid = coreid
+        self.memory = memory  # To tell remote cores from external RAM.
+        self.mnemonics = [0] * len(mnemonics)
+        # One counter for each address class and size, class * 4 + size.
+        self.loads = [0] * (len(_ADDRESS_CLASSES) * len(_ACCESS_SIZES))
+        self.stores = [0] * (len(_ADDRESS_CLASSES) * len(_ACCESS_SIZES))
+        self.taken = 0
+        self.not_taken = 0
+        self.unconditional = 0
+
+    def count_instruction(self, instruction, pc, next_pc):
+        """Count an instruction at pc, which has been executed and moved the
+        program counter to next_pc.
+        """
+        self.mnemonics[instruction.index] += 1
+        if instruction.index == _BCOND16 or instruction.index == _BCOND32:
+            if instruction.cond >= _ALWAYS:
+                self.unconditional += 1
+            elif next_pc == pc + (2 if instruction.index == _BCOND16 else 4):
+                self.not_taken += 1
+            else:
+                self.taken += 1
+
+    def address_class(self, address):
+        coreid = address >> 20
+        if coreid == 0 or coreid == self.coreid:
+            return LOCAL
+        elif coreid in self.memory.register_files:
+            return REMOTE
+        return EXTERNAL
+
+    def count_access(self, is_store, address, size):
+        """Count a load or store of 1 << size bytes at address.
+        """
+        index = self.address_class(address) * len(_ACCESS_SIZES) + size
+        if is_store:
+            self.stores[index] += 1
+        else:
+            self.loads[index] += 1
+
+    def num_insts(self):
+        total = 0
+        for count in self.mnemonics:
+            total += count
+        return total
+
+    def _format_accesses(self, counts):
+        parts = []
+        for where, name in enumerate(_ADDRESS_CLASSES):
+            sizes = []
+            for size, size_name in enumerate(_ACCESS_SIZES):
+                sizes.append('"%s": %d' %
+                             (size_name,
+                              counts[where * len(_ACCESS_SIZES) + size]))
+            parts.append('%s: {%s}' % (json_string(name), ', '.join(sizes)))
+        return '{' + ', '.join(parts) + '}'
+
+    def to_json(self):
+        """Return the counters of this core as a JSON object.
+        """
+        names = []
+        encodings = [0, 0]  # 16 bit, 32 bit.
+        for index, count in enumerate(self.mnemonics):
+            if count == 0:
+                continue
+            names.append('%s: %d' % (json_string(mnemonics[index]), count))
+            if mnemonics[index].endswith('16'):
+                encodings[0] += count
+            else:
+                encodings[1] += count
+        return ('  {"coreid": %s, "instructions": %d,\n'
+                '   "mnemonics": {%s},\n'
+                '   "encodings": {"16": %d, "32": %d},\n'
+                '   "loads": %s,\n'
+                '   "stores": %s,\n'
+                '   "branches": {"taken": %d, "not_taken": %d, '
+                '"unconditional": %d}}' %
+                (json_string(hex(self.coreid)), self.num_insts(),
+                 ', '.join(names), encodings[0], encodings[1],
+                 self._format_accesses(self.loads),
+                 self._format_accesses(self.stores),
+                 self.taken, self.not_taken, self.unconditional))
+
+
+def write_stats(states, ticks, filename):
+    """Write the Stats of every core in 'states', a dictionary of coreid to
+    revelation.machine.State, to filename as JSON.
+    """
+    coreids = states.keys()
+    coreids.sort()
+    cores = []
+    for coreid in coreids:
+        if states[coreid].stats is not None:
+            cores.append(states[coreid].stats.to_json())
+    out_file = open(filename, 'wb')
+    out_file.write('{"ticks": %d,\n "cores": [\n' % ticks)
+    out_file.write(',\n'.join(cores))
+    out_file.write(']}\n')
+    out_file.close()
@@ -1,6 +1,42 @@
-from pydgin.debug import Debug, pad, pad_hex
+from pydgin.debug import Debug, pad_hex
 
-from revelation.registers import reg_memory_map
+from revelation.registers import reg_address_map, reg_map, reg_memory_map
+
+import os
+
+try:
+    from rpython.rlib.rmmap import mmap as new_mapping
+except ImportError:
+    import mmap
+
+    class _Mapping(object):
+        """Untranslated stand-in for rpython.rlib.rmmap.MMap.
+        """
+
+        def __init__(self, fileno, length):
+            self.map = mmap.mmap(fileno, length)
+
+        def getitem(self, index):
+            return self.map[index]
+
+        def setitem(self, index, value):
+            self.map[index] = value
+
+    def new_mapping(fileno, length):
+        return _Mapping(fileno, length)
+
+
+# Read latencies for the --timing model, see revelation.timing.
+MESH_HOP_CYCLES = 1         # Each way, for each hop between two mesh nodes.
+REMOTE_READ_CYCLES = 8      # Fixed part of a read from another core.
+EXTERNAL_READ_CYCLES = 100  # Fixed part of a read from external RAM.
+
+# from_core of an access which is made on behalf of Memory.current_core, e.g.
+# by a system call, which does not know which core it serves.
+CURRENT_CORE = -1
+
+PAGE_BITS = 8  # Pages of memory which hold code, or which are copied.
+PAGE_SIZE = 1 << PAGE_BITS
 
 
 def is_local_address(address):
@@ -12,21 +48,55 @@ def is_register_address(address):
 
 
 class _BlockMemory(object):
-    """32MB block of memory, initialised to zero.
+    """Block of memory, initialised to zero.
+    Data is held in a single contiguous bytearray. Reads and writes of 1, 2, 4
+    and 8 bytes are unrolled, any other width falls back to a byte loop.
     """
 
     def __init__(self, size=2**10, logger=None):
         """Initialise all memory to zero, as we don't know which memory.
         segments might hold memory-mapped registers.
         """
-        self.data = ['\0'] * size
-        self.size = len(self.data)
+        self.data = bytearray('\0' * size)
+        self.size = size
+        self.frozen = False  # Shared with a snapshot, see Memory.freeze().
+
+    def freeze(self):
+        self.frozen = True
+
+    def copy(self):
+        """Return a writable copy of this block.
+        """
+        block_mem = _BlockMemory(size=0)
+        block_mem.data = self.data[:]
+        block_mem.size = self.size
+        return block_mem
 
     def read(self, start_addr, num_bytes):
+        data = self.data
+        if num_bytes == 4:
+            return (data[start_addr] |
+                    (data[start_addr + 1] << 8) |
+                    (data[start_addr + 2] << 16) |
+                    (data[start_addr + 3] << 24))
+        elif num_bytes == 2:
+            return data[start_addr] | (data[start_addr + 1] << 8)
+        elif num_bytes == 1:
+            return data[start_addr]
+        elif num_bytes == 8:
+            low = (data[start_addr] |
+                   (data[start_addr + 1] << 8) |
+                   (data[start_addr + 2] << 16) |
+                   (data[start_addr + 3] << 24))
+            high = (data[start_addr + 4] |
+                    (data[start_addr + 5] << 8) |
+                    (data[start_addr + 6] << 16) |
+                    (data[start_addr + 7] << 24))
+            return low | (high << 32)
         value = 0
         for i in range(num_bytes - 1, -1, -1):
             value = value << 8
-            value = value | ord(self.data[start_addr + i])
+            value = value | data[start_addr + i]
         return value
 
     def iread(self, start_addr, num_bytes):
@@ -35,17 +105,101 @@ class _BlockMemory(object):
         instructions are not modified (no side effects, assumes the addresses
         correspond to the same instructions).
         """
+        return self.read(start_addr, num_bytes)
+
+    def write(self, start_addr, num_bytes, value, from_core=0x808):
+        data = self.data
+        if num_bytes == 4:
+            data[start_addr]     = value & 0xff
+            data[start_addr + 1] = (value >> 8) & 0xff
+            data[start_addr + 2] = (value >> 16) & 0xff
+            data[start_addr + 3] = (value >> 24) & 0xff
+        elif num_bytes == 2:
+            data[start_addr]     = value & 0xff
+            data[start_addr + 1] = (value >> 8) & 0xff
+        elif num_bytes == 1:
+            data[start_addr] = value & 0xff
+        elif num_bytes == 8:
+            data[start_addr]     = value & 0xff
+            data[start_addr + 1] = (value >> 8) & 0xff
+            data[start_addr + 2] = (value >> 16) & 0xff
+            data[start_addr + 3] = (value >> 24) & 0xff
+            data[start_addr + 4] = (value >> 32) & 0xff
+            data[start_addr + 5] = (value >> 40) & 0xff
+            data[start_addr + 6] = (value >> 48) & 0xff
+            data[start_addr + 7] = (value >> 56) & 0xff
+        else:
+            for i in range(num_bytes):
+                data[start_addr + i] = value & 0xff
+                value = value >> 8
+
+    def read_bytes(self, start_addr, num_bytes):
+        data = self.data
+        return ''.join([chr(data[start_addr + i]) for i in range(num_bytes)])
+
+    def write_bytes(self, start_addr, contents):
+        data = self.data
+        for i in range(len(contents)):
+            data[start_addr + i] = ord(contents[i])
+
+    def copy_from(self, start_addr, block_mem, src_addr, num_bytes):
+        """Copy num_bytes from src_addr in block_mem to start_addr in this
+        block, a byte at a time in increasing address order.
+        """
+        if block_mem.data is None:
+            self.write_bytes(start_addr, block_mem.read_bytes(src_addr,
+                                                              num_bytes))
+            return
+        data = self.data
+        src_data = block_mem.data
+        for i in range(num_bytes):
+            data[start_addr + i] = src_data[src_addr + i]
+
+
+class _MappedBlockMemory(_BlockMemory):
+    """Block of memory held in part of a file which is mapped into memory, and
+    which can be shared with other processes (see Memory.map_external).
+    """
+
+    def __init__(self, mapping, offset, size):
+        self.data = None  # Data is held in the mapping.
+        self.mapping = mapping
+        self.offset = offset
+        self.size = size
+        self.frozen = False
+
+    def freeze(self):
+        pass  # Mapped memory is always shared.
+
+    def read(self, start_addr, num_bytes):
+        start_addr += self.offset
         value = 0
         for i in range(num_bytes - 1, -1, -1):
-            value = value << 8
-            value = value | ord(self.data[start_addr + i])
+            value = (value << 8) | ord(self.mapping.getitem(start_addr + i))
         return value
 
+    def iread(self, start_addr, num_bytes):
+        return self.read(start_addr, num_bytes)
+
     def write(self, start_addr, num_bytes, value, from_core=0x808):
+        start_addr += self.offset
         for i in range(num_bytes):
-            self.data[start_addr + i] = chr(value & 0xff)
+            self.mapping.setitem(start_addr + i, chr(value & 0xff))
             value = value >> 8
 
+    def read_bytes(self, start_addr, num_bytes):
+        start_addr += self.offset
+        return ''.join([self.mapping.getitem(start_addr + i)
+                        for i in range(num_bytes)])
+
+    def write_bytes(self, start_addr, contents):
+        start_addr += self.offset
+        for i in range(len(contents)):
+            self.mapping.setitem(start_addr + i, contents[i])
+
+    def copy_from(self, start_addr, block_mem, src_addr, num_bytes):
+        self.write_bytes(start_addr, block_mem.read_bytes(src_addr, num_bytes))
+
 
 class Memory(object):
     """Sparse memory model adapted from Pydgin.
@@ -59,17 +213,181 @@ class Memory(object):
         self.addr_mask  = block_size - 1
         self.block_mask = 0xffffffff ^ self.addr_mask
         self.block_dict = {}
-        self.code_blocks = []
+        self.code_blocks = []     # (start, end) as added by add_code_block().
+        self.code_ranges = []     # Sorted, disjoint (start, end) of code.
+        self.code_pages = {}      # Page number -> True, pages holding code.
+        self.register_files = {}  # coreid -> RegisterFile.
+        self.decode_caches = {}   # coreid -> {pc: Instruction}.
+        self.code_version = 0     # Incremented whenever code is modified.
+        self.owned_cores = None   # coreid -> True, set in --workers processes.
+        self.write_log = []       # (address, num_bytes, value) not owned.
+        self.dirty_pages = {}     # Page number -> True, owned pages written.
+        self.shared_start = 0     # Memory which is mapped from a file, see
+        self.shared_end = 0       # map_external().
+        self.timing = False       # --timing, see revelation.timing.
+        self.stall_cycles = 0     # Cycles spent waiting for reads.
+        self.mesh = None          # --mesh, see revelation.mesh.Mesh.
+        self.current_core = 0x808  # Core of accesses made with CURRENT_CORE.
+
+    def get_register_file(self, start_addr):
+        """Return the register file which holds the register at start_addr, or
+        None if start_addr is not a register of a simulated core.
+        start_addr must be a global address.
+        """
+        masked_addr = start_addr & 0xfffff
+        if not is_register_address(masked_addr):
+            return None
+        if reg_address_map[(masked_addr - 0xf0000) >> 2] == -1:
+            return None
+        return self.register_files.get(start_addr >> 20, None)
 
     def add_block(self, block_addr):
         self.block_dict[block_addr] = _BlockMemory(size=self.block_size)
 
+    def map_external(self, ext_base, ext_size, filename):
+        """Hold the ext_size MB of external RAM at ext_base in a file, which is
+        mapped into memory. Other simulators and host programs can map the
+        same file, and see each write as soon as it is made. The file is
+        created, or extended with zeros, if necessary.
+        """
+        ext_base &= self.block_mask
+        length = ext_size * self.block_size
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0644)
+        if os.fstat(fd).st_size < length:
+            os.ftruncate(fd, length)
+        mapping = new_mapping(fd, length)
+        os.close(fd)
+        for index in range(ext_size):
+            offset = index * self.block_size
+            self.block_dict[ext_base + offset] = _MappedBlockMemory(
+                mapping, offset, self.block_size)
+        self.shared_start = ext_base
+        self.shared_end = ext_base + length
+
     def get_block_mem(self, block_addr):
         if block_addr not in self.block_dict:
             self.add_block(block_addr)
         block_mem = self.block_dict[block_addr]
         return block_mem
 
+    def get_writable_block_mem(self, block_addr):
+        """Return the block at block_addr, first copying it if it is shared
+        with a snapshot.
+        """
+        block_mem = self.get_block_mem(block_addr)
+        if block_mem.frozen:
+            block_mem = block_mem.copy()
+            self.block_dict[block_addr] = block_mem
+        return block_mem
+
+    def freeze(self):
+        """Share every block of memory with a snapshot, and return a copy of
+        block_dict. From now on, a block is copied by the first write to it,
+        in this memory or in any memory made from the snapshot.
+        """
+        blocks = {}
+        for block_addr in self.block_dict:
+            block_mem = self.block_dict[block_addr]
+            block_mem.freeze()
+            blocks[block_addr] = block_mem
+        return blocks
+
+    def add_code_block(self, start, end):
+        """Mark the global addresses from start to end as code. Code blocks
+        are merged into sorted, disjoint ranges, and every page which holds
+        code is recorded, so that most writes can be checked with a single
+        dictionary lookup.
+        """
+        self.code_blocks.append((start, end))
+        ranges = self.code_ranges + [(start, end)]
+        ranges.sort()
+        merged = []
+        for range_start, range_end in ranges:
+            if merged and range_start <= merged[-1][1]:
+                last_start, last_end = merged.pop()
+                merged.append((last_start, max(last_end, range_end)))
+            else:
+                merged.append((range_start, range_end))
+        self.code_ranges = merged
+        for page in range(start >> PAGE_BITS, ((end - 1) >> PAGE_BITS) + 1):
+            self.code_pages[page] = True
+
+    def _find_code_range(self, end_addr):
+        """Return the index of the last code range which starts before
+        end_addr, or -1.
+        """
+        low = 0
+        high = len(self.code_ranges)
+        while low < high:
+            middle = (low + high) >> 1
+            if self.code_ranges[middle][0] < end_addr:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def _may_hold_code(self, start_addr, num_bytes):
+        """Return True if any page from start_addr to start_addr + num_bytes
+        holds code. start_addr must be a global address.
+        """
+        if not self.code_pages:
+            return False
+        for page in range(start_addr >> PAGE_BITS,
+                          ((start_addr + num_bytes - 1) >> PAGE_BITS) + 1):
+            if page in self.code_pages:
+                return True
+        return False
+
+    def is_code_address(self, start_addr, num_bytes, from_core=0x808):
+        """Return True if [start_addr, start_addr + num_bytes) lies inside a
+        code block, i.e. writes to it are caught by the self-modifying code
+        check in write().
+        """
+        if is_local_address(start_addr):
+            start_addr |= (from_core << 20)
+        if (start_addr >> PAGE_BITS) not in self.code_pages:
+            return False
+        index = self._find_code_range(start_addr + 1)
+        if index < 0:
+            return False
+        start, end = self.code_ranges[index]
+        return start_addr >= start and (start_addr + num_bytes) <= end
+
+    def check_code_write(self, start_addr, num_bytes, warn=True):
+        """Invalidate cached instructions if a write to [start_addr, start_addr
+        + num_bytes) modifies code, and warn if it lies inside a code block.
+        start_addr must be a global address.
+        """
+        if not self._may_hold_code(start_addr, num_bytes):
+            return
+        index = self._find_code_range(start_addr + num_bytes)
+        if index < 0:
+            return
+        start, end = self.code_ranges[index]
+        if end <= start_addr:
+            return
+        if warn and start_addr >= start and (start_addr + num_bytes) <= end:
+            print 'WARNING: self-modifying code @', pad_hex(start_addr)
+        self.invalidate_decode_caches(start_addr, num_bytes)
+
+    def invalidate_decode_caches(self, start_addr, num_bytes):
+        """Remove any cached instruction which overlaps the bytes from
+        start_addr to start_addr + num_bytes. start_addr must be a global
+        address. Cached instructions are keyed on their PC, which may be
+        core-local, and are fetched as 4 bytes.
+        """
+        self.code_version += 1
+        coreid = start_addr >> 20
+        for cache_coreid in self.decode_caches:
+            cache = self.decode_caches[cache_coreid]
+            for address in range(start_addr - 3, start_addr + num_bytes):
+                if address in cache:
+                    del cache[address]
+                local_address = address & 0xfffff
+                if (cache_coreid == coreid and (address >> 20) == coreid and
+                      local_address in cache):
+                    del cache[local_address]
+
     def iread(self, start_addr, num_bytes, from_core=0x808):
         if is_local_address(start_addr):
             start_addr |= (from_core << 20)
@@ -94,70 +412,276 @@ class Memory(object):
             value = value1 | (value2 << (num_bytes1 * 8))
         return value
 
-    def read(self, start_addr, num_bytes, from_core=0x808):
+    def read_latency(self, start_addr, from_core):
+        """Return the cycles which from_core waits for a read from the global
+        address start_addr, over and above a read from its own local memory.
+        """
+        coreid = start_addr >> 20
+        if coreid == from_core:
+            return 0
+        hops = (abs((coreid >> 6) - (from_core >> 6)) +
+                abs((coreid & 0x3f) - (from_core & 0x3f)))
+        if coreid in self.register_files:
+            latency = REMOTE_READ_CYCLES
+        else:
+            latency = EXTERNAL_READ_CYCLES
+        if self.mesh is not None:
+            return latency + self.mesh.read(from_core, coreid)
+        return latency + 2 * hops * MESH_HOP_CYCLES
+
+    def read(self, start_addr, num_bytes, from_core=CURRENT_CORE):
+        if from_core == CURRENT_CORE:
+            from_core = self.current_core
         if is_local_address(start_addr):
             start_addr |= (from_core << 20)
+        if self.timing:
+            self.stall_cycles += self.read_latency(start_addr, from_core)
+        if self.mesh is not None and len(self.mesh.in_flight) > 0:
+            self.mesh.forward(self, from_core, start_addr, num_bytes)
+        masked_addr = 0xfffff & start_addr
+        register_file = self.get_register_file(start_addr)
+        if register_file is not None:
+            return register_file.read_window(masked_addr, num_bytes)
         block_addr = self.block_mask & start_addr
         block_mem = self.get_block_mem(block_addr)
-        masked_addr = 0xfffff & start_addr
-        value = block_mem.read(start_addr & self.addr_mask, num_bytes)
-        if (self.debug.enabled('mem') and self.logger and
-              not is_register_address(masked_addr) and
-              (start_addr >> 20) == self.first_core):
-            if start_addr >> 20 == from_core:
-                start_addr = start_addr & 0xfffff
-            self.logger.log(' :: RD.MEM[%s] = %s' % \
-                              (pad_hex(start_addr), pad_hex(value)))
-        return value
+        return block_mem.read(start_addr & self.addr_mask, num_bytes)
 
-    def write(self, start_addr, num_bytes, value, from_core=0x808, quiet=False):
-        """Deal with register writes that are aliases to other locations. Better
-        not to put these in the instruction semantics, as the aliased
-        registers may be written to by a variety of instructions, and accessed
-        as either registers or memory locations.
+    def write(self, start_addr, num_bytes, value, from_core=CURRENT_CORE,
+              quiet=False, atomic=False):
+        """Writes to the register window of a simulated core are passed on to
+        the register file of that core, which deals with registers that are
+        aliases to other locations. With --mesh, writes to another simulated
+        core are sent over the mesh, and made when they arrive, unless they
+        are atomic (TESTSET).
         """
+        if from_core == CURRENT_CORE:
+            from_core = self.current_core
         if is_local_address(start_addr):
             start_addr |= (from_core << 20)
-        coreid_mask = start_addr & 0xfff00000
-        for start, end in self.code_blocks:
-            if start_addr >= start and (start_addr + num_bytes) <= end:
-                print 'WARNING: self-modifying code @', pad_hex(start_addr)
-        if start_addr & 0xfffff == 0xf042c:  # ILATST
-            ilat = self.read(coreid_mask | 0xf0428, 4) & 0x3ff
-            ilat |= (value & ((2 << 10) - 1))
-            self.write(coreid_mask | 0xf0428, 4, ilat)
-        elif start_addr & 0xfffff == 0xf0430:  # ILATCL
-            ilat = self.read(coreid_mask | 0xf0428, 4) & 0x3ff
-            ilat &= ~(value &  ((2 << 10) - 1))
-            self.write(coreid_mask | 0xf0428, 4, ilat)
-        elif start_addr & 0xfffff == 0xf0440:  # FSTATUS
-            status = self.read(coreid_mask | 0xf0404, 4)
-            status |= (value & 0xfffffffc)  # Can't write to lowest 2 bits.
-            self.write(coreid_mask | 0xf0404, 4, status)
-        elif start_addr & 0xfffff == 0xf0438 and value == 0:  # CTIMER0 expired.
-            ilat = self.read(coreid_mask | 0xf0428, 4) & 0x3ff
-            ilat |= 0x8
-            self.write(coreid_mask | 0xf0428, 4, ilat)
-        elif start_addr & 0xfffff == 0xf043c and value == 0:  # CTIMER1 expired.
-            ilat = self.read(coreid_mask | 0xf0428, 4) & 0x3ff
-            ilat |= 0x10
-            self.write(coreid_mask | 0xf0428, 4, ilat)
+        if self.mesh is not None and (start_addr >> 20) != from_core:
+            if not atomic and self.mesh.holds_back(from_core, start_addr):
+                self.mesh.send_write(from_core, start_addr, num_bytes, value)
+                return
+            self.mesh.route_write(from_core, start_addr)
+        if self.code_pages:
+            self.check_code_write(start_addr, num_bytes)
+        if self.owned_cores is not None:
+            self.track_write(start_addr, num_bytes, value)
+        register_file = self.get_register_file(start_addr)
+        if register_file is not None:
+            register_file.write_window(start_addr & 0xfffff, num_bytes, value)
+            return
         block_addr = self.block_mask & start_addr
-        block_mem = self.get_block_mem(block_addr)
+        block_mem = self.get_writable_block_mem(block_addr)
         block_mem.write(start_addr & self.addr_mask, num_bytes, value)
-        masked_addr = 0xfffff & start_addr
-        if (self.debug.enabled('mem') and self.logger and not quiet and
-              not is_register_address(masked_addr) and
-              (start_addr >> 20) == self.first_core):
-            if start_addr >> 20 == from_core:
-                start_addr = start_addr & 0xfffff
-            self.logger.log(' :: WR.MEM[%s] = %s' % \
-                              (pad_hex(start_addr), pad_hex(value)))
-
-
-class MemoryMappedRegisterFile(object):
-    """Simulate the memory-mapped registers of a single Epiphany core.
-    Note that memory objects can only read and write aligned words.
+
+    def copy(self, dst_addr, src_addr, num_bytes, from_core=CURRENT_CORE):
+        """Copy num_bytes from src_addr to dst_addr, e.g. for a DMA transfer.
+        The bytes are copied directly between blocks where possible. Copies
+        which touch the register window of a simulated core, cross a block
+        boundary, or must be logged for another --workers process, fall back
+        to one read() and write() per byte.
+        """
+        if from_core == CURRENT_CORE:
+            from_core = self.current_core
+        if is_local_address(src_addr):
+            src_addr |= (from_core << 20)
+        if is_local_address(dst_addr):
+            dst_addr |= (from_core << 20)
+        if (self._is_slow_copy(src_addr, num_bytes) or
+              self._is_slow_copy(dst_addr, num_bytes) or
+              (self.owned_cores is not None and
+               (dst_addr >> 20) not in self.owned_cores)):
+            for i in range(num_bytes):
+                self.write(dst_addr + i, 1,
+                           self.read(src_addr + i, 1, from_core=from_core),
+                           from_core=from_core, quiet=True)
+            return
+        if self.code_pages:
+            self.check_code_write(dst_addr, num_bytes)
+        if self.owned_cores is not None:
+            for page in range(dst_addr >> PAGE_BITS,
+                              ((dst_addr + num_bytes - 1) >> PAGE_BITS) + 1):
+                self.dirty_pages[page] = True
+        src_block = self.get_block_mem(self.block_mask & src_addr)
+        dst_block = self.get_writable_block_mem(self.block_mask & dst_addr)
+        dst_block.copy_from(dst_addr & self.addr_mask, src_block,
+                            src_addr & self.addr_mask, num_bytes)
+
+    def _is_slow_copy(self, start_addr, num_bytes):
+        """Return True if the bytes from start_addr to start_addr + num_bytes
+        cross a block boundary or overlap the registers of a simulated core.
+        start_addr must be a global address.
+        """
+        end_addr = start_addr + num_bytes - 1
+        if (start_addr & self.block_mask) != (end_addr & self.block_mask):
+            return True
+        masked_addr = start_addr & 0xfffff
+        return ((start_addr >> 20) in self.register_files and
+                masked_addr <= 0xf0718 and (end_addr & 0xfffff) >= 0xf0000)
+
+    def track_write(self, start_addr, num_bytes, value):
+        """Record a write made by a core in this --workers process, so that it
+        can be sent to the other processes (see revelation.workers). Writes to
+        the local memory of a core owned by this process mark the page dirty.
+        Any other write, including to external RAM and to the registers of
+        other cores, is logged individually so that writes from different
+        processes can be applied in the same order everywhere. Writes to memory
+        which is mapped from a file are already seen by every process.
+        start_addr must be a global address.
+        """
+        if (start_addr >> 20) in self.owned_cores:
+            if not is_register_address(start_addr & 0xfffff):
+                self.dirty_pages[start_addr >> PAGE_BITS] = True
+                self.dirty_pages[(start_addr + num_bytes - 1) >> PAGE_BITS] = True
+        elif not self.shared_start <= start_addr < self.shared_end:
+            self.write_log.append((start_addr, num_bytes, value))
+
+    def read_page(self, page):
+        """Return the contents of a page of memory as a string.
+        """
+        block_mem = self.get_block_mem(self.block_mask & (page << PAGE_BITS))
+        return block_mem.read_bytes((page << PAGE_BITS) & self.addr_mask,
+                                    PAGE_SIZE)
+
+    def write_page(self, page, contents):
+        """Overwrite a page of memory, e.g. with a copy from another process.
+        """
+        start_addr = page << PAGE_BITS
+        self.check_code_write(start_addr, PAGE_SIZE, warn=False)
+        block_mem = self.get_writable_block_mem(self.block_mask & start_addr)
+        block_mem.write_bytes(start_addr & self.addr_mask, contents)
+
+    def apply_write(self, start_addr, num_bytes, value):
+        """Repeat a write which was made in another process. Unlike write(),
+        this is not logged or tracked. start_addr must be a global address.
+        """
+        self.check_code_write(start_addr, num_bytes, warn=False)
+        register_file = self.get_register_file(start_addr)
+        if register_file is not None:
+            register_file.write_window(start_addr & 0xfffff, num_bytes, value)
+            return
+        block_mem = self.get_writable_block_mem(self.block_mask & start_addr)
+        block_mem.write(start_addr & self.addr_mask, num_bytes, value)
+
+
+class TracedMemory(Memory):
+    """Memory which writes accesses to the local memory of the first core to
+    the --debug trace. Memory itself has no tracing code at all, so that runs
+    without --debug pay nothing for it.
+    """
+
+    def read(self, start_addr, num_bytes, from_core=CURRENT_CORE):
+        if from_core == CURRENT_CORE:
+            from_core = self.current_core
+        value = Memory.read(self, start_addr, num_bytes, from_core)
+        if self.debug.enabled('mem'):
+            self._trace(False, start_addr, value, from_core)
+        return value
+
+    def write(self, start_addr, num_bytes, value, from_core=CURRENT_CORE,
+              quiet=False, atomic=False):
+        if from_core == CURRENT_CORE:
+            from_core = self.current_core
+        Memory.write(self, start_addr, num_bytes, value, from_core, quiet,
+                     atomic)
+        if self.debug.enabled('mem') and not quiet:
+            self._trace(True, start_addr, value, from_core, atomic)
+
+    def _trace(self, is_write, start_addr, value, from_core, atomic=False):
+        if is_local_address(start_addr):
+            start_addr |= (from_core << 20)
+        if (is_register_address(0xfffff & start_addr) or
+              (start_addr >> 20) != self.first_core):
+            return
+        if (is_write and self.mesh is not None and not atomic and
+              self.mesh.holds_back(from_core, start_addr)):
+            return  # Logged when it arrives.
+        if start_addr >> 20 == from_core:
+            start_addr = start_addr & 0xfffff
+        self.logger.log_memory(is_write, start_addr, value)
+
+
+_STATUS = reg_map['STATUS']
+_CONFIG = reg_map['CONFIG']
+_ILAT = reg_map['ILAT']
+_register_masks = [(1 << reg_memory_map[index][1]) - 1
+                   for index in xrange(len(reg_memory_map))]
+
+
+# Side effects of writing to special core registers. Each handler is called
+# with the register file, the register index and the masked value, and must
+# store the value itself. Registers without a handler are stored directly.
+def _write_interrupt_register(rf, index, value):
+    """Writes to these registers may allow an interrupt to be serviced."""
+    if rf.state is not None:
+        rf.state.interrupt_pending = True
+        if rf.scheduler is not None and not rf.state.ACTIVE:
+            rf.scheduler.wake(rf.coreid)
+    rf.regs[index] = value
+
+
+def _write_status(rf, index, value):
+    if rf.state is None:
+        rf.regs[index] = value
+    elif index == _STATUS:
+        rf.state.set_status(value)
+    else:
+        rf.state.set_config(value)
+
+
+def _write_ilatst(rf, index, value):
+    rf.regs[_ILAT] |= value
+    _write_interrupt_register(rf, index, value)
+
+
+def _write_ilatcl(rf, index, value):
+    rf.regs[_ILAT] &= ~value
+    rf.regs[index] = value
+
+
+def _write_fstatus(rf, index, value):
+    # Can't write to lowest 2 bits.
+    status = rf.read_register(_STATUS) | (value & 0xfffffffc)
+    rf.write_register(_STATUS, status)
+    rf.regs[index] = value
+
+
+def _write_ctimer(rf, index, value):
+    if value == 0:  # Timer expired.
+        if index == reg_map['CTIMER0']:
+            rf.regs[_ILAT] |= 0x8
+        else:
+            rf.regs[_ILAT] |= 0x10
+    _write_interrupt_register(rf, index, value)
+
+
+_write_handlers = [None] * len(reg_memory_map)
+
+
+def set_write_handler(name, handler):
+    """Call handler(rf, index, value) on every write to the register 'name',
+    in place of storing the value directly.
+    """
+    _write_handlers[reg_map[name]] = handler
+
+
+for _name in ['ILAT', 'IMASK', 'IPEND', 'DEBUGSTATUS']:
+    set_write_handler(_name, _write_interrupt_register)
+set_write_handler('STATUS', _write_status)
+set_write_handler('CONFIG', _write_status)
+set_write_handler('ILATST', _write_ilatst)
+set_write_handler('ILATCL', _write_ilatcl)
+set_write_handler('FSTATUS', _write_fstatus)
+set_write_handler('CTIMER0', _write_ctimer)
+set_write_handler('CTIMER1', _write_ctimer)
+
+
+class RegisterFile(object):
+    """Simulate the registers of a single Epiphany core.
+    Registers are held in a fixed-size list of words, indexed by the register
+    numbers in revelation.registers.reg_map. Memory accesses to the register
+    window of this core (0xf0000-0xf0718) are redirected here by Memory.
     """
 
     def __init__(self, memory, coreid, logger):
@@ -165,31 +689,104 @@ class MemoryMappedRegisterFile(object):
         self.logger = logger
         self.memory = memory
         self.coreid = coreid
-        self.coreid_mask = coreid << 20
         self.is_first_core = False
-        self.memory.write(self.coreid_mask | 0xf0704, 4, coreid & 0xfff,
-                          from_core=coreid, quiet=True)
         self.num_regs = len(reg_memory_map)
-        self.debug_nchars = 8
+        self.regs = [0] * self.num_regs
+        self.regs[reg_map['COREID']] = coreid & 0xfff
+        self.memory.register_files[coreid] = self
+        self.state = None  # revelation.machine.State, which caches flags.
+        self.scheduler = None  # revelation.scheduler.Scheduler, wakes idle cores.
+
+    def read_register(self, index):
+        """Read a register. STATUS and CONFIG are built from the flags cached
+        in the state which owns this register file.
+        """
+        if index < 64 or self.state is None:
+            return self.regs[index]
+        elif index == _STATUS:
+            return self.state.get_status()
+        elif index == _CONFIG:
+            return self.state.get_config()
+        return self.regs[index]
 
     def __getitem__(self, index):
-        address, bitsize, _ = reg_memory_map[index]
-        mask = (1 << bitsize) - 1
-        value = self.memory.iread(address, 4, from_core=self.coreid) & mask
-        if (self.debug.enabled('rf') and self.logger and index < 64 and
-              self.is_first_core):
-            self.logger.log(' :: RD.RF[%s] = %s' % (pad('%d' % index, 2),
-                              pad_hex(value, len=self.debug_nchars)))
-        return value
+        return self.read_register(index)
 
     def __setitem__(self, index, value):
         if index == 0x65:  # COREID register. Read only. Other Read/Write only
             return         # registers need to be accessed by instructions.
-        address, bitsize, _ = reg_memory_map[index]  # Lower 20 bits of address.
-        mask = (1 << bitsize) - 1
-        self.memory.write(self.coreid_mask | address, 4, value & mask,
-                                 from_core=self.coreid, quiet=True)
-        if (self.debug.enabled('rf') and self.logger and index < 64 and
-              self.is_first_core):
-            self.logger.log(' :: WR.RF[%s] = %s' % ((pad('%d' % index, 2),
-                              pad_hex(value, len=self.debug_nchars))))
+        self.write_register(index, value)
+
+    def write_register(self, index, value):
+        """Write to a register, including the side effects of writing to
+        registers that are aliases to other registers (see _write_handlers).
+        """
+        if index < 64:
+            self.regs[index] = value & 0xffffffff
+            return
+        value &= _register_masks[index]
+        handler = _write_handlers[index]
+        if handler is None:
+            self.regs[index] = value
+        else:
+            handler(self, index, value)
+
+    def _read_window_word(self, address):
+        if not is_register_address(address):
+            return 0
+        index = reg_address_map[(address - 0xf0000) >> 2]
+        if index == -1:
+            return 0
+        return self.read_register(index)
+
+    def read_window(self, address, num_bytes):
+        """Read from the register window, as a memory access would.
+        address is the lower 20 bits of the address of a register.
+        """
+        if num_bytes == 4 and address & 0x3 == 0:
+            return self._read_window_word(address)
+        value = 0
+        for i in range(num_bytes - 1, -1, -1):
+            byte_addr = address + i
+            word = self._read_window_word(byte_addr & ~0x3)
+            value = (value << 8) | ((word >> ((byte_addr & 0x3) * 8)) & 0xff)
+        return value
+
+    def write_window(self, address, num_bytes, value):
+        """Write to the register window, as a memory access would. Unlike
+        writes made through the register file, this can change COREID.
+        address is the lower 20 bits of the address of a register.
+        """
+        if num_bytes == 4 and address & 0x3 == 0:
+            index = reg_address_map[(address - 0xf0000) >> 2]
+            if index != -1:
+                self.write_register(index, value)
+            return
+        for i in range(num_bytes):
+            byte_addr = address + i
+            word_addr = byte_addr & ~0x3
+            if not is_register_address(word_addr):
+                break
+            index = reg_address_map[(word_addr - 0xf0000) >> 2]
+            if index != -1:
+                shift = (byte_addr & 0x3) * 8
+                word = self.read_register(index) & ~(0xff << shift)
+                self.write_register(index, word | ((value & 0xff) << shift))
+            value = value >> 8
+
+
+class TracedRegisterFile(RegisterFile):
+    """Register file which writes accesses to the general purpose registers of
+    the first core to the --debug trace.
+    """
+
+    def __getitem__(self, index):
+        value = self.read_register(index)
+        if self.debug.enabled('rf') and index < 64 and self.is_first_core:
+            self.logger.log_register(False, index, value)
+        return value
+
+    def __setitem__(self, index, value):
+        RegisterFile.__setitem__(self, index, value)
+        if self.debug.enabled('rf') and index < 64 and self.is_first_core:
+            self.logger.log_register(True, index, value)
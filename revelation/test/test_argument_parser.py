@@ -25,6 +25,9 @@ def test_argv_defaults(capfd):
     assert revelation.max_insts == 0
     assert revelation.switch_interval == 1
     assert not revelation.collect_times
+    assert not revelation.use_blocks
+    assert not revelation.model_timing
+    assert revelation.num_workers == 1
     assert revelation.logger == None
 
 
@@ -41,6 +44,17 @@ def test_argv_defaults(capfd):
  (('sim.py', '-e', 'OPERATING', ELF_FILE),       (('user_environment', False),)),
  (('sim.py', '--max-insts', '100000', ELF_FILE), (('max_insts', 100000),)),
  (('sim.py', '--switch', '25', ELF_FILE),        (('switch_interval', 25),)),
+ (('sim.py', '--workers', '4', ELF_FILE),       (('num_workers', 4),)),
+ (('sim.py', '--quantum', '500', ELF_FILE),      (('worker_quantum', 500),)),
+ (('sim.py', '--checkpoint-at', '100000', ELF_FILE), (('checkpoint_at', 100000),)),
+ (('sim.py', '--trace-format', 'gzip', ELF_FILE), (('trace_format', 'gzip'),)),
+ (('sim.py', '--trace-flush', '0', ELF_FILE),    (('trace_flush', 0),)),
+ (('sim.py', '--trace-ring', '100', ELF_FILE),   (('trace_ring', 100),)),
+ (('sim.py', '--hot-spots', '10', ELF_FILE),     (('hot_spots', 10),)),
+ (('sim.py', '--stats', os.devnull, ELF_FILE),   (('stats_file', os.devnull),)),
+ (('sim.py', '--sample', '0', ELF_FILE),        (('sample_interval', 0),)),
+ (('sim.py', '--timeline', os.devnull, ELF_FILE),
+  (('timeline_file', os.devnull),)),
 ])
 def test_argv_flags_with_args(argv, expected, capfd):
     revelation = Revelation()
@@ -70,7 +84,10 @@ def test_argv_debug_flags(capfd):
 [(('sim.py', '--time', ELF_FILE), 'collect_times'),
  (('sim.py', '-t',     ELF_FILE), 'collect_times'),
  (('sim.py', '--profile', ELF_FILE), 'profile'),
- (('sim.py', '-p',     ELF_FILE), 'profile'),])
+ (('sim.py', '-p',     ELF_FILE), 'profile'),
+ (('sim.py', '--blocks', ELF_FILE), 'use_blocks'),
+ (('sim.py', '--timing', ELF_FILE), 'model_timing'),
+ (('sim.py', '--mesh', ELF_FILE), 'model_mesh'),])
 def test_argv_flags_with_no_args(argv, attribute, capfd):
     revelation = Revelation()
     entry_point = revelation.get_entry_point()
@@ -97,6 +114,16 @@ def test_argv_with_errors(argv, expected, capfd):
     assert out == expected
 
 
+def test_argv_trace_ring_needs_trace_flag(capfd):
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    retval = entry_point(('sim.py', '--trace-ring', '10', '-d', 'mem',
+                          ELF_FILE))
+    assert retval == 2  # Syntax error.
+    out, _ = capfd.readouterr()
+    assert out.endswith('--trace-ring needs the trace debug flag.\n')
+
+
 @pytest.mark.parametrize('argv', [('sim.py', '--help'), ('sim.py', '-h')])
 def test_argv_help(argv, capfd):
     revelation = Revelation()
@@ -107,3 +134,16 @@ def test_argv_help(argv, capfd):
     out, err = capfd.readouterr()
     assert err == ''
     assert out == expected
+
+
+def test_argv_ext_file(tmpdir, capfd):
+    filename = os.path.join(str(tmpdir), 'ext.ram')
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    retval = entry_point(('sim.py', '--ext-file', filename, '-s', '1',
+                          ELF_FILE))
+    assert retval == 0  # Exit success.
+    _, err = capfd.readouterr()
+    assert err == ''
+    assert revelation.ext_file == filename
+    assert os.path.getsize(filename) == 2**20
@@ -0,0 +1,179 @@
+from pydgin.debug import Debug
+
+from revelation.batch import BatchError, parse_manifest, run_batch
+from revelation.sim import (BATCH_RESULTS_FILENAME, EXIT_FILE_ERROR,
+                            EXIT_GENERAL_ERROR, EXIT_SUCCESS, EXIT_SYNTAX_ERROR,
+                            Revelation)
+
+import json
+import os.path
+import pytest
+
+c_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                     'revelation', 'test', 'c')
+multicore_dir = os.path.join(os.path.dirname(c_dir), 'multicore')
+
+
+def write_file(directory, filename, data):
+    path = os.path.join(directory, filename)
+    with open(path, 'w') as out_file:
+        out_file.write(data)
+    return path
+
+
+def run_manifest(tmpdir, manifest):
+    manifest_file = write_file(str(tmpdir), 'manifest.txt', manifest)
+    results_file = os.path.join(str(tmpdir), 'results.json')
+    revelation = Revelation()
+    revelation.debug = Debug()
+    exit_code = run_batch(revelation, manifest_file, results_file)
+    with open(results_file) as in_file:
+        return exit_code, json.load(in_file)
+
+
+def test_parse_manifest():
+    manifest = ('# ELFFILE ROWS COLS FIRSTCORE MAXINSTS [EXPECTED]\n'
+                '\n'
+                'hello.elf  1 1 0x808 0 hello.txt\n'
+                '/tmp/a.elf 2 3 0x809 1000\n'
+                '\tb.elf 1 1 808 0 -\n')
+    runs = parse_manifest(manifest, 'tests/manifest.txt')
+    assert 3 == len(runs)
+    assert 'tests/hello.elf' == runs[0].elf_filename
+    assert 'tests/hello.txt' == runs[0].expected_filename
+    assert ((2, 3, 0x809, 1000) ==
+            (runs[1].rows, runs[1].cols, runs[1].first_core, runs[1].max_insts))
+    assert '/tmp/a.elf' == runs[1].elf_filename
+    assert '' == runs[1].expected_filename
+    assert '' == runs[2].expected_filename
+
+
+@pytest.mark.parametrize('manifest', ['hello.elf 1 1 0x808\n',
+                                      'hello.elf 1 x 0x808 0\n'])
+def test_parse_bad_manifest(manifest):
+    with pytest.raises(BatchError):
+        parse_manifest(manifest, 'manifest.txt')
+
+
+def test_batch_compares_output(tmpdir, capfd):
+    write_file(str(tmpdir), 'wrong.txt', 'Hello, world?\n')
+    exit_code, results = run_manifest(tmpdir,
+        '%s/hello.elf 1 1 0x808 0 %s/hello.txt\n'
+        '%s/fib_print.elf 1 1 0x808 0 -\n'
+        '%s/hello.elf 1 1 0x808 0 wrong.txt\n'
+        '%s/missing.elf 1 1 0x808 0\n' % (c_dir, c_dir, c_dir, c_dir, c_dir))
+    assert EXIT_GENERAL_ERROR == exit_code
+    assert (2, 1, 1) == (results['passed'], results['failed'],
+                         results['errors'])
+    runs = results['runs']
+    assert ['pass', 'pass', 'fail', 'error'] == [run['result'] for run in runs]
+    assert 'Hello, world!\n' == runs[2]['output']
+    assert 0 < runs[1]['instructions']
+    assert runs[1]['instructions'] == runs[1]['ticks']
+    assert '0x808' == runs[0]['first_core']
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Hello, world!' not in out  # Captured for comparison.
+    assert '10946' not in out
+    assert 'PASS %s/hello.elf' % c_dir in out
+    assert '2 of 4 runs passed.' in out
+
+
+def test_batch_reuses_simulator_for_many_cores(tmpdir, capfd):
+    exit_code, results = run_manifest(tmpdir,
+        '%s/hello.elf 1 2 0x808 0 -\n'
+        '%s/fib_print.elf 1 1 0x808 0 -\n' % (c_dir, c_dir))
+    assert EXIT_SUCCESS == exit_code
+    assert 2 == results['passed']
+
+
+def test_batch_from_command_line(tmpdir, capfd):
+    manifest_file = write_file(str(tmpdir), 'manifest.txt',
+                               'hello.elf 1 1 0x808 0 hello.txt\n')
+    write_file(str(tmpdir), 'hello.txt', 'Hello, world!\n')
+    write_file(str(tmpdir), 'hello.elf',
+               open(os.path.join(c_dir, 'hello.elf'), 'rb').read())
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        revelation = Revelation()
+        entry_point = revelation.get_entry_point()
+        assert EXIT_SUCCESS == entry_point(('sim.py', '--batch',
+                                            manifest_file))
+        assert os.path.exists(BATCH_RESULTS_FILENAME)
+    finally:
+        os.chdir(cwd)
+    assert manifest_file == revelation.batch_file
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert '1 of 1 runs passed. Results written to: r_batch.json.\n' in out
+
+
+@pytest.mark.parametrize('manifest,expected',
+                         [(None, EXIT_FILE_ERROR),
+                          ('hello.elf 1 1\n', EXIT_SYNTAX_ERROR)])
+def test_batch_bad_manifest(tmpdir, manifest, expected, capfd):
+    filename = os.path.join(str(tmpdir), 'manifest.txt')
+    if manifest is not None:
+        write_file(str(tmpdir), 'manifest.txt', manifest)
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    assert expected == entry_point(('sim.py', '--batch', filename))
+
+
+def test_batch_prints_summary_of_each_run(tmpdir, capfd):
+    manifest_file = write_file(str(tmpdir), 'manifest.txt',
+                               '%s/hello.elf 1 1 0x808 0 %s/hello.txt\n'
+                               '%s/fib_print.elf 1 1 0x808 0 -\n' %
+                               (c_dir, c_dir, c_dir))
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        assert EXIT_SUCCESS == entry_point(('sim.py', '--timing',
+                                            '--hot-spots', '1', '--batch',
+                                            manifest_file))
+    finally:
+        os.chdir(cwd)
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Hello, world!' not in out
+    assert 2 == out.count('Estimated cycles (slowest core): ')
+    assert 2 == out.count('Hot spots on core 0x808')
+    assert (out.index('Estimated cycles') <
+            out.index('PASS %s/hello.elf' % c_dir))
+
+
+@pytest.mark.parametrize('option', [('--stats', os.devnull),
+                                    ('--sample', '100'),
+                                    ('--timeline', os.devnull)])
+def test_batch_rejects_output_files(option, capfd):
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    assert EXIT_SYNTAX_ERROR == entry_point(('sim.py',) + option +
+                                            ('--batch', 'manifest.txt'))
+    out, _ = capfd.readouterr()
+    assert ('--stats, --sample and --timeline cannot be used with --batch.\n'
+            == out)
+
+
+def test_batch_runs_start_from_cycle_zero(tmpdir, capfd):
+    elf_filename = os.path.join(multicore_dir, 'wake_on_interrupt.elf')
+    manifest_file = write_file(str(tmpdir), 'manifest.txt',
+                               '%s 1 2 0x808 0 -\n%s 1 2 0x808 0 -\n' %
+                               (elf_filename, elf_filename))
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        assert EXIT_SUCCESS == entry_point(('sim.py', '--timing', '--batch',
+                                            manifest_file))
+    finally:
+        os.chdir(cwd)
+    out, err = capfd.readouterr()
+    assert err == ''
+    cycles = [line for line in out.split('\n') if 'Estimated cycles' in line]
+    assert 6 == len(cycles)  # Two cores and the slowest, for each run.
+    assert cycles[:3] == cycles[3:]
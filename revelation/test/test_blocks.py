@@ -0,0 +1,132 @@
+from revelation.blocks import (get_block, translate_block, _CompareBranchStep,
+                               _LoadConstantStep, _PairStep, _SingleStep)
+from revelation.machine import RESET_ADDR
+from revelation.sim import EXIT_SUCCESS, Revelation
+from revelation.test.sim import MockRevelation
+from revelation.test.machine import StateChecker
+
+import opcode_factory
+import os.path
+import pytest
+
+test_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                        'revelation', 'test')
+
+
+def new_revelation(instructions, **args):
+    """Load a program, and mark it as code so that it can be translated.
+    """
+    revelation = MockRevelation()
+    revelation.init_state(instructions, **args)
+    size = sum([width / 8 for _, width in instructions])
+    start = (0x808 << 20) | RESET_ADDR
+    revelation.memory.add_code_block(start, start + size)
+    revelation.max_insts = 0
+    return revelation
+
+
+# r1 = 5; do { r1 -= 1; } while (r1 != 0);
+countdown = [(opcode_factory.movimm32(rd=1, imm=5), 32),
+             (opcode_factory.movtimm32(rd=1, imm=0), 32),
+             (opcode_factory.sub32_immediate(rd=1, rn=1, imm=1), 32),
+             (opcode_factory.bcond16(condition=0b0001, imm=0xfe), 16),
+             (opcode_factory.trap16(3), 16),
+            ]
+
+
+def test_translate_fused_steps():
+    revelation = new_revelation(countdown)
+    block = translate_block(revelation.states[0x808], RESET_ADDR)
+    assert block.start_pc == RESET_ADDR
+    assert block.end_pc == RESET_ADDR + 14
+    assert block.num_insts == 4
+    assert len(block.steps) == 2
+    assert isinstance(block.steps[0], _LoadConstantStep)
+    assert isinstance(block.steps[1], _CompareBranchStep)
+    assert block.steps[1].taken_pc == RESET_ADDR + 8
+    assert block.steps[1].next_pc == RESET_ADDR + 14
+
+
+def test_translate_load_store_add():
+    instructions = [(opcode_factory.ldstrdisp16(rd=2, rn=3, imm=0, bb=0b10, s=1), 16),
+                    (opcode_factory.add32_immediate(rd=3, rn=3, imm=4), 32),
+                    (opcode_factory.nop16(), 16),
+                    (opcode_factory.trap16(3), 16),
+                   ]
+    revelation = new_revelation(instructions)
+    block = translate_block(revelation.states[0x808], RESET_ADDR)
+    assert block.num_insts == 4
+    assert len(block.steps) == 3
+    assert isinstance(block.steps[0], _PairStep)
+    assert block.steps[0].may_write_code
+    assert isinstance(block.steps[1], _SingleStep)
+
+
+def test_no_block_outside_code():
+    revelation = MockRevelation()
+    revelation.init_state(countdown)
+    assert get_block(revelation.states[0x808], RESET_ADDR) is None
+
+
+def test_run_blocks_matches_run():
+    expected = new_revelation(countdown)
+    expected_code, expected_ticks = expected.run()
+    revelation = new_revelation(countdown)
+    revelation.use_blocks = True
+    exit_code, ticks = revelation.run()
+    assert EXIT_SUCCESS == exit_code == expected_code
+    assert ticks == expected_ticks == 13
+    assert revelation.states[0x808].num_insts == 13
+    expected_state = StateChecker(pc=(RESET_ADDR + 16), rf1=0, AZ=1)
+    expected_state.check(revelation.states[0x808])
+    assert not revelation.states[0x808].running
+
+
+def test_run_blocks_without_code_blocks():
+    instructions = [(opcode_factory.add32_immediate(rd=1, rn=0, imm=0b01010101010), 32),
+                    (opcode_factory.trap16(3), 16)]
+    revelation = MockRevelation()
+    revelation.init_state(instructions, rf0=0b01010101010)
+    revelation.use_blocks = True
+    exit_code, ticks = revelation.run()
+    assert EXIT_SUCCESS == exit_code
+    assert len(instructions) == ticks
+    expected_state = StateChecker(pc=(6 + RESET_ADDR), rf1=(0b01010101010 * 2))
+    expected_state.check(revelation.states[0x808])
+
+
+def test_block_cache_invalidated_by_code_write(capfd):
+    revelation = new_revelation(countdown)
+    state = revelation.states[0x808]
+    block = get_block(state, RESET_ADDR)
+    assert get_block(state, RESET_ADDR) is block
+    revelation.memory.write(RESET_ADDR, 4, opcode_factory.movimm32(rd=1, imm=7))
+    new_block = get_block(state, RESET_ADDR)
+    assert new_block is not block
+    assert new_block.steps[0].value == 7
+    out, _ = capfd.readouterr()
+    assert out.startswith('WARNING: self-modifying code')
+
+
+@pytest.mark.parametrize('elf_file,cols,expected',
+    [('c/div_by_zero.elf',                 1, 'Exception_isr 214023\nEnd.\n'),
+     ('c/fib_print.elf',                   1, '10946\n'),
+     ('c/interrupt_ctimer0.elf',           1, 'CTIMER0 has expired.\n'),
+     ('c/selfmod.elf',                     1, 'Hello\n'),
+     ('multicore/manual_message_pass.elf', 2, 'Received message.\n'),
+     ('multicore/wake_on_interrupt.elf',   2, 'Core 0x808 woken by interrupt.\n'),
+    ])
+def test_run_blocks_elf(elf_file, cols, expected, capfd):
+    elf_filename = os.path.join(test_dir, elf_file)
+    revelation = Revelation()
+    revelation.cols = cols
+    revelation.use_blocks = True
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+        revelation.max_insts = 100000
+        revelation.run()
+        for coreid in revelation.states:
+            assert not revelation.states[coreid].running
+        out, err = capfd.readouterr()
+        assert err == ''
+        assert expected in out
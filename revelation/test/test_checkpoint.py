@@ -0,0 +1,188 @@
+from revelation.checkpoint import CheckpointError
+from revelation.machine import State
+from revelation.registers import reg_map
+from revelation.sim import EXIT_SUCCESS, Revelation, new_memory
+
+from pydgin.debug import Debug
+
+import os.path
+import pytest
+
+test_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                        'revelation', 'test')
+
+
+def run_elf(elf_file, cols, **attributes):
+    elf_filename = os.path.join(test_dir, elf_file)
+    revelation = Revelation()
+    revelation.cols = cols
+    for attribute in attributes:
+        setattr(revelation, attribute, attributes[attribute])
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+        revelation.max_insts = 100000
+        exit_code, ticks = revelation.run()
+    return revelation, exit_code, ticks
+
+
+@pytest.mark.parametrize('elf_file,cols,checkpoint_at',
+    [('c/fib_print.elf',                   1, 1000),
+     ('c/interrupt_ctimer0.elf',           1, 500),
+     ('multicore/manual_message_pass.elf', 2, 3001),
+     ('multicore/wake_on_interrupt.elf',   2, 2000),
+    ])
+def test_restore_matches_uninterrupted_run(elf_file, cols, checkpoint_at,
+                                           tmpdir, capfd):
+    expected, expected_code, expected_ticks = run_elf(elf_file, cols)
+    expected_out, _ = capfd.readouterr()
+    checkpoint_file = os.path.join(str(tmpdir), 'checkpoint.dat')
+    first, exit_code, ticks = run_elf(elf_file, cols,
+                                      checkpoint_at=checkpoint_at,
+                                      checkpoint_file=checkpoint_file)
+    assert (exit_code, ticks) == (expected_code, expected_ticks)
+    out, _ = capfd.readouterr()
+    assert ('Checkpoint at tick %s written to: %s.\n' %
+            ('{:,}'.format(checkpoint_at), checkpoint_file)) in out
+    revelation = Revelation()
+    revelation.restore_state(checkpoint_file, is_test=True)
+    revelation.max_insts = 100000
+    assert revelation.restored_ticks == checkpoint_at
+    exit_code, ticks = revelation.run()
+    assert (exit_code, ticks) == (expected_code, expected_ticks)
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert expected_out.endswith(out[out.index('\n') + 1:])
+    for coreid in expected.states:
+        expected_state = expected.states[coreid]
+        state = revelation.states[coreid]
+        assert state.num_insts == expected_state.num_insts
+        assert state.running == expected_state.running
+        assert state.rf.regs[:64] == expected_state.rf.regs[:64]
+        assert (state.rf[reg_map['STATUS']] ==
+                expected_state.rf[reg_map['STATUS']])
+
+
+def test_restore_matches_uninterrupted_timing(tmpdir, capfd):
+    expected, _, _ = run_elf('c/fib_print.elf', 1, model_timing=True)
+    checkpoint_file = os.path.join(str(tmpdir), 'checkpoint.dat')
+    run_elf('c/fib_print.elf', 1, model_timing=True, checkpoint_at=1034,
+            checkpoint_file=checkpoint_file)
+    revelation = Revelation()
+    revelation.restore_state(checkpoint_file, is_test=True)
+    revelation.model_timing = True
+    revelation.run()
+    capfd.readouterr()
+    assert (revelation.states[0x808].timing.cycles ==
+            expected.states[0x808].timing.cycles)
+
+
+def test_restore_dma_channels(tmpdir):
+    revelation = Revelation()
+    revelation.memory = new_memory(None)
+    state = State(revelation.memory, Debug(), coreid=0x808)
+    revelation.states[0x808] = state
+    state.dma[0].outer_stride = 0x00040004
+    state.dma[1].inner_count = 3
+    state.timing.last_rd = 5
+    state.timing.last_paired = True
+    snapshot = revelation.take_snapshot()
+    child = Revelation()
+    child.restore_snapshot(snapshot, is_test=True)
+    restored = child.states[0x808]
+    assert 0x00040004 == restored.dma[0].outer_stride
+    assert 3 == restored.dma[1].inner_count
+    assert (5, True) == (restored.timing.last_rd, restored.timing.last_paired)
+
+
+def test_no_checkpoint_after_halt(tmpdir, capfd):
+    checkpoint_file = os.path.join(str(tmpdir), 'checkpoint.dat')
+    _, exit_code, _ = run_elf('c/fib_print.elf', 1, checkpoint_at=10**9,
+                              checkpoint_file=checkpoint_file)
+    assert exit_code == EXIT_SUCCESS
+    assert not os.path.exists(checkpoint_file)
+
+
+def test_restore_bad_file(tmpdir):
+    filename = os.path.join(str(tmpdir), 'not_a_checkpoint')
+    with open(filename, 'wb') as bad_file:
+        bad_file.write('Hello, world!\n')
+    revelation = Revelation()
+    with pytest.raises(CheckpointError):
+        revelation.restore_state(filename, is_test=True)
+    with pytest.raises(CheckpointError):
+        revelation.restore_state(filename + '.missing', is_test=True)
+
+
+def test_restore_from_command_line(tmpdir, capfd):
+    checkpoint_file = os.path.join(str(tmpdir), 'checkpoint.dat')
+    run_elf('c/fib_print.elf', 1, checkpoint_at=1000,
+            checkpoint_file=checkpoint_file)
+    capfd.readouterr()
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    assert EXIT_SUCCESS == entry_point(('sim.py', '--restore', checkpoint_file))
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert out.startswith('Restored checkpoint %s at tick 1,000.\n10946\n' %
+                          checkpoint_file)
+
+
+def test_snapshot_copies_blocks_on_write():
+    revelation = Revelation()
+    revelation.memory = new_memory(None)
+    revelation.memory.write(0x80800100, 4, 0x11111111)
+    revelation.memory.write(0x8e000000, 4, 0x22222222)
+    revelation.states[0x808] = State(revelation.memory, Debug(), coreid=0x808)
+    snapshot = revelation.take_snapshot()
+    child = Revelation()
+    child.restore_snapshot(snapshot, is_test=True)
+    for block_addr in [0x80800000, 0x8e000000]:
+        assert (child.memory.block_dict[block_addr] is
+                revelation.memory.block_dict[block_addr])
+    child.memory.write(0x80800100, 4, 0x33333333)
+    assert 0x33333333 == child.memory.read(0x80800100, 4)
+    assert 0x11111111 == revelation.memory.read(0x80800100, 4)
+    assert (child.memory.block_dict[0x80800000] is not
+            revelation.memory.block_dict[0x80800000])
+    assert (child.memory.block_dict[0x8e000000] is
+            revelation.memory.block_dict[0x8e000000])
+    # The simulation which took the snapshot also copies before writing.
+    revelation.memory.write(0x8e000000, 4, 0x44444444)
+    assert 0x22222222 == child.memory.read(0x8e000000, 4)
+
+
+@pytest.mark.parametrize('elf_file,cols,warm_up',
+    [('c/fib_print.elf',                   1, 1000),
+     ('multicore/manual_message_pass.elf', 2, 3001),
+    ])
+def test_simulations_continue_from_snapshot(elf_file, cols, warm_up, capfd):
+    expected, expected_code, expected_ticks = run_elf(elf_file, cols)
+    expected_out, _ = capfd.readouterr()
+    elf_filename = os.path.join(test_dir, elf_file)
+    revelation = Revelation()
+    revelation.cols = cols
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+    revelation.max_insts = 100000
+    _, ticks = revelation.run_cores(revelation.get_scheduler(), warm_up)
+    assert ticks == warm_up
+    snapshot = revelation.take_snapshot(ticks)
+    children = []
+    for _ in range(2):
+        child = Revelation()
+        child.restore_snapshot(snapshot, is_test=True)
+        child.max_insts = 100000
+        children.append(child)
+    capfd.readouterr()
+    for simulation in children + [revelation]:
+        exit_code, ticks = simulation.run()
+        if simulation is revelation:
+            ticks += warm_up
+        assert (exit_code, ticks) == (expected_code, expected_ticks)
+        out, err = capfd.readouterr()
+        assert err == ''
+        assert expected_out.endswith(out)
+        for coreid in expected.states:
+            assert (simulation.states[coreid].num_insts ==
+                    expected.states[coreid].num_insts)
+            assert not simulation.states[coreid].running
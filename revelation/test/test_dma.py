@@ -0,0 +1,157 @@
+from revelation.dma import (CHAINMODE, DMAEN, IRQEN, MASTER,
+                            MAX_CHAIN_DESCRIPTORS, STARTUP)
+from revelation.registers import reg_map
+from revelation.test.machine import new_state
+
+import pytest
+
+WORD = 2 << 5  # DATASIZE of 4 bytes.
+
+
+def write_words(state, address, words):
+    for index in range(len(words)):
+        state.mem.write(address + 4 * index, 4, words[index])
+
+
+def read_words(state, address, num_words):
+    return [state.mem.read(address + 4 * index, 4) for index in range(num_words)]
+
+
+def test_master_transfer_from_registers():
+    state = new_state()
+    write_words(state, 0x2000, [1, 2, 3, 4])
+    state.rf[reg_map['DMA0STRIDE']] = 0x00040004
+    state.rf[reg_map['DMA0COUNT']] = 0x00010004
+    state.rf[reg_map['DMA0SRCADDR']] = 0x2000
+    state.rf[reg_map['DMA0DSTADDR']] = 0x8f000000  # External RAM.
+    state.mem.write(0xf0500, 4, DMAEN | MASTER | WORD)  # DMA0CONFIG
+    assert [1, 2, 3, 4] == read_words(state, 0x8f000000, 4)
+    assert 0 == state.rf[reg_map['DMA0STATUS']] & 0xf
+    assert 0 == state.rf[reg_map['DMA0COUNT']]
+    assert 0x2010 == state.rf[reg_map['DMA0SRCADDR']]
+    assert 0 == state.rf[reg_map['ILAT']]
+
+
+@pytest.mark.parametrize('datasize,expected',
+                         [(0, [0x04030201, 0x08070605]),
+                          (3, [0x04030201, 0x08070605])])
+def test_descriptor_transfer(datasize, expected):
+    state = new_state()
+    write_words(state, 0x2000, [0x04030201, 0x08070605])
+    size = 1 << datasize
+    write_words(state, 0x100, [DMAEN | MASTER | IRQEN | (datasize << 5),
+                               (size << 16) | size,
+                               0x00010000 | (8 / size),
+                               (size << 16) | size,
+                               0x2000,
+                               0x3000])
+    state.rf[reg_map['DMA1CONFIG']] = (0x100 << 16) | STARTUP | DMAEN
+    assert expected == read_words(state, 0x3000, 2)
+    assert 0x80 == state.rf[reg_map['ILAT']]  # DMA1 interrupt.
+    assert state.interrupt_pending
+
+
+def test_two_dimensional_transfer():
+    state = new_state()
+    # Copy the first column of a 4x4 matrix of words into a row.
+    write_words(state, 0x2000, range(16))
+    write_words(state, 0x100, [DMAEN | MASTER | WORD,
+                               (4 << 16) | 16,        # Down a column.
+                               0x00020002,            # 2 rows of 2 words.
+                               (4 << 16) | 16,
+                               0x2000,
+                               0x3000])
+    state.rf[reg_map['DMA0CONFIG']] = (0x100 << 16) | STARTUP | DMAEN
+    assert [0, 4, 8, 12] == read_words(state, 0x3000, 4)
+
+
+def test_negative_strides():
+    state = new_state()
+    write_words(state, 0x2000, [1, 2, 3])
+    state.rf[reg_map['DMA0STRIDE']] = 0xfffc0004  # Reverse the words.
+    state.rf[reg_map['DMA0COUNT']] = 0x00010003
+    state.rf[reg_map['DMA0SRCADDR']] = 0x2000
+    state.rf[reg_map['DMA0DSTADDR']] = 0x3008
+    state.rf[reg_map['DMA0CONFIG']] = DMAEN | MASTER | WORD
+    assert [3, 2, 1] == read_words(state, 0x3000, 3)
+
+
+def test_chained_descriptors():
+    state = new_state()
+    write_words(state, 0x2000, [5, 6])
+    write_words(state, 0x100, [DMAEN | MASTER | WORD | CHAINMODE | (0x200 << 16),
+                               0x00040004, 0x00010001, 0x00040004,
+                               0x2000, 0x3000])
+    write_words(state, 0x200, [DMAEN | MASTER | WORD | IRQEN,
+                               0x00040004, 0x00010001, 0x00040004,
+                               0x2004, 0x3004])
+    state.rf[reg_map['DMA0CONFIG']] = (0x100 << 16) | STARTUP | DMAEN
+    assert [5, 6] == read_words(state, 0x3000, 2)
+    assert 0x40 == state.rf[reg_map['ILAT']]
+    assert 0x200 << 16 == state.rf[reg_map['DMA0STATUS']]
+
+
+def test_cyclic_chain_pauses():
+    state = new_state()
+    write_words(state, 0x2000, [7])
+    write_words(state, 0x100, [DMAEN | MASTER | WORD | CHAINMODE | (0x100 << 16),
+                               0x00040004, 0x00010001, 0x00040004,
+                               0x2000, 0x3000])
+    state.interrupt_pending = False
+    state.rf[reg_map['DMA0CONFIG']] = (0x100 << 16) | STARTUP | DMAEN
+    assert 7 == state.mem.read(0x3000, 4)
+    assert state.dma_pending and state.interrupt_pending
+    assert state.dma[0].paused
+    assert 1 == state.rf[reg_map['DMA0STATUS']] & 0xf
+    # Break the loop: the next descriptor loaded does not chain.
+    write_words(state, 0x100, [DMAEN | MASTER | WORD])
+    write_words(state, 0x110, [0x2000, 0x3004])
+    state.resume_dma()
+    assert not state.dma_pending and not state.dma[0].paused
+    assert 0 == state.rf[reg_map['DMA0STATUS']] & 0xf
+
+
+def test_long_chain_runs_with_the_program():
+    state = new_state()
+    for index in range(MAX_CHAIN_DESCRIPTORS + 1):
+        config = DMAEN | MASTER | WORD
+        if index < MAX_CHAIN_DESCRIPTORS:
+            config |= CHAINMODE | ((0x100 + 0x20 * (index + 1)) << 16)
+        write_words(state, 0x100 + 0x20 * index,
+                    [config, 0x00040004, 0x00010001, 0x00040004,
+                     0x2000, 0x3000 + 4 * index])
+    write_words(state, 0x2000, [9])
+    state.rf[reg_map['DMA1CONFIG']] = (0x100 << 16) | STARTUP | DMAEN
+    assert 0 == state.mem.read(0x3000 + 4 * MAX_CHAIN_DESCRIPTORS, 4)
+    state.resume_dma()
+    assert 9 == state.mem.read(0x3000 + 4 * MAX_CHAIN_DESCRIPTORS, 4)
+    assert 0 == state.rf[reg_map['DMA1STATUS']] & 0xf
+
+
+def test_slave_transfer():
+    state = new_state()
+    state.rf[reg_map['DMA0STRIDE']] = 0x00040000
+    state.rf[reg_map['DMA0COUNT']] = 0x00010002
+    state.rf[reg_map['DMA0DSTADDR']] = 0x3000
+    state.rf[reg_map['DMA0CONFIG']] = DMAEN | IRQEN | WORD
+    assert 1 == state.rf[reg_map['DMA0STATUS']] & 0xf
+    state.mem.write(0x808f0514, 4, 0x11, from_core=0x809)  # DMA0AUTO0
+    assert 1 == state.rf[reg_map['DMA0STATUS']] & 0xf
+    assert 0 == state.rf[reg_map['ILAT']]
+    state.mem.write(0x808f0514, 4, 0x22, from_core=0x809)
+    assert [0x11, 0x22] == read_words(state, 0x3000, 2)
+    assert 0 == state.rf[reg_map['DMA0STATUS']] & 0xf
+    assert 0x40 == state.rf[reg_map['ILAT']]
+    state.mem.write(0x808f0514, 4, 0x33, from_core=0x809)  # Ignored.
+    assert 0 == state.mem.read(0x3008, 4)
+
+
+def test_disabled_channel_does_nothing():
+    state = new_state()
+    write_words(state, 0x2000, [1])
+    state.rf[reg_map['DMA0COUNT']] = 0x00010001
+    state.rf[reg_map['DMA0SRCADDR']] = 0x2000
+    state.rf[reg_map['DMA0DSTADDR']] = 0x3000
+    state.rf[reg_map['DMA0CONFIG']] = MASTER | WORD
+    assert 0 == state.mem.read(0x3000, 4)
+    assert 0x00010001 == state.rf[reg_map['DMA0COUNT']]
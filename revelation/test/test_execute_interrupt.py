@@ -1,8 +1,11 @@
 from revelation.instruction import Instruction
 from revelation.isa import decode
-from revelation.machine import RESET_ADDR
+from revelation.machine import RESET_ADDR, State
+from revelation.sim import new_memory
 from revelation.test.machine import StateChecker, new_state
 
+from pydgin.debug import Debug
+
 from pydgin.misc import FatalError, NotImplementedInstError
 
 import opcode_factory
@@ -20,11 +23,13 @@ def test_execute_gid16():
 
 def test_execute_gie16():
     state = new_state(rfSTATUS=0b10)
+    state.interrupt_pending = False
     instr = opcode_factory.gie16()
     name, executefn = decode(instr)
     executefn(state, Instruction(instr, None))
     expected_state = StateChecker(GID=False)
     expected_state.check(state)
+    assert state.interrupt_pending
 
 
 def test_execute_nop16():
@@ -73,11 +78,13 @@ def test_execute_rti16_with_interrupt():
 
 def test_execute_swi16():
     state = new_state(rfSTATUS=0b0, rfILAT=0b0, pc=0)
+    state.interrupt_pending = False
     instr = opcode_factory.swi16()
     name, executefn = decode(instr)
     executefn(state, Instruction(instr, None))
     expected_state = StateChecker(rfILAT=0b10, EXCAUSE=0b0001)
     expected_state.check(state)
+    assert state.interrupt_pending
 
 
 def test_execute_trap16_exit():
@@ -106,6 +113,22 @@ def test_execute_trap16_assert_failure():
     expected_state.check(state)
 
 
+def test_execute_trap16_syscall_accesses_are_made_by_the_core(capfd):
+    memory = new_memory(None)
+    memory.timing = True
+    state = State(memory, Debug(), coreid=0x809)
+    for index, char in enumerate('Hi\n'):
+        memory.write(0x2000 + index, 1, ord(char), from_core=0x809)
+    state.rf[0], state.rf[1], state.rf[2], state.rf[3] = 1, 0x2000, 3, 5
+    instr = opcode_factory.trap16(trap=7)  # write(1, 0x2000, 3).
+    name, executefn = decode(instr)
+    executefn(state, Instruction(instr, None))
+    out, _ = capfd.readouterr()
+    assert 'Hi\n' == out
+    assert 0 == memory.stall_cycles  # Local reads by core 0x809.
+    assert 0x808 == memory.current_core
+
+
 def test_execute_trap_warning():
     state = new_state()
     instr = opcode_factory.trap16(trap=0b11111)
@@ -118,6 +141,16 @@ def test_execute_trap_warning():
     assert expected_text == exninfo.value.msg
 
 
+def test_execute_trap_warning_restores_current_core():
+    memory = new_memory(None)
+    state = State(memory, Debug(), coreid=0x809)
+    instr = opcode_factory.trap16(trap=0b11111)
+    name, executefn = decode(instr)
+    with pytest.raises(FatalError):
+        executefn(state, Instruction(instr, None))
+    assert 0x808 == memory.current_core
+
+
 @pytest.mark.parametrize('name,instr', [('mbkpt16',  opcode_factory.mbkpt16()),
                                         ('sync16',   opcode_factory.sync16()),
                                         ('wand16',   opcode_factory.wand16()),
@@ -50,3 +50,39 @@ def test_log_never_appends():
         log_contents = fd.read()
     assert os.path.isfile(filename)
     assert log_contents == 'Hello, World!\nGoodbye tests.\n'
+
+@pytest.mark.usefixtures("cleandir")
+def test_log_is_buffered():
+    filename = _new_log_filename(3)
+    logger = Logger(filename, flush_bytes=10)
+    logger.log('Hello, ')
+    assert os.path.getsize(filename) == 0
+    logger.log('World!\n')
+    assert os.path.getsize(filename) == 14
+    logger.log('Goodbye.\n')
+    logger.flush()
+    assert os.path.getsize(filename) == 23
+    logger.close()
+
+@pytest.mark.usefixtures("cleandir")
+def test_log_flushes_only_at_exit():
+    filename = _new_log_filename(4)
+    logger = Logger(filename, flush_bytes=0)
+    for _ in range(1000):
+        logger.log('Hello, World!\n')
+    assert os.path.getsize(filename) == 0
+    logger.close()
+    assert os.path.getsize(filename) == 14000
+
+@pytest.mark.usefixtures("cleandir")
+def test_log_ring_keeps_last_instructions():
+    filename = _new_log_filename(5)
+    logger = Logger(filename, ring_size=2)
+    for num_insts in range(5):
+        logger.log_instruction(0x100 + num_insts * 2, 0, 'nop16', num_insts)
+        logger.log_end_instruction()
+    logger.log_instruction(0x10a, 0, 'nop16', 5)  # Aborted.
+    logger.close()
+    with open(filename, 'r') as fd:
+        lines = fd.read().split('\n')
+    assert [line.split()[0] for line in lines] == ['106', '108', '10a']
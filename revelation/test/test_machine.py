@@ -1,6 +1,8 @@
+from revelation.registers import reg_map
 from revelation.test.machine import StateChecker, new_state
 from revelation.utils import float2bits
 
+import opcode_factory
 import pytest
 
 def test_check_memory():
@@ -46,3 +48,94 @@ def test_flags_differ():
         expected.check(got)
     with pytest.raises(ValueError):
         expected.fp_check(got)
+
+
+def test_status_is_built_from_flags():
+    state = new_state(AZ=1, AC=1, BN=1, EXCAUSE=0b0011, rfSTATUS=0)
+    assert 0 == state.rf[reg_map['STATUS']]
+    state.AZ = True
+    state.AC = True
+    state.BN = True
+    state.EXCAUSE = 0b0011
+    expected = (1 << 4) | (1 << 6) | (1 << 9) | (0b0011 << 16)
+    assert expected == state.rf[reg_map['STATUS']]
+    assert expected == state.mem.read(0xf0404, 4)
+
+
+def test_status_write_updates_flags():
+    state = new_state()
+    state.rf[reg_map['STATUS']] = (1 << 5) | (1 << 11) | (1 << 13) | (0xf << 16)
+    assert state.AN and state.BIS
+    assert not state.AZ and not state.ACTIVE
+    assert 0xf == state.EXCAUSE
+    # Bits which are not flags are kept in the register file.
+    assert state.rf[reg_map['STATUS']] & (1 << 11)
+    state.mem.write(0xf0404, 4, 0b101)
+    assert state.ACTIVE and state.SUPERUSER and not state.AN
+
+
+def test_fstatus_sets_flags():
+    state = new_state(rfSTATUS=0b101)
+    state.rf[reg_map['FSTATUS']] = 0xffffffff
+    expected_state = StateChecker(AZ=1, AN=1, BVS=1, GID=0, rfSTATUS=0xfffffffd,
+                                  rfFSTATUS=0xffffffff)
+    expected_state.check(state)
+
+
+def test_config_is_built_from_fields():
+    state = new_state()
+    state.rf[reg_map['CONFIG']] = (1 << 1) | (0b0101 << 4) | (0b100 << 17)
+    assert state.IEN and not state.OEN
+    assert 0b0101 == state.CTIMER0CONFIG
+    assert state.FPU_MODES['SIGNED INTEGER'] == state.ARITHMODE
+    state.ARITHMODE = state.FPU_MODES['FLOATING POINT']
+    state.UEN = True
+    assert ((1 << 1) | (1 << 3) | (0b0101 << 4) ==
+            state.mem.read(0xf0400, 4))
+
+
+def test_decode_cache_holds_code_blocks_only():
+    state = new_state()
+    state.mem.write(0x0, 2, opcode_factory.nop16())
+    state.mem.write(0x20, 2, opcode_factory.nop16())
+    state.mem.add_code_block(0x80800000, 0x80800010)
+    instruction = state.fetch_instruction(0x0)
+    assert 'nop16' == instruction.name
+    assert instruction is state.fetch_instruction(0x0)
+    assert state.fetch_instruction(0x20) is not state.fetch_instruction(0x20)
+
+
+def test_decode_cache_invalidated_by_self_modifying_code(capfd):
+    state = new_state()
+    state.mem.write(0x4, 2, opcode_factory.nop16())
+    state.mem.add_code_block(0x80800000, 0x80800010)
+    assert 'nop16' == state.fetch_instruction(0x4).name
+    state.mem.write(0x4, 2, opcode_factory.gid16())
+    out, _ = capfd.readouterr()
+    assert 'WARNING: self-modifying code @ 80800004' in out
+    assert 'gid16' == state.fetch_instruction(0x4).name
+    # A write which overlaps the upper half of a cached instruction.
+    state.mem.write(0x6, 2, opcode_factory.nop16())
+    assert 0x4 not in state.decode_cache
+
+
+@pytest.mark.parametrize('register,value',
+                         [('ILATST', 0x2), ('IMASK', 0x0), ('IPEND', 0x0),
+                          ('DEBUGSTATUS', 0x0), ('STATUS', 0x0)])
+def test_interrupt_pending_set_by_register_write(register, value):
+    state = new_state()
+    state.interrupt_pending = False
+    state.rf[0] = 1
+    state.rf[reg_map['LC']] = 1
+    assert not state.interrupt_pending
+    state.rf[reg_map[register]] = value
+    assert state.interrupt_pending
+
+
+def test_interrupt_pending_set_by_remote_write():
+    state = new_state()
+    state.interrupt_pending = False
+    address = (0x808 << 20) | 0xf042c  # ILATST of core 0x808.
+    state.mem.write(address, 4, 0x20, from_core=0x809)
+    assert state.interrupt_pending
+    assert state.rf[reg_map['ILAT']] == 0x20
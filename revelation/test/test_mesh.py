@@ -0,0 +1,151 @@
+from pydgin.debug import Debug
+
+from revelation.instruction import Instruction
+from revelation.isa import decode
+from revelation.machine import State
+from revelation.mesh import CMESH, RMESH, Mesh
+from revelation.sim import Revelation, new_memory
+
+import opcode_factory
+
+import os.path
+import pytest
+
+test_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                        'revelation', 'test')
+elf_dir = os.path.join(test_dir, 'multicore')
+
+
+def new_mesh(coreids=(0x808, 0x809, 0x848, 0x849)):
+    memory = new_memory(None)
+    states = {}
+    for coreid in coreids:
+        states[coreid] = State(memory, Debug(), coreid=coreid)
+    memory.mesh = Mesh(states)
+    return memory, states
+
+
+def test_grid_is_found_from_coreids():
+    memory, _ = new_mesh()
+    assert (32, 8, 2, 2) == (memory.mesh.first_row, memory.mesh.first_col,
+                             memory.mesh.rows, memory.mesh.cols)
+
+
+@pytest.mark.parametrize('from_coreid,to_coreid,hops',
+                         [(0x808, 0x808, 0),
+                          (0x808, 0x809, 1),
+                          (0x808, 0x849, 2),
+                          (0x849, 0x808, 2),
+                          (0x808, 0x8e0, 27),  # Mostly off the chip.
+                         ])
+def test_route_without_contention(from_coreid, to_coreid, hops):
+    memory, _ = new_mesh()
+    assert 100 + hops == memory.mesh.route(CMESH, from_coreid, to_coreid, 100)
+
+
+def test_xy_routing_uses_row_then_column():
+    memory, _ = new_mesh()
+    memory.mesh.route(CMESH, 0x808, 0x849, 0)
+    busy = memory.mesh.busy_cycles
+    assert 1 == busy[memory.mesh._link(CMESH, 32, 8, 0)]  # 0x808 east.
+    assert 1 == busy[memory.mesh._link(CMESH, 32, 9, 3)]  # 0x809 south.
+    assert 2 == sum(busy)
+
+
+def test_contention_delays_transactions():
+    memory, _ = new_mesh()
+    assert 1 == memory.mesh.route(RMESH, 0x808, 0x809, 0)
+    assert 9 == memory.mesh.route(RMESH, 0x808, 0x809, 0)  # Waits 8 cycles.
+    assert 17 == memory.mesh.route(RMESH, 0x808, 0x809, 0)
+    link = memory.mesh._link(RMESH, 32, 8, 0)
+    assert 24 == memory.mesh.wait_cycles[link]
+    assert 1 == memory.mesh.route(CMESH, 0x808, 0x809, 0)  # Another mesh.
+
+
+def test_clock_skew_is_not_contention():
+    memory, _ = new_mesh()
+    memory.mesh.route(RMESH, 0x808, 0x809, 100000)
+    assert 1 == memory.mesh.route(RMESH, 0x808, 0x809, 0)
+
+
+def test_remote_write_arrives_later():
+    memory, states = new_mesh()
+    states[0x808].timing.cycles = 10
+    memory.write(0x80900100, 4, 0xcafe, from_core=0x808)
+    memory.write(0x80800100, 4, 0xbeef, from_core=0x808)  # Own memory.
+    assert 0xbeef == memory.read(0x100, 4, from_core=0x808)
+    assert 0 == memory.read(0x100, 4, from_core=0x809)
+    memory.mesh.deliver(memory, 10)
+    assert 0 == memory.read(0x100, 4, from_core=0x809)
+    memory.mesh.deliver(memory, 11)
+    assert 0xcafe == memory.read(0x100, 4, from_core=0x809)
+
+
+def test_external_write_is_made_at_once():
+    memory, _ = new_mesh()
+    memory.write(0x8e000000, 4, 0xcafe, from_core=0x808)
+    assert [] == memory.mesh.in_flight
+    assert 0xcafe == memory.read(0x8e000000, 4, from_core=0x809)
+    assert 0 < sum(memory.mesh.busy_cycles)
+
+
+def test_core_reads_back_its_own_writes():
+    memory, _ = new_mesh()
+    memory.write(0x80900100, 4, 1, from_core=0x849)
+    memory.write(0x80900100, 4, 2, from_core=0x808)
+    memory.write(0x80900200, 4, 3, from_core=0x808)
+    assert 0 == memory.read(0x100, 4, from_core=0x809)
+    assert 2 == memory.read(0x80900100, 4, from_core=0x808)
+    assert [0x80900200] == [write[3] for write in memory.mesh.in_flight]
+
+
+def test_testset_is_made_at_once():
+    memory, states = new_mesh()
+    state = states[0x808]
+    state.rf[0], state.rf[1], state.rf[2] = 0xffff, 0x80900000, 0x100
+    instr = opcode_factory.testset32(rd=0, rn=1, rm=2, sub=0, bb=0b10)
+    name, executefn = decode(instr)
+    executefn(state, Instruction(instr, None))
+    assert 0 == state.rf[0]
+    assert [] == memory.mesh.in_flight
+    assert 0xffff == memory.read(0x100, 4, from_core=0x809)
+
+
+@pytest.mark.parametrize('elf_file', ['c/hello.elf', 'c/fib_print.elf',
+                                      'c/interrupt_nested.elf'])
+def test_mesh_matches_timing_on_one_core(elf_file, capfd):
+    elf_filename = os.path.join(test_dir, elf_file)
+    results = []
+    for option in ['--timing', '--mesh']:
+        revelation = Revelation()
+        revelation.get_entry_point()(('sim.py', option, elf_filename))
+        out, _ = capfd.readouterr()
+        results.append((revelation.states[0x808].num_insts,
+                        out[:out.index('Total ticks')]))
+    assert results[0] == results[1]
+
+
+def test_flush_keeps_order_of_writes():
+    memory, _ = new_mesh()
+    memory.write(0x84900100, 4, 1, from_core=0x808)
+    memory.write(0x84900100, 4, 2, from_core=0x808)
+    memory.mesh.flush(memory)
+    assert 2 == memory.read(0x84900100, 4)
+    assert [] == memory.mesh.in_flight
+
+
+def test_message_pass_with_mesh(capfd):
+    elf_filename = os.path.join(elf_dir, 'manual_message_pass.elf')
+    revelation = Revelation()
+    retval = revelation.get_entry_point()(('sim.py', '--mesh', '-c', '2',
+                                           '--max-insts', '100000',
+                                           elf_filename))
+    assert 0 == retval
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Received message.\n' in out
+    assert 'Estimated cycles (slowest core): ' in out
+    assert 'cMesh utilization' in out
+    assert 'Busiest mesh links:\n' in out
+    mesh = revelation.memory.mesh
+    assert 0 < mesh.busy_cycles[mesh._link(CMESH, 32, 9, 1)]  # 0x809 west.
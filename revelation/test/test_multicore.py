@@ -1,4 +1,4 @@
-from revelation.sim import Revelation
+from revelation.sim import EXIT_GENERAL_ERROR, Revelation
 
 import os.path
 import pytest
@@ -37,3 +37,104 @@ def test_two_cores_with_output(elf_file, expected, capfd):
                           'Loading program %s on to core 0x809 (32, 09)\n'
                            % (elf_filename, elf_filename)) + expected)
         assert out.startswith(expected_full)
+
+
+@pytest.mark.parametrize('elf_file,expected',
+[('manual_message_pass.elf', 'Received message.\n'),
+ ('wake_on_interrupt.elf',   'Core 0x808 woken by interrupt.\n'),
+ ])
+@pytest.mark.parametrize('switch_interval', [7, 100])
+def test_two_cores_switch_interval(elf_file, expected, switch_interval, capfd):
+    elf_filename = os.path.join(elf_dir, elf_file)
+    revelation = Revelation()
+    revelation.cols = 2
+    revelation.switch_interval = switch_interval
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+        revelation.max_insts = 100000
+        revelation.run()
+        assert not revelation.states[0x808].running
+        assert not revelation.states[0x809].running
+        out, err = capfd.readouterr()
+        assert err == ''
+        assert expected in out
+
+
+@pytest.mark.parametrize('elf_file,expected',
+[('manual_message_pass.elf', 'Received message.\n'),
+ ('wake_on_interrupt.elf',   'Core 0x808 woken by interrupt.\n'),
+ ])
+def test_two_cores_two_workers(elf_file, expected, capfd):
+    elf_filename = os.path.join(elf_dir, elf_file)
+    revelation = Revelation()
+    revelation.cols = 2
+    revelation.num_workers = 2
+    revelation.worker_quantum = 500
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+        revelation.max_insts = 100000
+        revelation.run()
+        assert not revelation.states[0x808].running
+        assert not revelation.states[0x809].running
+        assert revelation.states[0x808].num_insts > 0
+        assert revelation.states[0x809].num_insts > 0
+        out, err = capfd.readouterr()
+        assert err == ''
+        assert expected in out
+
+
+def test_two_workers_are_reproducible(capfd):
+    elf_filename = os.path.join(elf_dir, 'manual_message_pass.elf')
+    results = []
+    for _ in range(2):
+        revelation = Revelation()
+        revelation.cols = 2
+        revelation.num_workers = 2
+        revelation.worker_quantum = 100
+        with open(elf_filename, 'rb') as elf:
+            revelation.init_state(elf, elf_filename, False, is_test=True)
+            revelation.max_insts = 100000
+            exit_code, ticks = revelation.run()
+            results.append((exit_code, ticks,
+                            revelation.states[0x808].num_insts,
+                            revelation.states[0x809].num_insts))
+        out, _ = capfd.readouterr()
+        assert 'Received message.\n' in out
+    assert results[0] == results[1]
+
+
+def test_two_workers_share_mapped_external_memory(tmpdir, capfd):
+    elf_filename = os.path.join(elf_dir, 'manual_message_pass.elf')
+    revelation = Revelation()
+    revelation.cols = 2
+    revelation.num_workers = 2
+    revelation.worker_quantum = 500
+    revelation.ext_file = os.path.join(str(tmpdir), 'ext.ram')
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+        revelation.max_insts = 100000
+        revelation.run()
+        assert not revelation.states[0x808].running
+        assert not revelation.states[0x809].running
+        out, err = capfd.readouterr()
+        assert err == ''
+        assert 'Received message.\n' in out
+
+
+def test_failed_worker(capfd):
+    elf_filename = os.path.join(elf_dir, 'manual_message_pass.elf')
+    revelation = Revelation()
+    revelation.cols = 2
+    revelation.num_workers = 2
+
+    def run_cores(scheduler, max_ticks):
+        raise ValueError('Worker broke')
+    revelation.run_cores = run_cores
+    with open(elf_filename, 'rb') as elf:
+        revelation.init_state(elf, elf_filename, False, is_test=True)
+        exit_code, _ = revelation.run()
+    out, err = capfd.readouterr()
+    assert EXIT_GENERAL_ERROR == exit_code
+    assert 'A worker process exited unexpectedly, aborting!' in out
+    assert 'Worker 0 failed:' in err
+    assert 'ValueError: Worker broke' in err
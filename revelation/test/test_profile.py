@@ -0,0 +1,122 @@
+from revelation.profile import (MAX_CALL_DEPTH, CallStack, CodeRange, Profile,
+                                Sampler, SymbolTable, _hottest)
+from revelation.sim import SAMPLES_FILENAME, Revelation
+from revelation.test.machine import new_state
+
+import os.path
+
+elf_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                       'revelation', 'test', 'c')
+
+
+def new_symbol_table():
+    ranges = [CodeRange('.text', 0x100, 0x40),
+              CodeRange('NEW_LIB_RO', 0x8e000000, 0x20)]
+    symbols = {'main': 0x110, 'helper': 0x130, 'alias': 0x130,
+               'memcpy': 0x8e000008, '_memcpy': 0x8e000008, 'data': 0x200,
+               'crt0.c': 0}
+    return ranges, SymbolTable(symbols, ranges)
+
+
+def test_symbol_table():
+    _, symbols = new_symbol_table()
+    assert ['.text', 'main', 'alias', 'NEW_LIB_RO', 'memcpy'] == symbols.names
+    assert -1 == symbols.find(0xfe)
+    assert 0 == symbols.find(0x100)
+    assert 1 == symbols.find(0x12e)
+    assert 'main+0x4' == symbols.describe(0x114)
+    assert 'alias' == symbols.describe(0x130)
+    assert 'NEW_LIB_RO+0x2' == symbols.describe(0x8e000002)
+    assert '0x00000010' == symbols.describe(0x10)
+    assert 'main' == symbols.function_name(0x114)
+    assert '0x00000140' == symbols.function_name(0x140)
+
+
+def test_count_and_attribute_to_functions():
+    ranges, symbols = new_symbol_table()
+    profile = Profile(ranges, symbols)
+    for pc in [0x110, 0x112, 0x112, 0x13e, 0x8e00001e, 0x0, 0x140]:
+        profile.count(pc)
+    assert [0] * 8 + [1, 2] + [0] * 21 + [1] == profile.counts[0]
+    assert 1 == profile.counts[1][15]
+    assert 2 == profile.other
+    assert 7 == profile.num_insts()
+    assert [0, 3, 1, 0, 1] == profile.function_totals()
+
+
+def test_hottest():
+    assert [2, 0, 3] == _hottest([5, 0, 9, 5, 1], 3)
+    assert [] == _hottest([0, 0], 3)
+
+
+def test_hot_spots_report(capfd):
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    entry_point(('sim.py', '--hot-spots', '3', '--blocks',
+                 os.path.join(elf_dir, 'fib_print.elf')))
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Hot spots on core 0x808 (32, 08), 2,949 instructions' in out
+    report = out[out.index('Hot spots'):].split('\n')
+    assert '    Functions:' == report[1]
+    assert report[3].endswith('%  main')
+    assert '    Basic blocks:' == report[5]
+    assert 'main+0x28 (11 instructions, 20 times)' in report[6]
+    assert '    Instructions:' == report[9]
+    assert report[10].endswith('%  ldstrdisp32')
+    profile = revelation.states[0x808].profile
+    assert profile.num_insts() == revelation.states[0x808].num_insts
+
+
+def test_call_stack():
+    stack = CallStack()
+    for pc in range(MAX_CALL_DEPTH + 2):
+        stack.push(pc)
+    assert (MAX_CALL_DEPTH, 2) == (stack.depth, stack.overflow)
+    for _ in range(3):
+        stack.pop()
+    assert (MAX_CALL_DEPTH - 1, 0) == (stack.depth, stack.overflow)
+    assert MAX_CALL_DEPTH - 2 == stack.calls[stack.depth - 1]
+    for _ in range(MAX_CALL_DEPTH):
+        stack.pop()
+    assert 0 == stack.depth
+
+
+def test_sampler_folds_stacks(tmpdir):
+    _, symbols = new_symbol_table()
+    sampler = Sampler(symbols, 100)
+    state = new_state()
+    state.call_stack = CallStack()
+    state.call_stack.push(0x112)
+    state.call_stack.push(0x8e00000a)
+    state.pc = 0x134
+    sampler.sample(state)
+    sampler.sample(state)
+    state.call_stack.pop()
+    sampler.sample(state)
+    filename = os.path.join(str(tmpdir), 'samples.folded')
+    sampler.write(filename)
+    with open(filename) as samples:
+        assert ('0x808;main;alias 1\n'
+                '0x808;main;memcpy;alias 2\n') == samples.read()
+
+
+def test_sample_from_command_line(tmpdir, capfd):
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        revelation = Revelation()
+        entry_point = revelation.get_entry_point()
+        entry_point(('sim.py', '--sample', '100',
+                     os.path.join(elf_dir, 'fib_print.elf')))
+        with open(SAMPLES_FILENAME) as samples:
+            lines = samples.read().split('\n')
+    finally:
+        os.chdir(cwd)
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Samples written to: %s.\n' % SAMPLES_FILENAME in out
+    assert '' == lines.pop()
+    assert 2949 / 100 == sum(int(line.split(' ')[1]) for line in lines)
+    assert any(';main;printf;_vfprintf_r ' in line for line in lines)
+    assert all(line.startswith('0x808;') for line in lines)
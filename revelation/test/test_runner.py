@@ -0,0 +1,50 @@
+from revelation.runner import run_many, run_one
+from revelation.sim import EXIT_FILE_ERROR, EXIT_SUCCESS
+
+import os.path
+import pytest
+
+elf_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                       'revelation', 'test', 'c')
+
+
+def test_run_one_captures_output(capfd):
+    elf_filename = os.path.join(elf_dir, 'hello.elf')
+    result = run_one([elf_filename])
+    assert EXIT_SUCCESS == result.exit_code
+    assert result.stdout.startswith(
+        'Loading program %s on to core 0x808 (32, 08)\nHello, world!\n' %
+        elf_filename)
+    assert '' == result.stderr
+    assert [0x808] == result.num_insts.keys()
+    out, err = capfd.readouterr()
+    assert '' == out
+    assert '' == err
+
+
+def test_run_one_missing_file():
+    result = run_one(['missing.elf'], index=3)
+    assert 3 == result.index
+    assert EXIT_FILE_ERROR == result.exit_code
+    assert 'Could not open file missing.elf\n' == result.stdout
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_run_many(processes, capfd):
+    runs = [[os.path.join(elf_dir, 'hello.elf')],
+            [os.path.join(elf_dir, 'fib_return.elf')],
+            ['-c', '2', os.path.join(elf_dir, 'fib_print.elf')],
+            ['missing.elf']]
+    results = list(run_many(runs, processes))
+    assert [0, 1, 2, 3] == sorted(result.index for result in results)
+    results.sort(key=lambda result: result.index)
+    assert [EXIT_SUCCESS, EXIT_SUCCESS, EXIT_SUCCESS, EXIT_FILE_ERROR] == \
+        [result.exit_code for result in results]
+    assert runs[2] == results[2].argv
+    assert 'Hello, world!\n' in results[0].stdout
+    assert 10946 == results[1].registers[0x808][0]
+    assert 2 == results[2].stdout.count('10946\n')
+    assert [0x808, 0x809] == sorted(results[2].num_insts.keys())
+    out, err = capfd.readouterr()
+    assert '' == out
+    assert '' == err
@@ -0,0 +1,45 @@
+from revelation.scheduler import Scheduler
+
+
+def test_round_robin():
+    scheduler = Scheduler([0x808, 0x809, 0x80a])
+    assert scheduler.current() == 0x808
+    assert scheduler.next_core() == 0x809
+    assert scheduler.next_core() == 0x80a
+    assert scheduler.next_core() == 0x808
+
+
+def test_wait_and_wake():
+    scheduler = Scheduler([0x808, 0x809, 0x80a])
+    assert scheduler.wait(0x808)
+    assert scheduler.current() == 0x809
+    assert scheduler.num_running() == 2
+    assert scheduler.next_core() == 0x80a
+    assert scheduler.next_core() == 0x809
+    scheduler.wake(0x808)
+    assert scheduler.num_running() == 3
+    assert scheduler.next_core() == 0x80a
+    assert scheduler.next_core() == 0x808
+
+
+def test_wake_running_core_is_ignored():
+    scheduler = Scheduler([0x808, 0x809])
+    scheduler.wake(0x809)
+    assert scheduler.num_running() == 2
+
+
+def test_last_core_does_not_wait():
+    scheduler = Scheduler([0x808, 0x809])
+    assert scheduler.wait(0x808)
+    assert not scheduler.wait(0x809)
+    assert scheduler.current() == 0x809
+
+
+def test_halt_moves_idle_core_to_run_queue():
+    scheduler = Scheduler([0x808, 0x809])
+    assert scheduler.wait(0x808)
+    scheduler.halt(0x809)
+    assert not scheduler.is_empty()
+    assert scheduler.current() == 0x808
+    scheduler.halt(0x808)
+    assert scheduler.is_empty()
@@ -142,3 +142,19 @@ def test_sim_all_16bit():
     assert EXIT_SUCCESS == exit_code
     assert len(instructions) == ticks
     assert not revelation.states[0x808].running
+
+
+def test_sim_swi16_interrupt_taken():
+    instructions = [(opcode_factory.swi16(), 16),   # Jumps to IVT[1] = 0x4.
+                    (opcode_factory.nop16(), 16),
+                    (opcode_factory.trap16(3), 16),
+                    ]
+    revelation = MockRevelation()
+    revelation.init_state(instructions)
+    exit_code, ticks = revelation.run()
+    expected_state = StateChecker(pc=(6 + RESET_ADDR), rfIRET=(2 + RESET_ADDR),
+                                  rfIPEND=0b10, GID=1)
+    expected_state.check(revelation.states[0x808])
+    assert EXIT_SUCCESS == exit_code
+    assert 2 == ticks
+    assert not revelation.states[0x808].interrupt_pending
@@ -0,0 +1,77 @@
+from revelation.instruction import Instruction
+from revelation.isa import decode, mnemonics
+from revelation.sim import Revelation
+from revelation.stats import EXTERNAL, LOCAL, REMOTE, Stats
+from revelation.storage import Memory
+
+import json
+import opcode_factory
+import os.path
+
+elf_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                       'revelation', 'test')
+
+
+def decoded(opcode):
+    name, executefn = decode(opcode)
+    return Instruction(opcode, name, executefn)
+
+
+def test_instruction_index():
+    instruction = decoded(opcode_factory.add16(rd=0, rn=1, rm=2))
+    assert 'add16' == mnemonics[instruction.index]
+    assert -1 == Instruction(0, None).index
+
+
+def test_count_branches():
+    stats = Stats(0x808, Memory())
+    beq16 = decoded(opcode_factory.bcond16(condition=0b0000, imm=4))
+    b32 = decoded(opcode_factory.bcond32(condition=0b1110, imm=4))
+    stats.count_instruction(beq16, 0x100, 0x108)
+    stats.count_instruction(beq16, 0x100, 0x102)
+    stats.count_instruction(beq16, 0x100, 0x100)
+    stats.count_instruction(b32, 0x100, 0x108)
+    assert (2, 1, 1) == (stats.taken, stats.not_taken, stats.unconditional)
+    assert 3 == stats.mnemonics[beq16.index]
+    assert 4 == stats.num_insts()
+
+
+def test_count_accesses():
+    memory = Memory()
+    memory.register_files[0x809] = None
+    stats = Stats(0x808, memory)
+    assert LOCAL == stats.address_class(0x100)
+    assert LOCAL == stats.address_class(0x80800100)
+    assert REMOTE == stats.address_class(0x80900100)
+    assert EXTERNAL == stats.address_class(0x8e000000)
+    stats.count_access(0, 0x100, 2)
+    stats.count_access(1, 0x80900100, 3)
+    assert 1 == stats.loads[LOCAL * 4 + 2]
+    assert 1 == stats.stores[REMOTE * 4 + 3]
+    assert 1 == sum(stats.loads) == sum(stats.stores)
+
+
+def test_stats_file(tmpdir, capfd):
+    filename = os.path.join(str(tmpdir), 'stats.json')
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    entry_point(('sim.py', '--stats', filename, '--cols', '2', '--blocks',
+                 os.path.join(elf_dir, 'multicore', 'manual_message_pass.elf')))
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Statistics written to: %s.\n' % filename in out
+    with open(filename) as stats_file:
+        stats = json.load(stats_file)
+    cores = stats['cores']
+    assert ['0x808', '0x809'] == [core['coreid'] for core in cores]
+    for core in cores:
+        state = revelation.states[int(core['coreid'], 16)]
+        assert state.num_insts == core['instructions']
+        assert state.num_insts == sum(core['mnemonics'].values())
+        assert state.num_insts == sum(core['encodings'].values())
+        branches = core['branches']
+        assert (core['mnemonics']['bcond16'] + core['mnemonics']['bcond32'] ==
+                branches['taken'] + branches['not_taken'] +
+                branches['unconditional'])
+    assert stats['ticks'] == sum(core['instructions'] for core in cores)
+    assert 2 == cores[1]['stores']['remote']['4']  # The message, and 0.
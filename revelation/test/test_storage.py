@@ -1,5 +1,16 @@
+from revelation.machine import State
+from revelation.registers import reg_map
+from revelation.sim import new_memory
+from revelation.storage import _BlockMemory, _write_handlers, set_write_handler
 from revelation.test.machine import StateChecker, new_state
 
+from pydgin.debug import Debug
+
+import mmap
+import os
+import pytest
+import struct
+
 
 def test_coreid_read_only():
     state = new_state(rfCOREID=0x808)
@@ -13,3 +24,198 @@ def test_coreid_read_only():
     state.mem.write(0x808f0704, 12, 0x100)
     expected_state = StateChecker(rfCOREID=0x100)
     expected_state.check(state)
+
+
+@pytest.mark.parametrize('num_bytes,value', [(1, 0xab),
+                                             (2, 0xabcd),
+                                             (4, 0xdeadbeef),
+                                             (8, 0x0123456789abcdef),
+                                             (3, 0xabcdef),
+                                             ])
+def test_block_memory_read_write(num_bytes, value):
+    block = _BlockMemory(size=32)
+    block.write(5, num_bytes, value)
+    assert value == block.read(5, num_bytes)
+    assert value == block.iread(5, num_bytes)
+    assert 0 == block.read(4, 1)
+    assert 0 == block.read(5 + num_bytes, 1)
+
+
+def test_block_memory_is_little_endian():
+    block = _BlockMemory(size=16)
+    block.write(0, 4, 0x11223344)
+    assert [0x44, 0x33, 0x22, 0x11] == [block.read(i, 1) for i in range(4)]
+    assert 0x3344 == block.read(0, 2)
+    block.write(8, 8, 0x8877665544332211)
+    assert 0x44332211 == block.read(8, 4)
+    assert 0x88776655 == block.read(12, 4)
+
+
+def test_block_memory_truncates_values():
+    block = _BlockMemory(size=8)
+    block.write(0, 1, 0x1ff)
+    block.write(2, 2, -1)
+    assert 0xff == block.read(0, 1)
+    assert 0xffff == block.read(2, 2)
+
+
+def test_register_window_is_redirected_to_register_file():
+    state = new_state(rf1=0xcafe)
+    assert 0xcafe == state.mem.read(0xf0004, 4, from_core=0x808)
+    assert 0xcafe == state.mem.read(0x808f0004, 4)
+    state.mem.write(0x808f0008, 4, 0xbeef)
+    assert 0xbeef == state.rf[2]
+    # Register writes never touch the underlying RAM.
+    assert 0 == state.mem.get_block_mem(0x80800000).read(0xf0004, 4)
+
+
+def test_register_window_of_remote_core():
+    memory = new_memory(None)
+    state0 = State(memory, Debug(), coreid=0x808)
+    state1 = State(memory, Debug(), coreid=0x809)
+    state1.rf[4] = 0x12345678
+    assert 0x12345678 == memory.read(0x809f0010, 4, from_core=0x808)
+    memory.write(0x809f042c, 4, 0x20, from_core=0x808)  # ILATST
+    assert 0x20 == state1.rf[reg_map['ILAT']]
+    assert 0 == state0.rf[reg_map['ILAT']]
+
+
+def test_register_window_mixed_widths():
+    state = new_state(rf0=0x11223344, rf1=0x55667788)
+    assert 0x5566778811223344 == state.mem.read(0xf0000, 8)
+    assert 0x2233 == state.mem.read(0xf0001, 2)
+    state.mem.write(0xf0002, 2, 0xabcd)
+    assert 0xabcd3344 == state.rf[0]
+    state.mem.write(0xf0008, 8, 0x9999999988888888)
+    assert 0x88888888 == state.rf[2]
+    assert 0x99999999 == state.rf[3]
+
+
+def test_register_aliases():
+    state = new_state(rfILAT=0b1)
+    state.rf[reg_map['ILATST']] = 0b110
+    assert 0b111 == state.rf[reg_map['ILAT']]
+    state.mem.write(0xf0430, 4, 0b011)  # ILATCL
+    assert 0b100 == state.rf[reg_map['ILAT']]
+    state.rf[reg_map['CTIMER0']] = 0
+    assert 0b1100 == state.rf[reg_map['ILAT']]
+
+
+def test_write_handler():
+    writes = []
+    def handler(rf, index, value):
+        writes.append((rf.coreid, index, value))
+        rf.regs[index] = value
+    old_handler = _write_handlers[reg_map['RESETCORE']]
+    set_write_handler('RESETCORE', handler)
+    try:
+        state = new_state()
+        state.mem.write(0xf070c, 4, 0xff)  # RESETCORE, 1 bit wide.
+    finally:
+        _write_handlers[reg_map['RESETCORE']] = old_handler
+    assert [(0x808, reg_map['RESETCORE'], 1)] == writes
+    assert 1 == state.rf[reg_map['RESETCORE']]
+
+
+def test_copy():
+    state = new_state()
+    for address in range(0x808ffff8, 0x80900008, 4):
+        state.mem.write(address, 4, address)
+    state.mem.copy(0x2000, 0x808ffff8, 16)  # Crosses a block boundary.
+    state.mem.copy(0xf0428, 0x2000, 4)  # ILAT
+    state.mem.copy(0x8f000000, 0x2004, 12)  # Local to external RAM.
+    assert 0x3f8 == state.rf[reg_map['ILAT']]  # 10 bits wide.
+    assert [0x808ffffc, 0x80900000, 0x80900004] == \
+        [state.mem.read(address, 4) for address in range(0x8f000000,
+                                                         0x8f00000c, 4)]
+
+
+def test_slow_copy_is_charged_to_the_copying_core():
+    memory = new_memory(None)
+    memory.timing = True
+    memory.copy(0x80a00000, 0x8e0ffffe, 4, from_core=0x80a)
+    expected = sum(memory.read_latency(address, 0x80a)
+                   for address in range(0x8e0ffffe, 0x8e100002))
+    assert expected == memory.stall_cycles
+    assert expected != sum(memory.read_latency(address, 0x808)
+                           for address in range(0x8e0ffffe, 0x8e100002))
+
+
+def test_unmapped_register_window_is_ram():
+    state = new_state()
+    state.mem.write(0xf0100, 4, 0xffff)
+    assert 0xffff == state.mem.read(0xf0100, 4)
+    assert 0xffff == state.mem.get_block_mem(0x80800000).read(0xf0100, 4)
+
+
+def test_external_memory_mapped_from_file(tmpdir):
+    filename = os.path.join(str(tmpdir), 'ext.ram')
+    memory = new_memory(None)
+    memory.map_external(0x8e000000, 2, filename)
+    assert os.path.getsize(filename) == 2 * 2**20
+    memory.write(0x8e100004, 4, 0xdeadbeef)
+    assert 0xdeadbeef == memory.read(0x8e100004, 4)
+    assert 0xbeef == memory.read(0x8e100004, 2)
+    with open(filename, 'r+b') as ext_file:
+        ext_ram = mmap.mmap(ext_file.fileno(), 0)
+        # Writes are seen by other processes straight away, and vice versa.
+        assert (0xdeadbeef,) == struct.unpack_from('<I', ext_ram, 0x100004)
+        struct.pack_into('<Q', ext_ram, 0x10, 0x0123456789abcdef)
+        assert 0x0123456789abcdef == memory.read(0x8e000010, 8)
+        ext_ram.close()
+    # Memory outside the mapping is unaffected.
+    memory.write(0x8e200000, 4, 0x12345678)
+    assert 0x12345678 == memory.read(0x8e200000, 4)
+
+
+def test_code_blocks_are_merged():
+    memory = new_memory(None)
+    memory.add_code_block(0x80900000, 0x80900100)
+    memory.add_code_block(0x80800000, 0x80800100)
+    memory.add_code_block(0x8e000000, 0x8e000800)
+    memory.add_code_block(0x8e000000, 0x8e000800)  # Loaded by each core.
+    memory.add_code_block(0x80800080, 0x80800200)
+    assert memory.code_ranges == [(0x80800000, 0x80800200),
+                                  (0x80900000, 0x80900100),
+                                  (0x8e000000, 0x8e000800)]
+    assert len(memory.code_blocks) == 5
+
+
+@pytest.mark.parametrize('address,num_bytes,expected',
+    [(0x80800000, 4, True),
+     (0x808001fc, 4, True),
+     (0x808001fe, 4, False),
+     (0x80800200, 2, False),
+     (0x807ffffe, 4, False),
+     (0x100,      4, True),   # Local address of core 0x808.
+     (0x80900100, 2, False),
+     (0x8e0007fe, 2, True),
+    ])
+def test_is_code_address(address, num_bytes, expected):
+    memory = new_memory(None)
+    memory.add_code_block(0x80800000, 0x80800200)
+    memory.add_code_block(0x80900000, 0x80900100)
+    memory.add_code_block(0x8e000000, 0x8e000800)
+    assert expected == memory.is_code_address(address, num_bytes,
+                                              from_core=0x808)
+
+
+@pytest.mark.parametrize('address,num_bytes,warning,invalidated',
+    [(0x80800010, 4, True,  True),
+     (0x808000fe, 4, False, True),   # Overlaps the end of the code block.
+     (0x8080000e, 4, False, True),   # Overlaps the start of the code block.
+     (0x80800100, 4, False, False),
+     (0x80800200, 8, False, False),
+     (0x80700000, 4, False, False),
+    ])
+def test_code_write_invalidates_decode_cache(address, num_bytes, warning,
+                                             invalidated, capfd):
+    memory = new_memory(None)
+    memory.add_code_block(0x80800010, 0x80800100)
+    cache = {0x10: True, 0x808000fc: True}
+    memory.decode_caches[0x808] = cache
+    memory.write(address, num_bytes, 0)
+    out, _ = capfd.readouterr()
+    assert out.startswith('WARNING: self-modifying code') == warning
+    assert (memory.code_version > 0) == invalidated
+    assert (0x10 in cache) == (address > 0x80800010 + 3 or not invalidated)
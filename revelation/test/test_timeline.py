@@ -0,0 +1,102 @@
+from revelation.machine import State
+from revelation.sim import Revelation
+from revelation.storage import Memory
+from revelation.timeline import Timeline
+
+import json
+import os.path
+import pytest
+
+elf_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                       'revelation', 'test', 'multicore')
+
+
+def new_timeline():
+    memory = Memory()
+    states = {}
+    for coreid in [0x808, 0x809]:
+        memory.register_files[coreid] = None
+        states[coreid] = State(memory, None, coreid=coreid)
+    return Timeline(states, memory), states
+
+
+def phases(events, coreid):
+    return [(event['ph'], event['name']) for event in events
+            if event.get('tid') == coreid and event['ph'] != 'M']
+
+
+def test_record_events():
+    timeline, states = new_timeline()
+    core0, core1 = states[0x808], states[0x809]
+    timeline.go_idle(core0)
+    timeline.go_idle(core0)  # IDLE again before the interrupt.
+    timeline.switch_to(core1)
+    core1.num_insts = 10
+    timeline.store(core1, 0x80800100)
+    timeline.store(core1, 0x100)          # Local.
+    timeline.store(core1, 0x8e000000)     # External RAM.
+    timeline.switch_to(core0)
+    timeline.interrupt(core0, 9)
+    core0.num_insts = 5
+    timeline.trap(core0, 3, 0)
+    timeline.return_from_interrupt(core0)
+    timeline.halt(core0)
+    timeline.switch_to(core1)
+    timeline.trap(core1, 7, 5)
+    events = json.loads(timeline.to_json())['traceEvents']
+    assert [('B', 'running'), ('B', 'idle'), ('f', 'remote store'),
+            ('E', ''), ('B', 'interrupt 9 (user)'), ('X', 'trap exit'),
+            ('E', ''), ('E', '')] == phases(events, 0x808)
+    assert [('B', 'running'), ('s', 'remote store'),
+            ('X', 'syscall write'), ('E', '')] == phases(events, 0x809)
+    flows = [event for event in events if event['ph'] in 'sf']
+    assert [10, 10] == [event['ts'] for event in flows]
+    assert flows[0]['id'] == flows[1]['id']
+    assert '0x80800100' == flows[0]['args']['address']
+
+
+def test_grow_buffers():
+    timeline, states = new_timeline()
+    size = len(timeline.kinds)
+    for _ in range(size + 1):
+        timeline.trap(states[0x808], 4, 0)
+    assert size + 1 == timeline.size
+    assert len(timeline.kinds) == len(timeline.extras) == 2 * size
+
+
+def test_timeline_file(tmpdir, capfd):
+    filename = os.path.join(str(tmpdir), 'timeline.json')
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    entry_point(('sim.py', '--timeline', filename, '--cols', '2',
+                 os.path.join(elf_dir, 'wake_on_interrupt.elf')))
+    out, err = capfd.readouterr()
+    assert err == ''
+    assert 'Core 0x808 woken by interrupt.\n' in out
+    assert 'Timeline written to: %s.\n' % filename in out
+    with open(filename) as timeline_file:
+        events = json.load(timeline_file)['traceEvents']
+    core0 = phases(events, 0x808)
+    assert ('B', 'idle') in core0
+    assert ('B', 'interrupt 9 (user)') in core0
+    assert ('X', 'trap exit') in core0
+    assert ('s', 'remote store') in phases(events, 0x809)
+    for coreid in [0x808, 0x809]:
+        slices = [phase for phase, _ in phases(events, coreid)]
+        assert slices.count('B') == slices.count('E')
+
+
+@pytest.mark.parametrize('option', ['--timing', '--blocks'])
+def test_time_is_ticks_of_every_core(option, tmpdir, capfd):
+    filename = os.path.join(str(tmpdir), 'timeline.json')
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    entry_point(('sim.py', option, '--timeline', filename, '--cols', '2',
+                 os.path.join(elf_dir, 'wake_on_interrupt.elf')))
+    capfd.readouterr()
+    timeline = revelation.states[0x808].timeline
+    ticks = sum([state.num_insts for state in timeline.states])
+    assert ticks == timeline.now()
+    times = timeline.times[:timeline.size]
+    assert times == sorted(times)
+    assert 0 < times[0] and times[-1] <= ticks
@@ -0,0 +1,122 @@
+from revelation.machine import State
+from revelation.registers import reg_map
+from revelation.sim import EXIT_SUCCESS, Revelation, new_memory
+from revelation.test.sim import MockRevelation
+
+from pydgin.debug import Debug
+
+import opcode_factory
+import pytest
+
+
+def run_with_timing(instructions, **args):
+    revelation = MockRevelation()
+    revelation.model_timing = True
+    revelation.init_state(instructions, **args)
+    exit_code, _ = revelation.run()
+    assert EXIT_SUCCESS == exit_code
+    return revelation.states[0x808]
+
+
+def test_one_cycle_per_instruction():
+    state = run_with_timing([(opcode_factory.add32_immediate(rd=1, rn=0, imm=1), 32),
+                             (opcode_factory.add32_immediate(rd=2, rn=1, imm=1), 32),
+                             (opcode_factory.add32_immediate(rd=3, rn=2, imm=1), 32),
+                             (opcode_factory.trap16(3), 16)])
+    assert 4 == state.timing.cycles
+
+
+@pytest.mark.parametrize('rn,expected', [(5, 2), (1, 6)])
+def test_dual_issue_and_fpu_latency(rn, expected):
+    # The add issues with the fadd, unless it has to wait for its result.
+    state = run_with_timing([(opcode_factory.fadd32(rd=1, rn=2, rm=3), 32),
+                             (opcode_factory.add32_immediate(rd=4, rn=rn, imm=0), 32),
+                             (opcode_factory.trap16(3), 16)])
+    assert expected == state.timing.cycles
+
+
+@pytest.mark.parametrize('rf0,expected', [(5, 6), (8, 4)])
+def test_taken_branch_penalty(rf0, expected):
+    instructions = [(opcode_factory.sub32_immediate(rd=1, rn=0, imm=0b00000000101), 32),
+                    (opcode_factory.bcond32(condition=0b0000, imm=0b000000000000000000000100), 32),
+                    (opcode_factory.add32_immediate(rd=1, rn=0, imm=0b01010101010), 32),
+                    (opcode_factory.trap16(3), 16),
+                    ]
+    state = run_with_timing(instructions, rf0=rf0)
+    assert expected == state.timing.cycles
+
+
+def test_ctimer_counts_clock_cycles():
+    revelation = MockRevelation()
+    revelation.model_timing = True
+    revelation.init_state([(opcode_factory.fadd32(rd=1, rn=2, rm=3), 32),
+                           (opcode_factory.add32_immediate(rd=4, rn=1, imm=0), 32),
+                           (opcode_factory.trap16(3), 16)],
+                          rfCTIMER0=100)
+    revelation.states[0x808].CTIMER0CONFIG = 0b0001  # CLK.
+    revelation.run()
+    assert 94 == revelation.states[0x808].rf[reg_map['CTIMER0']]
+
+
+def test_ctimer_expires():
+    revelation = MockRevelation()
+    revelation.model_timing = True
+    revelation.init_state([(opcode_factory.fadd32(rd=1, rn=2, rm=3), 32),
+                           (opcode_factory.add32_immediate(rd=4, rn=1, imm=0), 32),
+                           (opcode_factory.trap16(3), 16)],
+                          rfCTIMER0=2, rfIMASK=0x8)
+    revelation.states[0x808].CTIMER0CONFIG = 0b0001  # CLK.
+    revelation.run()
+    assert 0 == revelation.states[0x808].rf[reg_map['CTIMER0']]
+    assert 0x8 == revelation.states[0x808].rf[reg_map['ILAT']]
+
+
+def test_ctimer_does_not_count_clock_cycles_without_timing():
+    revelation = MockRevelation()
+    revelation.init_state([(opcode_factory.add32_immediate(rd=1, rn=0, imm=1), 32),
+                           (opcode_factory.trap16(3), 16)],
+                          rfCTIMER0=100)
+    revelation.states[0x808].CTIMER0CONFIG = 0b0001  # CLK.
+    revelation.run()
+    assert 100 == revelation.states[0x808].rf[reg_map['CTIMER0']]
+    assert 0 == revelation.states[0x808].timing.cycles
+
+
+@pytest.mark.parametrize('address,expected',
+                         [(0x80800100, 0),
+                          (0x80900100, 8 + 2),        # One hop east.
+                          (0x84900100, 8 + 2 * 2),    # South east.
+                          (0x8e000000, 100 + 2 * 27), # External RAM.
+                         ])
+def test_read_latency(address, expected):
+    memory = new_memory(None)
+    for coreid in [0x808, 0x809, 0x849]:
+        memory.register_files[coreid] = None
+    assert expected == memory.read_latency(address, 0x808)
+
+
+def test_idle_core_wakes_on_its_timer():
+    revelation = Revelation()
+    revelation.model_timing = True
+    revelation.memory = new_memory(None)
+    for coreid in [0x808, 0x809]:
+        revelation.states[coreid] = State(revelation.memory, Debug(),
+                                          coreid=coreid)
+    running, idle = revelation.states[0x808], revelation.states[0x809]
+    scheduler = revelation.get_scheduler()
+    idle.rf.regs[reg_map['CTIMER0']] = 50
+    idle.CTIMER0CONFIG = 0b0001  # CLK.
+    idle.ACTIVE = False
+    scheduler.next_core()
+    assert revelation._should_switch(scheduler, 0x809, idle, 0, 1)
+    assert 0x809 in scheduler.waiting
+    running.timing.cycles = 49
+    revelation._should_switch(scheduler, 0x808, running, 0, 100)
+    assert 0x809 in scheduler.waiting
+    assert 0 == idle.timing.cycles
+    running.timing.cycles = 60
+    revelation._should_switch(scheduler, 0x808, running, 0, 100)
+    assert [0x808, 0x809] == scheduler.run_queue
+    assert 60 == idle.timing.cycles
+    assert 0 == idle.rf.regs[reg_map['CTIMER0']]
+    assert 0x8 == idle.rf.regs[reg_map['ILAT']]
@@ -0,0 +1,94 @@
+from pydgin.debug import Debug
+
+from revelation.machine import State, TracedState
+from revelation.sim import (BINARY_LOG_FILENAME, COMPRESSED_LOG_FILENAME,
+                            LOG_FILENAME, Revelation)
+from revelation.storage import (Memory, RegisterFile, TracedMemory,
+                                TracedRegisterFile)
+from revelation.trace import BinaryLogger, decode
+
+import os.path
+import pytest
+
+elf_dir = os.path.join(os.path.dirname(os.path.abspath('__file__')),
+                       'revelation', 'test', 'c')
+
+
+def test_decode_each_event(tmpdir):
+    filename = os.path.join(str(tmpdir), 'trace.bin')
+    logger = BinaryLogger(filename)
+    logger.log_instruction(0x2ce, 0x2ce8, 'bcond32', 12)
+    logger.log_register(False, 3, 0xa)
+    logger.log_register(True, 13, 0x7fb0)
+    logger.log(' syscall_close(fd=1)')
+    logger.log_memory(True, 0x7f60, 0x123456789)
+    logger.log_flags(0b10000000001)
+    logger.log_end_instruction()
+    logger.close()
+    with open(filename, 'rb') as trace_file:
+        text = decode(trace_file.read())
+    assert ('     2ce 00002ce8 bcond32      12      '
+            ' :: RD.RF[3 ] = 0000000a :: WR.RF[13] = 00007fb0'
+            ' syscall_close(fd=1)'
+            ' :: WR.MEM[00007f60] = 123456789'
+            ' AN=True AZ=False AC=False AV=False AVS=False BN=False BZ=False'
+            ' BIS=False BUS=False BV=False BVS=True\n') == text
+
+
+def test_decode_bad_trace():
+    with pytest.raises(ValueError):
+        decode('Hello, world!\n')
+
+
+def run_traced(elf_filename, trace_format):
+    Debug.global_enabled = True
+    revelation = Revelation()
+    entry_point = revelation.get_entry_point()
+    assert 0 == entry_point(('sim.py', '--debug', 'trace,rf,mem,flags,syscalls',
+                             '--trace-format', trace_format, elf_filename))
+    Debug.global_enabled = False
+
+
+@pytest.mark.parametrize('trace_format,filename',
+                         [('binary', BINARY_LOG_FILENAME),
+                          ('gzip', COMPRESSED_LOG_FILENAME)])
+def test_binary_trace_matches_text(tmpdir, trace_format, filename, capfd):
+    elf_filename = os.path.join(elf_dir, 'fib_print.elf')
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        run_traced(elf_filename, 'text')
+        run_traced(elf_filename, trace_format)
+        with open(LOG_FILENAME, 'rb') as text_file:
+            expected = text_file.read()
+        with open(filename, 'rb') as trace_file:
+            data = trace_file.read()
+    finally:
+        os.chdir(cwd)
+    assert 'syscall_write' in expected
+    assert expected == decode(data)
+    out, err = capfd.readouterr()
+    assert 'Trace will be written to: %s.\n' % filename in out
+
+
+@pytest.mark.parametrize('flags,classes',
+                         [([], (Memory, State, RegisterFile)),
+                          (['trace'], (TracedMemory, TracedState,
+                                       TracedRegisterFile))])
+def test_tracing_code_is_only_in_traced_runs(tmpdir, flags, classes, capfd):
+    Debug.global_enabled = True
+    revelation = Revelation()
+    revelation.debug = Debug(flags)
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        with open(os.path.join(elf_dir, 'hello.elf'), 'rb') as elf_file:
+            revelation.init_state(elf_file, 'hello.elf', False)
+        revelation.run()
+        if revelation.logger:
+            revelation.logger.close()
+    finally:
+        os.chdir(cwd)
+        Debug.global_enabled = False
+    state = revelation.states[0x808]
+    assert classes == (type(revelation.memory), type(state), type(state.rf))
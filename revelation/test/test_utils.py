@@ -1,6 +1,7 @@
 from revelation.utils import get_exponent, get_mantissa, bits2float
 from revelation.utils import float2bits, format_thousands, is_nan, is_inf
 from revelation.utils import is_zero, sext_3, sext_11, sext_24, zfill
+from revelation.utils import json_string, read_int_line
 
 import math
 
@@ -83,3 +84,14 @@ def test_round_trip():
     assert math.isinf(bits2float(float2bits(float('-inf'))))
     assert bits2float(float2bits(float('inf'))) > 0
     assert bits2float(float2bits(float('-inf'))) < 0
+
+
+def test_read_int_line():
+    data = '1 -2 3\n\n42\n'
+    assert ([1, -2, 3], 7) == read_int_line(data, 0)
+    assert ([], 8) == read_int_line(data, 7)
+    assert ([42], 11) == read_int_line(data, 8)
+
+
+def test_json_string():
+    assert '"a \\"b\\" \\\\ c\\n\\u0009\\u00ff"' == json_string('a "b" \\ c\n\t\xff')
@@ -0,0 +1,189 @@
+"""Timeline of a multicore run, for --timeline FILE.
+
+Each core records when it goes idle, when it enters and returns from an
+interrupt handler, when it makes a system call (a TRAP), when it halts, and
+each store it makes to the memory of another simulated core. Events are
+appended to arrays which grow by doubling, so recording one costs a few
+stores, and nothing is formatted until the run ends. Without --timeline no
+core has a Timeline, and nothing is recorded.
+
+At exit the events are written in the Chrome trace event format, which can be
+opened in chrome://tracing or https://ui.perfetto.dev. Each core is a thread
+with a "running" slice from the start of the run until it halts. Idle periods
+and interrupt handlers are nested slices inside it, system calls are slices
+one tick long, and remote stores are flow arrows from the storing core to the
+core which owns the memory. Time is measured in ticks, i.e. instructions
+executed by all cores, and one tick is shown as one microsecond. Only the
+running core executes instructions, so the simulator calls switch_to() when it
+switches cores, and the time is the instructions executed by the other cores
+plus those of the running core.
+"""
+from revelation.utils import get_coords_from_coreid, json_string, zfill
+
+_INITIAL_EVENTS = 4096
+
+# Kinds of event.
+_IDLE = 0       # Core executed IDLE.
+_WAKE = 1       # Idle core was woken by an interrupt.
+_INTERRUPT = 2  # Core entered the handler of interrupt 'argument'.
+_RETURN = 3     # Core executed RTI.
+_TRAP = 4       # Core executed TRAP 'argument', with syscall number 'extra'.
+_STORE = 5      # Core stored to core 'argument', at address 'extra'.
+_HALT = 6       # Core halted.
+
+# Names of the interrupts in the interrupt vector table (see sim.IVT).
+_INTERRUPT_NAMES = ['sync', 'software exception', 'memory fault', 'timer0',
+                    'timer1', 'message', 'dma0', 'dma1', 'wand', 'user']
+_SYSCALL_NAMES = {2: 'open', 3: 'close', 4: 'read', 5: 'write', 6: 'lseek',
+                  7: 'unlink', 10: 'fstat', 15: 'stat', 21: 'link'}
+_TRAP_NAMES = {0: 'write', 1: 'read', 2: 'open', 3: 'exit', 4: 'pass',
+               5: 'fail', 6: 'close'}
+
+
+def _trap_name(trap, syscall):
+    if trap == 7:
+        return 'syscall %s' % _SYSCALL_NAMES.get(syscall, str(syscall))
+    return 'trap %s' % _TRAP_NAMES.get(trap, str(trap))
+
+
+class Timeline(object):
+    """Events of every core in a simulation. 'states' is a dictionary of
+    coreid to revelation.machine.State.
+    """
+
+    def __init__(self, states, memory):
+        self.memory = memory  # To tell simulated cores from external RAM.
+        self.coreids = states.keys()
+        self.coreids.sort()
+        self.states = [states[coreid] for coreid in self.coreids]
+        self.current = self.states[0]  # Core which is running.
+        self.others = 0  # Instructions executed by every other core.
+        for state in self.states[1:]:
+            self.others += state.num_insts
+        self.start = self.now()
+        self.idle = {}  # coreid -> True while the core is idle.
+        for coreid in self.coreids:
+            self.idle[coreid] = False
+        self.size = 0
+        self.kinds = [0] * _INITIAL_EVENTS
+        self.times = [0] * _INITIAL_EVENTS
+        self.cores = [0] * _INITIAL_EVENTS
+        self.arguments = [0] * _INITIAL_EVENTS
+        self.extras = [0] * _INITIAL_EVENTS
+
+    def switch_to(self, state):
+        """Called when 'state' is switched in to run.
+        """
+        self.others += self.current.num_insts - state.num_insts
+        self.current = state
+
+    def now(self):
+        """Return the number of ticks simulated so far.
+        """
+        return self.others + self.current.num_insts
+
+    def _record(self, kind, coreid, argument, extra):
+        if self.size == len(self.kinds):
+            self.kinds.extend([0] * self.size)
+            self.times.extend([0] * self.size)
+            self.cores.extend([0] * self.size)
+            self.arguments.extend([0] * self.size)
+            self.extras.extend([0] * self.size)
+        self.kinds[self.size] = kind
+        self.times[self.size] = self.now()
+        self.cores[self.size] = coreid
+        self.arguments[self.size] = argument
+        self.extras[self.size] = extra
+        self.size += 1
+
+    def go_idle(self, state):
+        if not self.idle[state.coreid]:  # IDLE repeats until woken.
+            self.idle[state.coreid] = True
+            self._record(_IDLE, state.coreid, 0, 0)
+
+    def interrupt(self, state, level):
+        if self.idle[state.coreid]:
+            self.idle[state.coreid] = False
+            self._record(_WAKE, state.coreid, 0, 0)
+        self._record(_INTERRUPT, state.coreid, level, 0)
+
+    def return_from_interrupt(self, state):
+        self._record(_RETURN, state.coreid, 0, 0)
+
+    def trap(self, state, trap, syscall):
+        self._record(_TRAP, state.coreid, trap, syscall)
+
+    def store(self, state, address):
+        """Record a store by 'state', if it is to another simulated core.
+        """
+        coreid = address >> 20
+        if (coreid != 0 and coreid != state.coreid and
+              coreid in self.memory.register_files):
+            self._record(_STORE, state.coreid, coreid, address)
+
+    def halt(self, state):
+        self._record(_HALT, state.coreid, 0, 0)
+
+    def _event(self, phase, name, coreid, time, fields):
+        return ('{"name": %s, "ph": "%s", "pid": 0, "tid": %d, "ts": %d%s}' %
+                (json_string(name), phase, coreid, time - self.start, fields))
+
+    def to_json(self):
+        """Return the Chrome trace event JSON of every event recorded.
+        """
+        events = ['{"name": "process_name", "ph": "M", "pid": 0, '
+                  '"args": {"name": "Revelation"}}']
+        depths = {}  # coreid -> number of open slices, including "running".
+        for coreid in self.coreids:
+            row, col = get_coords_from_coreid(coreid)
+            events.append('{"name": "thread_name", "ph": "M", "pid": 0, '
+                          '"tid": %d, "args": {"name": %s}}' %
+                          (coreid, json_string('core %s (%s, %s)' %
+                                               (hex(coreid), zfill(str(row), 2),
+                                                zfill(str(col), 2)))))
+            events.append(self._event('B', 'running', coreid, self.start, ''))
+            depths[coreid] = 1
+        for index in range(self.size):
+            kind = self.kinds[index]
+            coreid = self.cores[index]
+            time = self.times[index]
+            argument = self.arguments[index]
+            if depths[coreid] == 0:
+                continue  # Halted.
+            if kind == _IDLE:
+                events.append(self._event('B', 'idle', coreid, time, ''))
+                depths[coreid] += 1
+            elif kind == _INTERRUPT:
+                events.append(self._event('B', 'interrupt %d (%s)' %
+                                          (argument, _INTERRUPT_NAMES[argument]),
+                                          coreid, time, ''))
+                depths[coreid] += 1
+            elif kind == _WAKE or kind == _RETURN:
+                if depths[coreid] > 1:  # Never close "running" here.
+                    events.append(self._event('E', '', coreid, time, ''))
+                    depths[coreid] -= 1
+            elif kind == _TRAP:
+                events.append(self._event('X', _trap_name(argument,
+                                                          self.extras[index]),
+                                          coreid, time, ', "dur": 1'))
+            elif kind == _STORE:
+                fields = (', "cat": "mesh", "id": %d, "args": {"address": %s}' %
+                          (index, json_string(hex(self.extras[index]))))
+                events.append(self._event('s', 'remote store', coreid, time,
+                                          fields))
+                events.append(self._event('f', 'remote store', argument, time,
+                                          fields + ', "bp": "e"'))
+            elif kind == _HALT:
+                for _ in range(depths[coreid]):
+                    events.append(self._event('E', '', coreid, time, ''))
+                depths[coreid] = 0
+        end = self.now()
+        for coreid in self.coreids:
+            for _ in range(depths[coreid]):
+                events.append(self._event('E', '', coreid, end, ''))
+        return '{"traceEvents": [\n' + ',\n'.join(events) + '\n]}\n'
+
+    def write(self, filename):
+        out_file = open(filename, 'wb')
+        out_file.write(self.to_json())
+        out_file.close()
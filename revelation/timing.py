@@ -0,0 +1,171 @@
+"""Cycle-approximate timing model, enabled by --timing.
+
+Each core counts the clock cycles it would take on real hardware, in
+State.timing.cycles. The model is deliberately simple, and the constants
+below are estimates rather than measurements:
+
+    Every instruction issues in one cycle.
+    An FPU instruction and an IALU or load/store instruction which follow
+        one another are dual-issued, i.e. the second takes no extra cycle,
+        unless it reads the result of the first.
+    An instruction which reads the result of the instruction before it waits
+        for that result (see _RESULT_LATENCY).
+    A taken branch or jump costs BRANCH_PENALTY extra cycles. Jumps back to
+        the start of a hardware loop are free.
+    A load from another core, or from external RAM, waits for a round trip
+        over the mesh (see Memory.read_latency, and the constants in
+        revelation.storage). Stores are posted, and cost nothing extra.
+        With --mesh, reads also wait for busy links (see revelation.mesh).
+
+A core which is idle in the wait set of the scheduler executes no
+instructions, so it does not count its own cycles. Instead its clock and its
+CLK and IDLE CYCLES timers are caught up with the clock of the other cores
+once one of those timers would run out, which wakes it, and when it is woken
+by anything else.
+
+Instruction fetches are assumed to hit local memory. The CTIMER0 and CTIMER1
+registers count down in the CLK, IDLE CYCLES, DUAL ISSUE, RA STALLS and
+EXTERNAL LOAD STALLS modes. Other modes which are not modelled here do not
+count at all.
+"""
+from revelation.registers import reg_map
+
+import sys
+
+BRANCH_PENALTY = 3
+
+# Execution units.
+_OTHER = 0  # Branches, jumps and special instructions.
+_IALU = 1
+_FPU = 2
+_LOAD = 3
+_STORE = 4
+_IDLE = 5
+
+# Cycles after an instruction issues before its result can be read.
+_RESULT_LATENCY = [1, 1, 4, 3, 1, 1]
+
+_UNITS = {}
+for _name in ['add', 'sub', 'and', 'orr', 'eor', 'asr', 'lsr', 'lsl',
+              'lsrimm', 'lslimm', 'asrimm', 'bitrimm', 'movcond', 'movimm',
+              'movtimm', 'nop']:
+    _UNITS[_name + '16'] = _IALU
+    _UNITS[_name + '32'] = _IALU
+for _name in ['fadd', 'fsub', 'fmul', 'fmadd', 'fmsub', 'float', 'fix',
+              'fabs']:
+    _UNITS[_name + '16'] = _FPU
+    _UNITS[_name + '32'] = _FPU
+_UNITS['testset32'] = _LOAD
+_UNITS['idle16'] = _IDLE
+
+_CTIMER0 = reg_map['CTIMER0']
+_CTIMER1 = reg_map['CTIMER1']
+_CLK = 0b0001
+_IDLE_CYCLES = 0b0010
+_DUAL_ISSUE = 0b0110
+_RA_STALLS = 0b1000
+_EXTERNAL_LOAD_STALLS = 0b1101
+
+
+def _unit(instruction):
+    if instruction.name.startswith('ldstr'):
+        return _STORE if instruction.s else _LOAD
+    return _UNITS.get(instruction.name, _OTHER)
+
+
+def _can_dual_issue(first, second):
+    if first == _FPU:
+        return second == _IALU or second == _LOAD or second == _STORE
+    if second == _FPU:
+        return first == _IALU or first == _LOAD or first == _STORE
+    return False
+
+
+def _count_down(state, mode, num_events):
+    """Decrement each CTIMER register in 'mode' by num_events, stopping at 0.
+    """
+    if num_events == 0:
+        return
+    if state.CTIMER0CONFIG == mode:
+        _decrement(state, _CTIMER0, num_events)
+    if state.CTIMER1CONFIG == mode:
+        _decrement(state, _CTIMER1, num_events)
+
+
+def _decrement(state, index, num_events):
+    value = state.rf.regs[index]
+    if value > 0:  # Writing 0 raises the timer interrupt.
+        state.rf[index] = max(0, value - num_events)
+
+
+class CoreTiming(object):
+    """Cycle count of one core, and what it needs to know about the last
+    instruction it issued.
+    """
+
+    def __init__(self):
+        self.cycles = 0
+        self.last_unit = _OTHER
+        self.last_rd = -1         # Register written by the last instruction.
+        self.last_paired = False  # Last instruction was dual-issued.
+
+    def catch_up(self, state, now):
+        """Advance the clock of 'state', an idle core, to cycle 'now', counting
+        down the timers which count while it is idle.
+        """
+        if now <= self.cycles:
+            return
+        idle_cycles = now - self.cycles
+        self.cycles = now
+        _count_down(state, _CLK, idle_cycles)
+        _count_down(state, _IDLE_CYCLES, idle_cycles)
+
+    def next_expiry(self, state):
+        """Return the cycle at which a timer of 'state', an idle core, runs
+        out, or sys.maxint if none of its timers counts while it is idle.
+        """
+        expiry = sys.maxint
+        for index, config in [(_CTIMER0, state.CTIMER0CONFIG),
+                              (_CTIMER1, state.CTIMER1CONFIG)]:
+            value = state.rf.regs[index]
+            if (config == _CLK or config == _IDLE_CYCLES) and value > 0:
+                expiry = min(expiry, self.cycles + value)
+        return expiry
+
+    def step(self, state, instruction, pc):
+        """Charge the cycles for an instruction which was fetched from 'pc' and
+        has just been executed.
+        """
+        unit = _unit(instruction)
+        cycles = 1
+        stalls = 0
+        paired = False
+        last_rd = self.last_rd
+        if last_rd >= 0 and (instruction.rn == last_rd or
+                             instruction.rm == last_rd):
+            stalls = _RESULT_LATENCY[self.last_unit] - 1
+        elif not self.last_paired and _can_dual_issue(self.last_unit, unit):
+            cycles = 0
+            paired = True
+        load_stalls = state.mem.stall_cycles
+        state.mem.stall_cycles = 0
+        cycles += stalls + load_stalls
+        size = 2 if instruction.name.endswith('16') else 4
+        if unit != _IDLE and state.pc != ((pc + size) & 0xffffffff):
+            cycles += BRANCH_PENALTY
+        self.cycles += cycles
+        self.last_unit = unit
+        self.last_paired = paired
+        if unit == _FPU or unit == _LOAD:
+            self.last_rd = instruction.rd
+        else:
+            self.last_rd = -1
+        _count_down(state, _CLK, cycles)
+        if unit == _IDLE:
+            _count_down(state, _IDLE_CYCLES, cycles)
+        if paired:
+            _count_down(state, _DUAL_ISSUE, 1)
+        _count_down(state, _RA_STALLS, stalls)
+        _count_down(state, _EXTERNAL_LOAD_STALLS, load_stalls)
+        if state.mem.mesh is not None:
+            state.mem.mesh.deliver(state.mem, self.cycles)
@@ -0,0 +1,159 @@
+"""Binary --debug traces, written with --trace-format binary or gzip.
+
+A binary trace holds the same events as the text trace which Logger writes,
+but each event is a fixed-size record rather than a formatted string. It is
+buffered in the same way. With --trace-format gzip the records are piped
+through a gzip process, so the trace is compressed in parallel with the
+simulation (gzip must be on the PATH). decode() renders either kind of
+binary trace in the text format, e.g. for scripts/diff_trace.py:
+
+    $ python scripts/decode_trace.py r_trace.bin > r_trace.out
+
+The file starts with _MAGIC, followed by records of _RECORD_SIZE bytes:
+
+    byte  0      Kind of event, one of the constants below.
+    byte  1      Register number, for RD.RF and WR.RF.
+    bytes 2-3    Instruction name (index into revelation.isa.encodings), or
+                 the length of the message in a _TEXT record.
+    bytes 4-7    PC, register value, memory address or flags.
+    bytes 8-11   Opcode, or the low word of a memory value.
+    bytes 12-15  Instructions executed so far, or the high word of a memory
+                 value.
+
+All words are little-endian. A _TEXT record, e.g. a system call, is followed
+by its message, padded with zeros to a multiple of _RECORD_SIZE bytes. The
+instruction count is truncated to 32 bits.
+"""
+from revelation.isa import encodings
+from revelation.logger import (FLUSH_BYTES, Logger, format_flags,
+                               format_instruction, format_memory,
+                               format_register)
+
+import os
+import struct
+import zlib
+
+_MAGIC = 'REVELATION TRC 1'
+_RECORD_SIZE = 16
+
+_INSTRUCTION = 1
+_END_INSTRUCTION = 2
+_RD_RF = 3
+_WR_RF = 4
+_RD_MEM = 5
+_WR_MEM = 6
+_FLAGS = 7
+_TEXT = 8
+
+_NAMES = [name for name, _ in encodings]
+_NAME_IDS = {}
+for _index, _name in enumerate(_NAMES):
+    _NAME_IDS[_name] = _index
+
+
+def _word(value):
+    return (chr(value & 0xff) + chr((value >> 8) & 0xff) +
+            chr((value >> 16) & 0xff) + chr((value >> 24) & 0xff))
+
+
+def _start_compressor(fd):
+    """Start a gzip process which compresses its STDIN into fd. Return a pipe
+    to the process, and its process id.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.dup2(read_fd, 0)
+        os.dup2(fd, 1)
+        for unused_fd in [read_fd, write_fd, fd]:
+            os.close(unused_fd)
+        try:
+            os.execv('/bin/sh', ['/bin/sh', '-c', 'exec gzip -c -1'])
+        except OSError:
+            pass
+        os._exit(127)
+    os.close(read_fd)
+    return write_fd, pid
+
+
+class BinaryLogger(Logger):
+    """Logger which writes each event of the --debug trace as a binary record,
+    optionally compressed with gzip.
+    """
+
+    def __init__(self, filename, compress=False, flush_bytes=FLUSH_BYTES,
+                 ring_size=0):
+        Logger.__init__(self, filename, flush_bytes, ring_size)
+        self.compressor = 0  # Process id of gzip.
+        if compress:
+            file_fd = self.fd
+            self.fd, self.compressor = _start_compressor(file_fd)
+            os.close(file_fd)
+        self._write_out(_MAGIC)
+
+    def _record(self, kind, index, aux, first, second, third):
+        self.write(chr(kind) + chr(index & 0xff) + chr(aux & 0xff) +
+                   chr((aux >> 8) & 0xff) + _word(first) + _word(second) +
+                   _word(third))
+
+    def log(self, message):
+        self._record(_TEXT, 0, len(message), 0, 0, 0)
+        padding = (_RECORD_SIZE - len(message) % _RECORD_SIZE) % _RECORD_SIZE
+        self.write(message + '\0' * padding)
+
+    def log_instruction(self, pc, opcode, name, num_insts):
+        self._record(_INSTRUCTION, 0, _NAME_IDS[name], pc, opcode, num_insts)
+
+    def log_end_instruction(self):
+        self._record(_END_INSTRUCTION, 0, 0, 0, 0, 0)
+        self.end_instruction()
+
+    def log_register(self, is_write, index, value):
+        self._record(_WR_RF if is_write else _RD_RF, index, 0, value, 0, 0)
+
+    def log_memory(self, is_write, address, value):
+        self._record(_WR_MEM if is_write else _RD_MEM, 0, 0, address, value,
+                     value >> 32)
+
+    def log_flags(self, flags):
+        self._record(_FLAGS, 0, 0, flags, 0, 0)
+
+    def close(self):
+        Logger.close(self)
+        if self.compressor:
+            os.waitpid(self.compressor, 0)
+
+
+def decode(data):
+    """Return the text of the --debug trace held in 'data', the contents of a
+    binary trace, which may be compressed. This is not part of the translated
+    simulator.
+    """
+    if data.startswith('\x1f\x8b'):
+        data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    if not data.startswith(_MAGIC):
+        raise ValueError('Not a binary trace')
+    parts = []
+    pos = len(_MAGIC)
+    while pos + _RECORD_SIZE <= len(data):
+        kind, index, aux, first, second, third = \
+            struct.unpack_from('<BBHIII', data, pos)
+        pos += _RECORD_SIZE
+        if kind == _INSTRUCTION:
+            parts.append(format_instruction(first, second, _NAMES[aux], third))
+        elif kind == _END_INSTRUCTION:
+            parts.append('\n')
+        elif kind == _RD_RF or kind == _WR_RF:
+            parts.append(format_register(kind == _WR_RF, index, first))
+        elif kind == _RD_MEM or kind == _WR_MEM:
+            parts.append(format_memory(kind == _WR_MEM, first,
+                                       second | (third << 32)))
+        elif kind == _FLAGS:
+            parts.append(format_flags(first))
+        elif kind == _TEXT:
+            parts.append(data[pos:pos + aux])
+            pos += aux + (-aux % _RECORD_SIZE)
+        else:
+            raise ValueError('Unknown record %d at byte %d' %
+                             (kind, pos - _RECORD_SIZE))
+    return ''.join(parts)
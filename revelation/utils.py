@@ -3,6 +3,7 @@ from revelation.registers import get_register_size_by_address
 import pydgin.utils
 
 import math
+import os
 
 
 def format_thousands(number):
@@ -31,6 +32,46 @@ def zfill(string, width):
     return sign + '0' * (width - size) + string
 
 
+def read_int_line(data, pos):
+    """Return the space separated integers on the line of 'data' which starts
+    at pos, and the position of the next line.
+    """
+    end = data.find('\n', pos)
+    assert end >= 0
+    if end == pos:
+        return [], end + 1
+    return [int(field) for field in data[pos:end].split(' ')], end + 1
+
+
+def open_unlinked_file(name):
+    """Return a pair of file descriptors, for writing to and for reading from
+    an unlinked temporary file.
+    """
+    write_fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND,
+                       0600)
+    read_fd = os.open(name, os.O_RDONLY, 0600)
+    os.unlink(name)
+    return write_fd, read_fd
+
+
+def json_string(string):
+    """Quote a string for a JSON document. Bytes outside printable ASCII are
+    escaped as the Unicode code point of the same value.
+    """
+    chars = ['"']
+    for char in string:
+        if char == '"' or char == '\\':
+            chars.append('\\' + char)
+        elif char == '\n':
+            chars.append('\\n')
+        elif ord(char) < 0x20 or ord(char) > 0x7e:
+            chars.append('\\u' + zfill('%x' % ord(char), 4))
+        else:
+            chars.append(char)
+    chars.append('"')
+    return ''.join(chars)
+
+
 def get_coreid_from_coords(row, col):
     return (row << 6) | col
 
@@ -0,0 +1,304 @@
+"""Parallel simulation of the core mesh in several processes (--workers).
+
+The cores are split into contiguous groups, and each group is simulated by a
+worker process forked from the simulator once the ELF file has been loaded.
+Every worker holds a full copy of memory, but only simulates its own cores.
+Workers run for a fixed quantum of ticks (--quantum) and then exchange the
+memory they have written, through the parent process:
+
+    Pages of a worker's own local memory which it has written are copied to
+    every other worker.
+    Writes to any other memory (external RAM, the local memory or registers
+    of cores owned by another worker) are sent individually, and every worker
+    applies all of them in the same order (worker 0 first).
+
+So a core sees writes made by cores in other workers at the next quantum
+boundary, and the outcome depends only on the quantum and the number of
+workers, never on how the host schedules the processes. Register files are
+not exchanged: a worker sees the registers of cores owned by another worker as
+they were when it was forked, apart from the writes which it is sent.
+
+Each worker's STDOUT and STDERR are redirected to unlinked files, which the
+parent copies to its own STDOUT and STDERR in worker order at the end of each
+quantum. If a worker fails, it writes the error to its STDERR and exits, and
+the parent stops every worker and reports a general error.
+"""
+from revelation.storage import PAGE_SIZE
+from revelation.utils import open_unlinked_file, read_int_line, zfill
+
+import os
+
+try:
+    from rpython.rlib.objectmodel import we_are_translated
+except ImportError:
+    def we_are_translated():
+        return False
+
+# Status of a worker at the end of a quantum.
+_RUNNING = 0
+_IDLE = 1     # Every core owned by the worker has halted or is idle.
+_STOPPED = 2  # --max-insts was reached.
+_FAILED = 3   # An instruction could not be executed.
+
+_HEADER_SIZE = 16  # Width of the length which precedes each message.
+
+
+def _write_message(fd, message):
+    os.write(fd, zfill(str(len(message)), _HEADER_SIZE))
+    written = 0
+    while written < len(message):
+        written += os.write(fd, message[written:])
+
+
+def _read_exactly(fd, num_bytes):
+    chunks = []
+    received = 0
+    while received < num_bytes:
+        chunk = os.read(fd, num_bytes - received)
+        if chunk == '':
+            raise OSError(0, 'Worker process exited unexpectedly')
+        chunks.append(chunk)
+        received += len(chunk)
+    return ''.join(chunks)
+
+
+def _read_message(fd):
+    return _read_exactly(fd, int(_read_exactly(fd, _HEADER_SIZE)))
+
+
+def _copy_output(from_fd, to_fd):
+    while True:
+        chunk = os.read(from_fd, 65536)
+        if chunk == '':
+            break
+        os.write(to_fd, chunk)
+
+
+def _format_traceback():
+    """Return the traceback of the exception being handled. Not RPython, so
+    only called when the simulator is not translated.
+    """
+    import traceback
+    return traceback.format_exc()
+
+
+def _print_failure(index):
+    """Write the exception which stopped worker 'index' to its STDERR.
+    """
+    if we_are_translated():
+        message = 'Worker %d failed with an unexpected error.\n' % index
+    else:
+        message = 'Worker %d failed:\n%s' % (index, _format_traceback())
+    written = 0
+    while written < len(message):
+        written += os.write(2, message[written:])
+
+
+def _encode_report(status, ticks, memory):
+    """Encode the end of a quantum in a worker: its status, the number of
+    instructions it executed, its dirty pages and its logged writes.
+    """
+    pages = memory.dirty_pages.keys()
+    pages.sort()
+    parts = ['%d %d %d %d\n' % (status, ticks, len(pages),
+                                len(memory.write_log))]
+    for page in pages:
+        parts.append('%d\n' % page)
+        parts.append(memory.read_page(page))
+    for start_addr, num_bytes, value in memory.write_log:
+        parts.append('%d %d %d\n' % (start_addr, num_bytes, value))
+    memory.dirty_pages = {}
+    memory.write_log = []
+    return ''.join(parts)
+
+
+def _apply_reports(memory, message, index):
+    """Apply the reports of every worker, sent on by the parent. Pages are
+    copied first, then every logged write in worker order. Return True if the
+    simulation should stop.
+    """
+    (stop, num_reports), pos = read_int_line(message, 0)
+    writes = []
+    for report in range(num_reports):
+        (_, _, num_pages, num_writes), pos = read_int_line(message, pos)
+        for _ in range(num_pages):
+            (page,), pos = read_int_line(message, pos)
+            if report != index:
+                memory.write_page(page, message[pos:pos + PAGE_SIZE])
+            pos += PAGE_SIZE
+        for _ in range(num_writes):
+            (start_addr, num_bytes, value), pos = read_int_line(message, pos)
+            writes.append((start_addr, num_bytes, value))
+    for start_addr, num_bytes, value in writes:
+        memory.apply_write(start_addr, num_bytes, value)
+    return stop != 0
+
+
+def _report_status(sim, scheduler, coreids, exit_code):
+    if exit_code != 0:
+        return _FAILED
+    if sim._reached_max_insts(coreids):
+        return _STOPPED
+    if scheduler.is_empty():
+        return _IDLE
+    return _RUNNING
+
+
+def _run_worker(sim, index, coreids, to_fd, from_fd):
+    """Simulate the cores in 'coreids', one quantum at a time, then send the
+    final state of each core to the parent.
+    """
+    memory = sim.memory
+    memory.owned_cores = {}
+    for coreid in coreids:
+        memory.owned_cores[coreid] = True
+    scheduler = sim._new_scheduler(coreids, keep_one_running=False)
+    exit_code = 0
+    while True:
+        ticks = 0
+        if not scheduler.is_empty():  # Some cores are not halted or idle.
+            sim._switch_core(scheduler)
+            exit_code, ticks = sim.run_cores(scheduler, sim.worker_quantum)
+        status = _report_status(sim, scheduler, coreids, exit_code)
+        _write_message(from_fd, _encode_report(status, ticks, memory))
+        if _apply_reports(memory, _read_message(to_fd), index):
+            break
+    parts = []
+    for coreid in coreids:
+        state = sim.states[coreid]
+        parts.append('%d %d %d %d %d\n' % (coreid, state.num_insts,
+                                           state.get_status(),
+                                           int(state.running),
+                                           state.timing.cycles))
+    _write_message(from_fd, ''.join(parts))
+
+
+class _Worker(object):
+    """The parent's view of a worker process.
+    """
+
+    def __init__(self, pid, to_fd, from_fd, out_fd, err_fd):
+        self.pid = pid
+        self.to_fd = to_fd      # Pipe to the worker.
+        self.from_fd = from_fd  # Pipe from the worker.
+        self.out_fd = out_fd    # The worker's STDOUT.
+        self.err_fd = err_fd    # The worker's STDERR.
+
+
+def _start_worker(sim, index, coreids, workers):
+    to_read, to_write = os.pipe()
+    from_read, from_write = os.pipe()
+    prefix = '.revelation_worker_%d_%d' % (os.getpid(), index)
+    out_write, out_read = open_unlinked_file(prefix + '.out')
+    err_write, err_read = open_unlinked_file(prefix + '.err')
+    pid = os.fork()
+    if pid == 0:
+        for fd in [to_write, from_read, out_read, err_read]:
+            os.close(fd)
+        for worker in workers:  # Pipes to workers which were started earlier.
+            for fd in [worker.to_fd, worker.from_fd, worker.out_fd,
+                       worker.err_fd]:
+                os.close(fd)
+        os.dup2(out_write, 1)
+        os.dup2(err_write, 2)
+        exit_code = 0
+        try:
+            _run_worker(sim, index, coreids, to_read, from_write)
+        except Exception:
+            _print_failure(index)
+            exit_code = 1
+        os._exit(exit_code)
+    for fd in [to_read, from_write, out_write, err_write]:
+        os.close(fd)
+    return _Worker(pid, to_write, from_read, out_read, err_read)
+
+
+def _stop_workers(workers):
+    """Stop every worker after one has failed. Closing the pipes makes each
+    worker which is still running fail in turn, once it next reads from or
+    writes to the parent. Everything the workers wrote is copied out.
+    """
+    for worker in workers:
+        os.close(worker.to_fd)
+        os.close(worker.from_fd)
+    for worker in workers:
+        os.waitpid(worker.pid, 0)
+        _copy_output(worker.out_fd, 1)
+        _copy_output(worker.err_fd, 2)
+        os.close(worker.out_fd)
+        os.close(worker.err_fd)
+
+
+def run_workers(sim):
+    """Simulate every core of 'sim' in sim.num_workers processes. Return the
+    exit code and the number of instructions executed by all cores, and copy
+    the final state of each core back into sim.states.
+    """
+    from revelation.sim import EXIT_GENERAL_ERROR
+    coreids = sim.states.keys()
+    coreids.sort()
+    num_workers = min(sim.num_workers, len(coreids))
+    workers = []
+    for index in range(num_workers):
+        start = index * len(coreids) / num_workers
+        end = (index + 1) * len(coreids) / num_workers
+        workers.append(_start_worker(sim, index, coreids[start:end],
+                                     workers))
+    try:
+        return _exchange_quanta(sim, workers)
+    except OSError:
+        _stop_workers(workers)
+        print 'A worker process exited unexpectedly, aborting!'
+        return EXIT_GENERAL_ERROR, 0
+
+
+def _exchange_quanta(sim, workers):
+    """Pass the reports of each quantum between the workers until the
+    simulation stops, then read the final state of each core.
+    """
+    from revelation.sim import EXIT_GENERAL_ERROR, EXIT_SUCCESS
+    exit_code = EXIT_SUCCESS
+    tick_counter = 0
+    while True:
+        reports = []
+        stop = True  # No core can run, nor be woken by a write.
+        stopped = False
+        for worker in workers:
+            report = _read_message(worker.from_fd)
+            (status, ticks, _, num_writes), _ = read_int_line(report, 0)
+            tick_counter += ticks
+            if status == _RUNNING or num_writes > 0:
+                stop = False
+            if status == _STOPPED:
+                stopped = True
+            elif status == _FAILED:
+                exit_code = EXIT_GENERAL_ERROR
+            reports.append(report)
+        for worker in workers:
+            _copy_output(worker.out_fd, 1)
+            _copy_output(worker.err_fd, 2)
+        if stopped or exit_code != EXIT_SUCCESS:
+            stop = True
+        message = '%d %d\n' % (int(stop), len(reports)) + ''.join(reports)
+        for worker in workers:
+            _write_message(worker.to_fd, message)
+        if stop:
+            break
+    for worker in workers:
+        cores = _read_message(worker.from_fd)
+        pos = 0
+        while pos < len(cores):
+            (coreid, num_insts, status, running, cycles), pos = \
+                read_int_line(cores, pos)
+            state = sim.states[coreid]
+            state.num_insts = num_insts
+            state.timing.cycles = cycles
+            state.set_status(status)
+            state.running = running != 0
+    for worker in workers:
+        os.waitpid(worker.pid, 0)
+        _copy_output(worker.out_fd, 1)
+        _copy_output(worker.err_fd, 2)
+        for fd in [worker.to_fd, worker.from_fd, worker.out_fd, worker.err_fd]:
+            os.close(fd)
+    return exit_code, tick_counter
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""decode_trace prints a binary Revelation trace in the text format.
+
+To use this script, first produce a binary trace from Revelation:
+    $ python revelation/sim.py --debug trace,mem,rf,flags,syscalls --trace-format binary myfile.elf
+
+Then call this script, e.g. to compare the trace with e-sim:
+    $ python decode_trace.py r_trace.bin > py_trace.out
+    $ python diff_trace.py e_trace.out py_trace.out
+
+Traces written with --trace-format gzip are decompressed automatically.
+"""
+from __future__ import print_function
+
+import os.path
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from revelation.trace import decode
+
+
+def print_usage():
+    """Print unix-style help text.
+    """
+    print('Usage: {0} FILE'.format(sys.argv[0]))
+    print(__doc__)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('ERROR: This script takes one command line argument.')
+        print()
+        print_usage()
+        sys.exit(1)
+    elif sys.argv[1] == '-h' or sys.argv[1] == '--help':
+        print_usage()
+        sys.exit(0)
+    with open(sys.argv[1], 'rb') as trace_file:
+        sys.stdout.write(decode(trace_file.read()))
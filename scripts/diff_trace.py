@@ -9,6 +9,9 @@ Then create a trace from Revelation:
 
 Then call this script (order of the CLI arguments matters):
     $ python diff_trace.py e_trace.out py_trace.out
+
+If the Revelation trace was written with --trace-format binary or gzip, first
+decode it to text with decode_trace.py.
 """
 
 from __future__ import print_function
@@ -1,14 +1,21 @@
 #!/usr/bin/env python
-"""get_instructions_used prints the set of instructions executed by e-sim.
+"""get_instructions_used prints the set of instructions executed by e-sim, or
+by Revelation.
 
 To use this script, first produce a trace from the e-sim tool:
     $ e-sim -r 1 -c 1 --extra-args="--trace=on --trace-file e_trace.out" myfile.elf
 
-Then call this script (order of the CLI arguments matters):
-    $ python get_instructions_used.py e_trace.out py_trace.out
+Then call this script:
+    $ python get_instructions_used.py e_trace.out
+
+Revelation counts the instructions it executes itself, so no trace is needed:
+    $ pydgin-revelation-jit --stats r_stats.json myfile.elf
+    $ python get_instructions_used.py r_stats.json
 """
 from __future__ import print_function
 
+import json
+
 _e_flags = {'nbit':'AN',   'zbit':'AZ',   'cbit':'AC',    'vbit':'AV',
             'vsbit':'AVS',  'bnbit':'BN', 'bisbit':'BIS', 'busbit':'BUS',
             'bvsbit':'BVS', 'bzbit':'BZ'}
@@ -78,10 +85,21 @@ def parse_trace(trace_s):
     return trace
 
 
-def print_instructions(trace, filename):
+def parse_stats(stats_s):
+    """Return the set of instructions executed by any core, from the JSON
+    written by the --stats option of Revelation.
+
+    >>> stats = parse_stats('{"ticks": 3, "cores": [{"mnemonics": {"add16": 2, "nop16": 1}}]}')
+    >>> stats == set(['add16', 'nop16'])
+    True
+    """
     instructions = set()
-    for line in trace:
-        instructions.add(line['instruction'])
+    for core in json.loads(stats_s)['cores']:
+        instructions.update(core['mnemonics'].keys())
+    return instructions
+
+
+def print_instructions(instructions, filename):
     print('Instructions used by %s:\n' % filename)
     for instr in sorted(instructions):
         print('%s' % instr)
@@ -106,5 +124,10 @@ if __name__ == '__main__':
         print_usage()
         sys.exit(1)
     with open(sys.argv[1]) as file_:
-        e_trace_s = file_.read()
-    print_instructions(parse_trace(e_trace_s), sys.argv[1])
+        contents = file_.read()
+    if contents.startswith('{'):  # Written by Revelation --stats.
+        instructions = parse_stats(contents)
+    else:
+        instructions = set(inst['instruction']
+                           for inst in parse_trace(contents))
+    print_instructions(instructions, sys.argv[1])